@@ -21,6 +21,8 @@ async function analyzeViaServiceAsync(audioFilePath, serviceUrl) {
       filename: 'upload.mp3',
       contentType: 'audio/mpeg'
     });
+    // No 'progressive' field: the service's PROGRESSIVE_RESULTS decides
+    // whether a preliminary ranking is worth the extra decode
 
     // Start async job
     const response = await fetch(`${serviceUrl}/analyze-async`, {
@@ -48,11 +50,29 @@ async function analyzeViaServiceAsync(audioFilePath, serviceUrl) {
   }
 }
 
-export async function checkJobStatus(jobId) {
+// Result fields check-job.js uses; the service drops everything else
+const RESULT_FIELDS = [
+  'duration',
+  'features',
+  'identified',
+  ...['title', 'artist', 'similarity_score', 'openl3_score', 'librosa_score',
+      'tempo', 'key', 'mode', 'energy', 'brightness', 'info', 'capo', 'transpose'].map(field => `similarSongs.${field}`)
+].join(',');
+
+export async function checkJobStatus(jobId, waitSeconds = 0, acceptPartial = false) {
   const pythonServiceUrl = process.env.PYTHON_SERVICE_URL || 'http://localhost:5000';
 
   try {
-    const response = await fetch(`${pythonServiceUrl}/job-status/${jobId}`);
+    // With waitSeconds > 0 the service long-polls and answers as soon as the job
+    // finishes (or, with acceptPartial, publishes a preliminary result)
+    const params = new URLSearchParams({ fields: RESULT_FIELDS });
+    if (waitSeconds > 0) {
+      params.set('wait', waitSeconds);
+    }
+    if (acceptPartial) {
+      params.set('partial', '1');
+    }
+    const response = await fetch(`${pythonServiceUrl}/job-status/${jobId}?${params}`);
 
     if (!response.ok) {
       const error = await response.text();
@@ -5,14 +5,28 @@ export default async function handler(req, res) {
     return res.status(405).json({ error: 'Method not allowed' });
   }
 
-  const { jobId } = req.query;
+  const { jobId, wait, partial } = req.query;
 
   if (!jobId) {
     return res.status(400).json({ error: 'Job ID is required' });
   }
 
   try {
-    const jobStatus = await checkJobStatus(jobId);
+    // Long-poll the Python service (kept under the serverless function timeout)
+    const waitSeconds = Math.min(Math.max(parseInt(wait || '0', 10) || 0, 0), 8);
+    const jobStatus = await checkJobStatus(jobId, waitSeconds, partial === '1');
+
+    // Preliminary ranking while the full analysis runs
+    if (jobStatus.status === 'processing' && jobStatus.partial && jobStatus.result) {
+      return res.status(202).json({
+        status: 'processing',
+        stage: jobStatus.stage,
+        partial: true,
+        duration: jobStatus.result.duration,
+        features: jobStatus.result.features,
+        recommendations: await enrichRecommendations(jobStatus.result)
+      });
+    }
 
     // If job is still processing, return 202 Accepted
     if (jobStatus.status === 'processing') {
@@ -29,89 +43,12 @@ export default async function handler(req, res) {
 
     // Job completed - enrich with Last.fm metadata
     if (jobStatus.status === 'completed' && jobStatus.result) {
-      const { features, similarSongs } = jobStatus.result;
-
-      let recommendations = [];
-
-      if (similarSongs && similarSongs.length > 0) {
-        console.log(`Processing ${similarSongs.length} recommendations with hybrid scoring`);
-
-        const songsWithMetadata = await Promise.all(
-          similarSongs.map(async (song) => {
-            try {
-              const lastfmUrl = `https://ws.audioscrobbler.com/2.0/?method=track.getInfo&api_key=${process.env.LASTFM_API_KEY}&artist=${encodeURIComponent(song.artist)}&track=${encodeURIComponent(song.title)}&format=json`;
-              const response = await fetch(lastfmUrl);
-              const data = await response.json();
-
-              if (data.track) {
-                const track = data.track;
-                const albumImage = track.album?.image?.find(img => img.size === 'extralarge')?.['#text'] || null;
-
-                const allTags = track.toptags?.tag || [];
-                const actualGenres = allTags.filter(tag => {
-                  const name = tag.name.toLowerCase();
-                  return !name.includes('spotify') &&
-                         !name.includes('playlist') &&
-                         !name.includes('top 100') &&
-                         !name.includes('charts') &&
-                         !name.match(/\d{4}/) &&
-                         !name.includes('billboard');
-                });
-
-                const genreName = actualGenres[0]?.name || 'Unknown';
-                const genre = genreName.toLowerCase();
-                const allTagsStr = allTags.map(t => t.name.toLowerCase()).join(' ');
-
-                const tempo = song.tempo || 120;
-                const keyComplexity = getKeyComplexity(song.key, song.mode);
-                const genreComplexity = getGenreComplexity(genre, allTagsStr);
-
-                const tempoDifficulty = Math.abs(tempo - 120) / 2;
-                const difficulty = Math.max(10, Math.min(100, Math.round(
-                  30 +
-                  (tempoDifficulty * 0.3) +
-                  (keyComplexity * 0.3) +
-                  (genreComplexity * 0.4)
-                )));
-
-                const keySignature = song.key && song.mode ? `${song.key} ${song.mode}` : null;
-
-                return {
-                  title: song.title,
-                  artist: song.artist,
-                  album: track.album?.title || 'Unknown Album',
-                  albumCover: albumImage,
-                  matchScore: Math.round(song.similarity_score * 100),
-                  tempo: song.tempo || null,
-                  keySignature: keySignature,
-                  energy: song.energy || null,
-                  brightness: song.brightness || null,
-                  genre: genreName,
-                  difficulty: difficulty,
-                  duration: track.duration ? parseInt(track.duration) / 1000 : jobStatus.result.duration,
-                  popularity: parseInt(track.playcount || 0),
-                  url: track.url || `https://www.last.fm/music/${encodeURIComponent(song.artist)}/_/${encodeURIComponent(song.title)}`,
-                  openl3Score: Math.round(song.openl3_score * 100),
-                  librosaScore: Math.round(song.librosa_score * 100)
-                };
-              }
-              return null;
-            } catch (error) {
-              console.error(`Failed to fetch Last.fm data for ${song.artist} - ${song.title}:`, error);
-              return null;
-            }
-          })
-        );
-
-        recommendations = songsWithMetadata.filter(r => r !== null);
-        console.log(`Enriched ${recommendations.length} recommendations with Last.fm metadata`);
-      }
-
       return res.status(200).json({
         success: true,
         duration: jobStatus.result.duration,
-        features: features,
-        recommendations: recommendations
+        features: jobStatus.result.features,
+        identification: buildIdentification(jobStatus.result),
+        recommendations: await enrichRecommendations(jobStatus.result)
       });
     }
 
@@ -127,6 +64,129 @@ export default async function handler(req, res) {
   }
 }
 
+async function enrichRecommendations(result) {
+  const { similarSongs } = result;
+  if (!similarSongs || similarSongs.length === 0) {
+    return [];
+  }
+  console.log(`Processing ${similarSongs.length} recommendations with hybrid scoring`);
+
+  // The service attaches precomputed track info; Last.fm is only
+  // called for songs it has none for
+  const songsWithMetadata = await Promise.all(
+    similarSongs.map(async (song) => {
+      try {
+        const info = song.info || await fetchTrackInfo(song);
+        return info ? buildRecommendation(song, info, result.duration) : null;
+      } catch (error) {
+        console.error(`Failed to fetch Last.fm data for ${song.artist} - ${song.title}:`, error);
+        return null;
+      }
+    })
+  );
+
+  const recommendations = songsWithMetadata.filter(r => r !== null);
+  console.log(`Enriched ${recommendations.length} recommendations (${similarSongs.filter(s => !s.info).length} from Last.fm)`);
+  return recommendations;
+}
+
+// Exact catalog match (python-service/fingerprint.py) in the shape the
+// Song Identification panel renders; null when the upload wasn't identified
+function buildIdentification(result) {
+  const match = result.identified;
+  if (!match) {
+    return null;
+  }
+  const info = match.info || {};
+  const features = result.features || {};
+  return {
+    identified: true,
+    confidence: Math.round(match.confidence * 100),
+    message: `Matched ${match.votes} aligned fingerprint hashes, ${Math.round(match.offset_seconds)}s into the recording`,
+    track: {
+      title: match.title,
+      artist: match.artist,
+      album: info.album || null,
+      albumCover: info.cover || null,
+      keySignature: features.key && features.mode ? `${features.key} ${features.mode}` : null,
+      tempo: features.tempo || null
+    }
+  };
+}
+
+function buildRecommendation(song, info, fallbackDuration) {
+  const genreName = info.genre || 'Unknown';
+  const genre = genreName.toLowerCase();
+  const allTagsStr = (info.tags || []).map(t => t.toLowerCase()).join(' ');
+
+  const tempo = song.tempo || 120;
+  const keyComplexity = getKeyComplexity(song.key, song.mode);
+  const genreComplexity = getGenreComplexity(genre, allTagsStr);
+
+  const tempoDifficulty = Math.abs(tempo - 120) / 2;
+  const difficulty = Math.max(10, Math.min(100, Math.round(
+    30 +
+    (tempoDifficulty * 0.3) +
+    (keyComplexity * 0.3) +
+    (genreComplexity * 0.4)
+  )));
+
+  const keySignature = song.key && song.mode ? `${song.key} ${song.mode}` : null;
+
+  return {
+    title: song.title,
+    artist: song.artist,
+    album: info.album || 'Unknown Album',
+    albumCover: info.cover || null,
+    matchScore: Math.round(song.similarity_score * 100),
+    tempo: song.tempo || null,
+    keySignature: keySignature,
+    capo: song.capo ?? null,
+    transpose: song.transpose ?? null,
+    energy: song.energy || null,
+    brightness: song.brightness || null,
+    genre: genreName,
+    difficulty: difficulty,
+    duration: info.duration || fallbackDuration,
+    popularity: info.playcount || 0,
+    url: info.url || `https://www.last.fm/music/${encodeURIComponent(song.artist)}/_/${encodeURIComponent(song.title)}`,
+    openl3Score: Math.round(song.openl3_score * 100),
+    librosaScore: Math.round(song.librosa_score * 100)
+  };
+}
+
+// Same shape as the service's track info (python-service/track_info.py)
+async function fetchTrackInfo(song) {
+  const lastfmUrl = `https://ws.audioscrobbler.com/2.0/?method=track.getInfo&api_key=${process.env.LASTFM_API_KEY}&artist=${encodeURIComponent(song.artist)}&track=${encodeURIComponent(song.title)}&format=json`;
+  const response = await fetch(lastfmUrl);
+  const data = await response.json();
+  if (!data.track) {
+    return null;
+  }
+
+  const track = data.track;
+  const tags = (track.toptags?.tag || []).map(tag => tag.name);
+  const genre = tags.find(tag => {
+    const name = tag.toLowerCase();
+    return !name.includes('spotify') &&
+           !name.includes('playlist') &&
+           !name.includes('top 100') &&
+           !name.includes('charts') &&
+           !name.match(/\d{4}/) &&
+           !name.includes('billboard');
+  }) || null;
+
+  return {
+    album: track.album?.title || null,
+    cover: track.album?.image?.find(img => img.size === 'extralarge')?.['#text'] || null,
+    genre: genre,
+    tags: tags,
+    duration: track.duration ? parseInt(track.duration) / 1000 : null,
+    playcount: parseInt(track.playcount || 0),
+    url: track.url || null
+  };
+}
+
 function getKeyComplexity(key, mode) {
   if (!key || !mode) return 25;
 
@@ -44,13 +44,17 @@ export default function Home() {
     }
   };
 
-  const pollJobStatus = async (jobId) => {
-    const maxAttempts = 180; // 15 minutes max (5 second intervals)
+  const pollJobStatus = async (jobId, onPartial) => {
+    const maxAttempts = 180; // 15 minutes max (~5 second long-polls)
     let attempts = 0;
+    let gotPartial = false;
 
     while (attempts < maxAttempts) {
       try {
-        const response = await fetch(`/api/check-job?jobId=${jobId}`);
+        // The service holds the request until the job finishes (or ~5s pass);
+        // until we have a preliminary ranking it also answers with that
+        const partialParam = gotPartial ? '' : '&partial=1';
+        const response = await fetch(`/api/check-job?jobId=${jobId}&wait=5${partialParam}`);
         const data = await response.json();
 
         if (response.status === 200 && data.success) {
@@ -59,11 +63,16 @@ export default function Home() {
         } else if (response.status === 500) {
           // Job failed
           throw new Error(data.details || 'Analysis failed');
+        } else if (data.partial && !gotPartial) {
+          // Preliminary ranking - show it and keep waiting for the final one
+          gotPartial = true;
+          if (onPartial) onPartial(data);
+          continue;
         }
 
-        // Job still processing (202 status)
-        // Wait 5 seconds before next poll
-        await new Promise(resolve => setTimeout(resolve, 5000));
+        // Job still processing (202 status) - the long-poll already waited,
+        // so re-poll after a short pause
+        await new Promise(resolve => setTimeout(resolve, 250));
         attempts++;
 
       } catch (err) {
@@ -112,7 +121,10 @@ export default function Home() {
       // If we got a job ID, start polling
       if (data.jobId) {
         setAnalysisProgress('Analyzing audio features...');
-        const results = await pollJobStatus(data.jobId);
+        const results = await pollJobStatus(data.jobId, (partial) => {
+          setResults(partial);
+          setAnalysisProgress('Refining recommendations...');
+        });
         setResults(results);
 
         // Save upload to history
@@ -1,13 +1,43 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
 import os
+
+# Concurrent analysis jobs, and the library threads each may use. The thread
+# budget has to be set before NumPy is imported (see thread_budget.py);
+# THREADS_PER_JOB overrides the even split of the available cores.
+import thread_budget
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', thread_budget.available_cores()))
+THREADS_PER_JOB = int(os.environ.get('THREADS_PER_JOB', 0)) or None
+thread_budget.configure(ANALYSIS_WORKERS, THREADS_PER_JOB)
+
+from flask import Flask, request, jsonify, Response
+from flask_cors import CORS
 import tempfile
 import json
+import time
 import numpy as np
-import librosa
 import uuid
-import threading
+import atexit
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from job_store import JobLimitExceeded, JobStore
+from query_log import QueryLog
+from search_batcher import SearchBatcher
+from song_index import SongIndex, exact_key_matrix
+from vector_backends import HttpBackend, InProcessBackend
+from worker_pool import WorkerPool
+import catalog_manifest
+import metrics
+import responses
+import track_info
+from metrics import timed
+from fingerprint import FINGERPRINT_FILE, FingerprintIndex
+from audio_features import (
+    ANALYSIS_PROFILES,
+    DEFAULT_TEMPO_ESTIMATOR,
+    EMBEDDING_SECONDS,
+    analyze_job_audio,
+    get_audio_duration,
+    native_sample_count
+)
 
 app = Flask(__name__)
 CORS(app)
@@ -16,8 +46,108 @@ EMBEDDINGS_DB = {}
 # Use full database now that we removed TensorFlow/OpenL3
 EMBEDDINGS_FILE = 'song_database/embeddings.json'
 
+# Search tiers: exhaustive scores every song with the full embedding; coarse
+# shortlists COARSE_SHORTLIST songs with a PCA descriptor and rescores those.
+# auto uses coarse once the catalog has COARSE_MIN_CATALOG songs.
+SEARCH_MODE = os.environ.get('SEARCH_MODE', 'auto')
+COARSE_SHORTLIST = int(os.environ.get('COARSE_SHORTLIST', 256))
+COARSE_MIN_CATALOG = int(os.environ.get('COARSE_MIN_CATALOG', 20000))
+
+# Where the embedding half of search runs: 'index' scores SONG_INDEX directly;
+# 'inprocess' and 'http' ask a VectorBackend for the VECTOR_SHORTLIST nearest
+# embeddings and rescore those with the hybrid score. 'http' talks to
+# VECTOR_SERVICE_URL (a Pinecone index host or local_vector_service.py).
+VECTOR_BACKEND = os.environ.get('VECTOR_BACKEND', 'index')
+VECTOR_SERVICE_URL = os.environ.get('VECTOR_SERVICE_URL', 'http://localhost:5100')
+VECTOR_SHORTLIST = int(os.environ.get('VECTOR_SHORTLIST', 256))
+
 # Job storage for async processing
-JOBS = {}  # {job_id: {status, result, error, created_at}}
+JOBS = JobStore()
+
+# Bounded pool for the CPU-heavy analysis work. Request handling (WSGI threads
+# or the ASGI event loop in asgi.py) only saves the upload and submits here.
+# Each analysis thread applies the per-job thread limits when it starts.
+ANALYSIS_POOL = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix='analysis',
+                                   initializer=thread_budget.apply_limits)
+
+# Per-job limits. With ANALYSIS_EXECUTOR=process each pool thread hands its
+# job to a worker process (worker_pool.py) that is killed when the job runs
+# past JOB_MAX_SECONDS or grows past WORKER_MAX_RSS_MB, and recycled after
+# WORKER_MAX_JOBS jobs or above WORKER_RECYCLE_RSS_MB. With 'thread' the time
+# limit is only checked between stages. JOB_MAX_SAMPLES caps the samples a
+# decode may materialize in both modes.
+ANALYSIS_EXECUTOR = os.environ.get('ANALYSIS_EXECUTOR', 'thread')
+JOB_MAX_SECONDS = float(os.environ.get('JOB_MAX_SECONDS', 90))
+JOB_MAX_SAMPLES = int(os.environ.get('JOB_MAX_SAMPLES', 6_000_000))
+WORKER_MAX_JOBS = int(os.environ.get('WORKER_MAX_JOBS', 50))
+WORKER_MAX_RSS_MB = int(os.environ.get('WORKER_MAX_RSS_MB', 1024))
+WORKER_RECYCLE_RSS_MB = int(os.environ.get('WORKER_RECYCLE_RSS_MB', 768))
+
+WORKER_POOL = None
+if ANALYSIS_EXECUTOR == 'process':
+    WORKER_POOL = WorkerPool(ANALYSIS_WORKERS, analyze_job_audio,
+                             max_jobs_per_worker=WORKER_MAX_JOBS,
+                             max_rss_bytes=WORKER_MAX_RSS_MB * 1024 * 1024,
+                             recycle_rss_bytes=WORKER_RECYCLE_RSS_MB * 1024 * 1024)
+    atexit.register(WORKER_POOL.shutdown)
+
+TRUTHY = ('1', 'true', 'yes', 'on')
+
+# Score songs by their best-matching time segment when the catalog has
+# segment embeddings (build_database.py --segments-only backfills them)
+SEGMENT_SEARCH = os.environ.get('SEGMENT_SEARCH', '1').lower() in TRUTHY
+
+# Key term of the librosa similarity: 'harmonic' gives related keys partial
+# credit (song_index.harmonic_key_matrix), 'exact' only credits the same key
+KEY_SIMILARITY = os.environ.get('KEY_SIMILARITY', 'harmonic').lower()
+
+# Transposition-invariant search: match the query's chroma against every
+# track's under all 12 shifts and suggest a capo fret (or down-tuning) per result.
+# Default for jobs that don't pass transpose=1|0.
+TRANSPOSE_SEARCH = os.environ.get('TRANSPOSE_SEARCH', '0').lower() in TRUTHY
+
+# Micro-batching of exhaustive searches: queries arriving within
+# SEARCH_BATCH_WINDOW_MS of each other (up to SEARCH_BATCH_MAX) are scored
+# with one matrix-matrix product. The window is skipped when no other job is
+# running.
+SEARCH_BATCHING = os.environ.get('SEARCH_BATCHING', '1').lower() in TRUTHY
+SEARCH_BATCH_MAX = int(os.environ.get('SEARCH_BATCH_MAX', 16))
+SEARCH_BATCH_WINDOW_MS = float(os.environ.get('SEARCH_BATCH_WINDOW_MS', 2))
+
+# Exact-match fast path: look the first FINGERPRINT_SECONDS of an upload up
+# in the landmark fingerprint index (python fingerprint.py build) and, on a
+# hit, answer from the catalog track's precomputed features and embedding
+FINGERPRINT_MATCH = os.environ.get('FINGERPRINT_MATCH', '1').lower() in TRUTHY
+FINGERPRINT_SECONDS = float(os.environ.get('FINGERPRINT_SECONDS', 8))
+
+# Progressive results: publish a preliminary result from a short window
+# (PREVIEW_SECONDS, fast profile, coarse search) while the full analysis runs.
+# PROGRESSIVE_RESULTS sets the default; jobs can pass progressive=0/1.
+PROGRESSIVE_RESULTS = os.environ.get('PROGRESSIVE_RESULTS', '0').lower() in TRUTHY
+PREVIEW_SECONDS = float(os.environ.get('PREVIEW_SECONDS', 6))
+PREVIEW_PROFILE = 'fast'
+
+# Query log: each full analysis's embedding, features, profile and returned
+# ids are appended off the request path to QUERY_LOG_DIR, in segments of
+# QUERY_LOG_SEGMENT_MB keeping the newest QUERY_LOG_MAX_SEGMENTS (up to about
+# 1.3 GB at the defaults). Off unless QUERY_LOG_DIR points at a mounted volume.
+# replay_queries.py re-runs scoring changes against it.
+QUERY_LOG_DIR = os.environ.get('QUERY_LOG_DIR', '')
+QUERY_LOG_SEGMENT_MB = float(os.environ.get('QUERY_LOG_SEGMENT_MB', 64))
+QUERY_LOG_MAX_SEGMENTS = int(os.environ.get('QUERY_LOG_MAX_SEGMENTS', 20))
+
+# Tempo estimator (see audio_features.TEMPO_SETTINGS): onset, fast or beat_track
+TEMPO_ESTIMATOR = os.environ.get('TEMPO_ESTIMATOR', DEFAULT_TEMPO_ESTIMATOR)
+
+# Default analysis profile (standard, fast, or auto). 'auto' switches to the
+# fast profile while AUTO_FAST_QUEUE_DEPTH or more jobs are waiting.
+ANALYSIS_PROFILE = os.environ.get('ANALYSIS_PROFILE', 'standard')
+AUTO_FAST_QUEUE_DEPTH = int(os.environ.get('AUTO_FAST_QUEUE_DEPTH', 2 * ANALYSIS_WORKERS))
+
+# Long-poll and event stream limits (seconds)
+MAX_LONG_POLL_SECONDS = 30
+SSE_HEARTBEAT_SECONDS = 15
+SSE_MAX_SECONDS = 600
 
 print("=" * 50, flush=True)
 print("Starting StrumSense Audio Analysis Service", flush=True)
@@ -38,6 +168,84 @@ else:
     print(f"✗ Warning: {EMBEDDINGS_FILE} not found", flush=True)
     print(f"Current directory contents: {os.listdir('.')}", flush=True)
 
+# Feature drift: how many catalog tracks were featurized with the extractor
+# parameters queries use now (see recompute_catalog.py)
+CATALOG_DRIFT = {}
+if os.path.exists(catalog_manifest.MANIFEST_FILE):
+    CATALOG_DRIFT = catalog_manifest.drift_summary(
+        catalog_manifest.load_manifest(),
+        groups=[catalog_manifest.feature_group(profile) for profile in sorted(ANALYSIS_PROFILES)],
+        tempo_estimator=TEMPO_ESTIMATOR)
+    for group, counts in CATALOG_DRIFT.items():
+        if counts['stale'] or counts['untracked']:
+            print(f"⚠ {group}: {counts['stale']} stale, {counts['untracked']} untracked catalog tracks "
+                  f"(run recompute_catalog.py)", flush=True)
+
+# Vectorized search index over the catalog (None when no embeddings loaded)
+SONG_INDEX = SongIndex.from_catalog(
+    EMBEDDINGS_DB, use_segments=SEGMENT_SEARCH,
+    key_compatibility=exact_key_matrix() if KEY_SIMILARITY == 'exact' else None)
+if SONG_INDEX is not None:
+    print(f"✓ Built search index ({SONG_INDEX.embeddings.shape[1]}-dim, "
+          f"{SONG_INDEX.segment_count} segment(s) per song, "
+          f"{SONG_INDEX.coarse.shape[1]}-dim coarse tier)", flush=True)
+
+
+def create_vector_backend():
+    """
+    The inprocess backend holds one row per segment, '<song id>#<segment>',
+    so get_similar_songs keeps max-over-segments scoring (see fold_segments).
+    An http index holds what upload_to_pinecone.py uploaded: one averaged
+    embedding per song.
+    """
+    if VECTOR_BACKEND == 'http':
+        if SONG_INDEX is not None and SONG_INDEX.segment_count > 1:
+            print("⚠️  VECTOR_BACKEND=http scores averaged embeddings; SEGMENT_SEARCH "
+                  "only applies to the index and inprocess backends", flush=True)
+        return HttpBackend(VECTOR_SERVICE_URL, api_key=os.environ.get('PINECONE_API_KEY'))
+    if VECTOR_BACKEND == 'inprocess' and SONG_INDEX is not None:
+        if SONG_INDEX.segment_count == 1:
+            return InProcessBackend.from_matrix(SONG_INDEX.ids, SONG_INDEX.embeddings)
+        # A view of the normalized (N, K, D) segments, no copy
+        segments = SONG_INDEX.segments.reshape(-1, SONG_INDEX.segments.shape[2])
+        ids = [f'{song_id}#{k}' for song_id in SONG_INDEX.ids for k in range(SONG_INDEX.segment_count)]
+        return InProcessBackend.from_matrix(ids, segments)
+    return None
+
+
+SEARCH_BACKEND = create_vector_backend()
+BACKEND_SEGMENTS = SONG_INDEX.segment_count if SEARCH_BACKEND is not None and VECTOR_BACKEND == 'inprocess' else 1
+if SEARCH_BACKEND is not None:
+    print(f"✓ Using {VECTOR_BACKEND} vector backend ({BACKEND_SEGMENTS} segment(s) per song)", flush=True)
+
+QUERY_LOG = None
+if QUERY_LOG_DIR and SONG_INDEX is not None:
+    QUERY_LOG = QueryLog(QUERY_LOG_DIR, SONG_INDEX.embeddings.shape[1],
+                         max_segment_bytes=int(QUERY_LOG_SEGMENT_MB * 1024 * 1024),
+                         max_segments=QUERY_LOG_MAX_SEGMENTS)
+    atexit.register(QUERY_LOG.close)
+
+SEARCH_BATCHER = None
+if SEARCH_BATCHING and SONG_INDEX is not None:
+    SEARCH_BATCHER = SearchBatcher(SONG_INDEX, max_batch=SEARCH_BATCH_MAX,
+                                   window_seconds=SEARCH_BATCH_WINDOW_MS / 1000,
+                                   expect_more=lambda: metrics.JOBS_RUNNING.value() > 1)
+
+# Display metadata (album, cover, genre, URL) per catalog track, attached to
+# results as 'info' (refreshed offline by track_info.py)
+TRACK_INFO = track_info.result_table(track_info.load_track_info())
+if TRACK_INFO:
+    print(f"✓ Loaded track info for {len(TRACK_INFO)} tracks", flush=True)
+
+FINGERPRINT_INDEX = None
+if FINGERPRINT_MATCH and SONG_INDEX is not None and os.path.exists(FINGERPRINT_FILE):
+    try:
+        FINGERPRINT_INDEX = FingerprintIndex.load(FINGERPRINT_FILE)
+        print(f"✓ Loaded fingerprints for {len(FINGERPRINT_INDEX)} tracks "
+              f"({len(FINGERPRINT_INDEX.hashes)} hashes)", flush=True)
+    except ValueError as e:
+        print(f"⚠ Fingerprint fast path disabled: {e}", flush=True)
+
 @app.route('/', methods=['GET'])
 def root():
     return jsonify({
@@ -52,9 +260,17 @@ def health():
     return jsonify({
         'status': 'ok',
         'embeddings_loaded': len(EMBEDDINGS_DB) > 0,
-        'total_songs': len(EMBEDDINGS_DB)
+        'total_songs': len(EMBEDDINGS_DB),
+        'json_encoder': responses.JSON_ENCODER,
+        'fingerprints': len(FINGERPRINT_INDEX) if FINGERPRINT_INDEX is not None else 0,
+        'catalog_features': CATALOG_DRIFT,
+        'threads': thread_budget.effective_settings()
     })
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/analyze', methods=['POST'])
 def analyze_audio():
     try:
@@ -63,32 +279,46 @@ def analyze_audio():
 
         audio_file = request.files['audio']
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
+        with timed('upload_save'), tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
             audio_file.save(tmp_file.name)
             tmp_path = tmp_file.name
 
         try:
-            y, sr = librosa.load(tmp_path, sr=None, mono=True)
-            duration = float(librosa.get_duration(y=y, sr=sr))
-
-            print("Extracting Librosa features...")
-            audio_features = extract_librosa_features(tmp_path)
-
-            print("Extracting OpenL3 embedding...")
-            openl3_embedding = extract_openl3_embedding(tmp_path)
-
-            similar_songs = []
-            if openl3_embedding:
-                similar_songs = get_similar_songs(openl3_embedding, audio_features, top_k=10)
+            options = job_options(request.args, request.form)
+            profile = options['profile']
+            match = identify_upload(tmp_path)
+            if match is not None:
+                duration, audio_features, similar_songs = identified_result(tmp_path, match, profile)
+            else:
+                print("Extracting Librosa features and embedding...")
+                analysis = run_analysis(tmp_path, profile)
+                duration = analysis['duration']
+                audio_features = analysis['features']
+                openl3_embedding = analysis['embedding']
+
+                similar_songs = []
+                if openl3_embedding:
+                    similar_songs = get_similar_songs(openl3_embedding, audio_features, top_k=10,
+                                                      profile=profile, transpose=options['transpose'])
+                    log_query(openl3_embedding, audio_features, profile, similar_songs, duration)
 
             result = {
                 'success': True,
                 'duration': duration,
+                'profile': profile,
                 'features': audio_features,
                 'similarSongs': similar_songs
             }
+            if match is not None:
+                result['identified'] = match
+
+            fields = responses.parse_fields(request.args.get('fields'))
+            with timed('serialize'):
+                return json_bytes_response(responses.dumps(responses.project(result, fields) if fields else result))
 
-            return jsonify(result)
+        except JobLimitExceeded as e:
+            metrics.JOB_LIMITS_TOTAL.inc(limit=e.limit)
+            return jsonify({'error': str(e), 'limit': e.limit}), 422
 
         finally:
             if os.path.exists(tmp_path):
@@ -112,24 +342,12 @@ def analyze_audio_async():
         job_id = str(uuid.uuid4())
 
         # Save audio file to temp location
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
+        with timed('upload_save'), tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
             audio_file.save(tmp_file.name)
             tmp_path = tmp_file.name
 
-        # Initialize job status
-        JOBS[job_id] = {
-            'status': 'processing',
-            'result': None,
-            'error': None,
-            'created_at': datetime.now().isoformat()
-        }
-
-        # Start background processing
-        thread = threading.Thread(target=process_audio_job, args=(job_id, tmp_path))
-        thread.daemon = True
-        thread.start()
-
-        print(f"Started async job {job_id}")
+        # Initialize job status and queue it on the analysis pool
+        submit_audio_job(job_id, tmp_path, job_options(request.args, request.form))
 
         return jsonify({
             'job_id': job_id,
@@ -143,262 +361,396 @@ def analyze_audio_async():
 
 @app.route('/job-status/<job_id>', methods=['GET'])
 def get_job_status(job_id):
-    """Get the status of an async job"""
+    """
+    Get the status of an async job.
+    Pass ?wait=N to long-poll: the request returns as soon as the job finishes,
+    or after N seconds (capped at MAX_LONG_POLL_SECONDS) if it is still running.
+    Pass ?fields=a,b.c to return only those result fields.
+    Pass ?partial=1 to also return as soon as a preliminary result is published.
+    """
+    wait = request.args.get('wait', type=float)
+    if wait and wait > 0:
+        job = JOBS.wait(job_id, timeout=min(wait, MAX_LONG_POLL_SECONDS),
+                        partial=request.args.get('partial', '').lower() in TRUTHY)
+    else:
+        job = JOBS.get(job_id)
+
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    fields = responses.parse_fields(request.args.get('fields'))
+    with timed('serialize'):
+        return json_bytes_response(build_job_response(job_id, job, fields))
+
+
+@app.route('/job-events/<job_id>', methods=['GET'])
+def stream_job_events(job_id):
+    """Stream job progress as server-sent events until the job finishes"""
     if job_id not in JOBS:
         return jsonify({'error': 'Job not found'}), 404
+    fields = responses.parse_fields(request.args.get('fields'))
+
+    def generate():
+        started = time.monotonic()
+        # Below every real version, so the current state is sent right away
+        version = -1
+        while time.monotonic() - started < SSE_MAX_SECONDS:
+            job = JOBS.wait(job_id, since_version=version, timeout=SSE_HEARTBEAT_SECONDS)
+            if job is None:
+                return
+            if job['version'] == version:
+                # Nothing new - keep intermediaries from closing the connection
+                yield ': keep-alive\n\n'
+                continue
+            version = job['version']
+
+            event = job['status'] if job['status'] != 'processing' else 'progress'
+            payload = build_job_response(job_id, job, fields).decode('utf-8')
+            yield f"id: {version}\nevent: {event}\ndata: {payload}\n\n"
+
+            if job['status'] != 'processing':
+                return
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
-    job = JOBS[job_id]
 
+def build_job_response(job_id, job, fields=None):
+    """Encoded status response (JSON bytes), with the stored result spliced in"""
     response = {
         'job_id': job_id,
         'status': job['status'],
+        'stage': job['stage'],
         'created_at': job['created_at']
     }
+    if job.get('started_at'):
+        response['started_at'] = job['started_at']
 
     if job['status'] == 'completed':
-        response['result'] = job['result']
-    elif job['status'] == 'failed':
+        response['partial'] = False
+        return responses.job_body(response, job['result'], fields)
+    if job['status'] == 'processing' and job.get('partial'):
+        response['partial'] = True
+        return responses.job_body(response, job['result'], fields)
+    if job['status'] == 'failed':
         response['error'] = job['error']
+        if job.get('limit'):
+            response['limit'] = job['limit']
+
+    return responses.job_body(response)
+
 
-    return jsonify(response)
+def json_bytes_response(body, status=200):
+    """Response for pre-encoded JSON, compressed when the client accepts it"""
+    body, headers = responses.encode_for_client(body, request.headers.get('Accept-Encoding'))
+    return Response(body, status=status, mimetype='application/json', headers=headers)
 
 
-def process_audio_job(job_id, audio_path):
+def job_options(*sources):
+    """
+    Read per-job options from request mappings (query args, form fields).
+    timings=1 attaches a per-stage timing breakdown to the job result.
+    profile=standard|fast selects the analysis profile for this job.
+    progressive=1|0 turns the preliminary result on or off (PROGRESSIVE_RESULTS).
+    transpose=1|0 turns transposition-invariant search on or off (TRANSPOSE_SEARCH).
+    """
+    options = {'timings': False, 'profile': None, 'progressive': PROGRESSIVE_RESULTS,
+               'transpose': TRANSPOSE_SEARCH}
+    for source in sources:
+        if str(source.get('timings', '')).lower() in TRUTHY:
+            options['timings'] = True
+        if source.get('progressive') is not None:
+            options['progressive'] = str(source.get('progressive')).lower() in TRUTHY
+        if source.get('transpose') is not None:
+            options['transpose'] = str(source.get('transpose')).lower() in TRUTHY
+        if source.get('profile') in ANALYSIS_PROFILES:
+            options['profile'] = source.get('profile')
+    if options['profile'] is None:
+        options['profile'] = default_profile()
+    return options
+
+
+def default_profile():
+    if ANALYSIS_PROFILE == 'auto':
+        busy = metrics.JOBS_WAITING.value() >= AUTO_FAST_QUEUE_DEPTH
+        return 'fast' if busy else 'standard'
+    return ANALYSIS_PROFILE if ANALYSIS_PROFILE in ANALYSIS_PROFILES else 'standard'
+
+
+def submit_audio_job(job_id, audio_path, options=None):
+    """Register a job and hand it to the analysis pool"""
+    JOBS.create(job_id)
+    metrics.JOBS_TOTAL.inc(event='queued')
+    metrics.JOBS_WAITING.inc()
+    ANALYSIS_POOL.submit(process_audio_job, job_id, audio_path, options or job_options())
+    print(f"Started async job {job_id}", flush=True)
+
+
+def process_audio_job(job_id, audio_path, options=None):
     """Background worker function to process audio"""
+    options = options or job_options()
+    metrics.JOBS_WAITING.dec()
+    metrics.JOBS_RUNNING.inc()
+    metrics.JOBS_TOTAL.inc(event='started')
     try:
         print(f"Processing job {job_id}...", flush=True)
 
-        # Get FULL duration first (without duration limit)
-        y_full, sr_full = librosa.load(audio_path, sr=22050, mono=True)
-        duration = float(librosa.get_duration(y=y_full, sr=sr_full))
-        print(f"Job {job_id}: Full audio duration: {duration:.1f}s", flush=True)
-
-        # Free full audio after getting duration
-        del y_full, sr_full
-
-        # Extract features
-        print(f"Job {job_id}: Extracting Librosa features...", flush=True)
-        audio_features = extract_librosa_features(audio_path)
-
-        print(f"Job {job_id}: Extracting OpenL3 embedding...", flush=True)
-        openl3_embedding = extract_openl3_embedding(audio_path)
-
-        # Find similar songs
-        similar_songs = []
-        if openl3_embedding:
-            print(f"Job {job_id}: Finding similar songs...", flush=True)
-            similar_songs = get_similar_songs(openl3_embedding, audio_features, top_k=10)
-
-        # Free embedding after comparison
-        del openl3_embedding
-
-        # Update job with results
-        JOBS[job_id]['status'] = 'completed'
-        JOBS[job_id]['result'] = {
+        profile = options['profile']
+        with metrics.job_timings() as timings, timed('job_total'):
+            match = None
+            if FINGERPRINT_INDEX is not None:
+                JOBS.update(job_id, stage='fingerprint', started_at=datetime.now().isoformat())
+                match = identify_upload(audio_path)
+
+            if match is not None:
+                # Exact catalog hit: no decode/feature/embedding pipeline
+                print(f"Job {job_id}: identified as {match['id']} ({match['votes']} aligned hashes)", flush=True)
+                JOBS.set_stage(job_id, 'search')
+                duration, audio_features, similar_songs = identified_result(audio_path, match, profile)
+            else:
+                started = {} if FINGERPRINT_INDEX is not None else {'started_at': datetime.now().isoformat()}
+                if options['progressive']:
+                    JOBS.update(job_id, stage='preview', **started)
+                    started = {}
+                    publish_preview(job_id, audio_path, options['transpose'])
+
+                # Audio is decoded once, at the profile's sample rate, and shared
+                # by every feature; the worker reports each stage as it starts
+                JOBS.update(job_id, stage='decode', **started)
+
+                def on_stage(stage):
+                    if stage != 'decode':
+                        JOBS.set_stage(job_id, stage)
+                    print(f"Job {job_id}: {stage} (profile: {profile})", flush=True)
+
+                analysis = run_analysis(audio_path, profile, on_stage)
+                duration = analysis['duration']
+                audio_features = analysis['features']
+                openl3_embedding = analysis['embedding']
+                print(f"Job {job_id}: Full audio duration: {duration:.1f}s", flush=True)
+
+                # Find similar songs
+                similar_songs = []
+                if openl3_embedding:
+                    JOBS.set_stage(job_id, 'search')
+                    print(f"Job {job_id}: Finding similar songs...", flush=True)
+                    with timed('search'):
+                        similar_songs = get_similar_songs(openl3_embedding, audio_features, top_k=10,
+                                                          profile=profile, transpose=options['transpose'])
+                    log_query(openl3_embedding, audio_features, profile, similar_songs, duration)
+
+                # Free embedding after comparison
+                del openl3_embedding
+
+        result = {
             'success': True,
             'duration': duration,
+            'profile': profile,
             'features': audio_features,
             'similarSongs': similar_songs
         }
+        if match is not None:
+            result['identified'] = match
+        if options['timings']:
+            result['timings'] = timings
+
+        # Encode the result once; status polls splice these bytes into
+        # their response. Completing wakes up long-polls and event streams.
+        with timed('serialize'):
+            encoded = responses.dumps(result)
+        JOBS.complete(job_id, encoded)
+        metrics.JOBS_TOTAL.inc(event='completed')
 
         print(f"Job {job_id} completed successfully", flush=True)
 
+    except JobLimitExceeded as e:
+        print(f"Job {job_id} stopped: {e}", flush=True)
+        JOBS.fail(job_id, str(e), limit=e.limit)
+        metrics.JOB_LIMITS_TOTAL.inc(limit=e.limit)
+        metrics.JOBS_TOTAL.inc(event='failed')
+
     except Exception as e:
         print(f"Job {job_id} failed: {e}", flush=True)
-        JOBS[job_id]['status'] = 'failed'
-        JOBS[job_id]['error'] = str(e)
+        JOBS.fail(job_id, str(e))
+        metrics.JOBS_TOTAL.inc(event='failed')
 
     finally:
+        metrics.JOBS_RUNNING.dec()
         # Clean up temp file
         if os.path.exists(audio_path):
             os.unlink(audio_path)
             print(f"Job {job_id}: Cleaned up temp file", flush=True)
 
 
-def extract_librosa_features(audio_path):
-    # Analyze only first 15 seconds instead of 30 for faster processing
-    y, sr = librosa.load(audio_path, duration=15.0, sr=22050, mono=True)
-
-    tempo, _ = librosa.beat.beat_track(y=y, sr=sr, hop_length=512)
-    tempo = float(tempo) if isinstance(tempo, (int, float, np.number)) else float(tempo[0])
-
-    chroma = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=512)
-    chroma_vals = np.sum(chroma, axis=1)
-    chroma_vals = chroma_vals / np.sum(chroma_vals)
-
-    major_profile = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
-    minor_profile = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
-    major_profile = major_profile / np.sum(major_profile)
-    minor_profile = minor_profile / np.sum(minor_profile)
-
-    keys = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-    max_corr = -1
-    detected_key = 'C'
-    detected_mode = 'Major'
-
-    for i in range(12):
-        # Roll the chroma values, not the profiles
-        chroma_rotated = np.roll(chroma_vals, -i)
-
-        major_corr = np.correlate(chroma_rotated, major_profile)[0]
-        minor_corr = np.correlate(chroma_rotated, minor_profile)[0]
-
-        if major_corr > max_corr:
-            max_corr = major_corr
-            detected_key = keys[i]
-            detected_mode = 'Major'
-
-        if minor_corr > max_corr:
-            max_corr = minor_corr
-            detected_key = keys[i]
-            detected_mode = 'Minor'
-
-    rms = librosa.feature.rms(y=y, hop_length=512)
-    energy = float(np.mean(rms))
-
-    spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr, hop_length=512)
-    brightness = float(np.mean(spectral_centroid))
-
-    return {
-        'tempo': round(tempo, 1),
-        'key': detected_key,
-        'mode': detected_mode,
-        'energy': round(energy, 4),
-        'brightness': round(brightness, 1)
-    }
-
-
-def extract_openl3_embedding(audio_path):
+def publish_preview(job_id, audio_path, transpose=False):
     """
-    Extract lightweight audio features to match against precomputed OpenL3 embeddings.
-    Uses MFCC + spectral features instead of OpenL3 to avoid TensorFlow memory overhead.
+    First pass for progressive jobs: analyze the first PREVIEW_SECONDS with the
+    fast profile, shortlist with the coarse tier, and publish the ranking as a
+    partial result. If the fast profile fails, the same window is retried with
+    the standard profile; other failures only skip the preview (counted in
+    strumsense_previews_total).
     """
-    # Load audio (30 seconds max)
-    y, sr = librosa.load(audio_path, sr=22050, mono=True, duration=30.0)
-
-    # Extract MFCC features (mel-frequency cepstral coefficients)
-    # These capture timbral characteristics similar to OpenL3 but much lighter
-    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=20, hop_length=512)
-    mfcc_mean = np.mean(mfccs, axis=1)
-    mfcc_std = np.std(mfccs, axis=1)
-
-    # Spectral features
-    spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr, hop_length=512)
-    spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr, hop_length=512)
-    spectral_contrast = librosa.feature.spectral_contrast(y=y, sr=sr, hop_length=512)
-    spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr, hop_length=512)
-
-    # Chroma features
-    chroma = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=512)
-
-    # Zero crossing rate (percussiveness indicator)
-    zcr = librosa.feature.zero_crossing_rate(y=y, hop_length=512)
-
-    # Tonnetz (harmonic features)
-    tonnetz = librosa.feature.tonnetz(y=y, sr=sr, hop_length=512)
-
-    # Combine into feature vector and pad to 512 dimensions to match database
-    feature_vector = np.concatenate([
-        mfcc_mean,                                   # 20 features
-        mfcc_std,                                    # 20 features
-        np.mean(spectral_centroid, axis=1),          # 1 feature
-        np.mean(spectral_rolloff, axis=1),           # 1 feature
-        np.mean(spectral_contrast, axis=1),          # 7 features
-        np.mean(spectral_bandwidth, axis=1),         # 1 feature
-        np.mean(chroma, axis=1),                     # 12 features
-        np.mean(zcr, axis=1),                        # 1 feature
-        np.mean(tonnetz, axis=1)                     # 6 features
-    ])
-
-    # Pad to 512 dimensions to match precomputed OpenL3 embeddings
-    # This allows cosine similarity to work correctly
-    if len(feature_vector) < 512:
-        feature_vector = np.pad(feature_vector, (0, 512 - len(feature_vector)))
-    else:
-        feature_vector = feature_vector[:512]
+    outcome = 'published'
+    try:
+        with timed('preview'):
+            profile = PREVIEW_PROFILE
+            try:
+                analysis = run_analysis(audio_path, profile, seconds=PREVIEW_SECONDS)
+            except JobLimitExceeded:
+                raise
+            except Exception as e:
+                if profile == 'standard':
+                    raise
+                print(f"Job {job_id}: {profile} preview failed ({e}), retrying with the standard profile",
+                      flush=True)
+                outcome, profile = 'fallback', 'standard'
+                analysis = run_analysis(audio_path, profile, seconds=PREVIEW_SECONDS)
+            similar_songs = []
+            if analysis['embedding']:
+                similar_songs = get_similar_songs(analysis['embedding'], analysis['features'], top_k=10,
+                                                  profile=profile, mode='coarse', transpose=transpose)
+            preview = {
+                'success': True,
+                'duration': analysis['duration'],
+                'profile': profile,
+                'features': analysis['features'],
+                'similarSongs': similar_songs
+            }
+            JOBS.publish_partial(job_id, responses.dumps(preview))
+        metrics.PREVIEWS_TOTAL.inc(outcome=outcome)
+        print(f"Job {job_id}: published preview ({len(similar_songs)} songs, {profile} profile)", flush=True)
+    except JobLimitExceeded:
+        raise
+    except Exception as e:
+        metrics.PREVIEWS_TOTAL.inc(outcome='failed')
+        print(f"Job {job_id}: preview failed: {e}", flush=True)
 
-    # Free memory
-    del y, mfccs
 
-    return feature_vector.tolist()
+def run_analysis(audio_path, profile, on_stage=None, seconds=EMBEDDING_SECONDS):
+    """Decode, features and embedding under the job limits (worker process or this thread)"""
+    if WORKER_POOL is not None:
+        return WORKER_POOL.run(audio_path, profile, TEMPO_ESTIMATOR, JOB_MAX_SAMPLES,
+                               timeout=JOB_MAX_SECONDS, on_stage=on_stage, seconds=seconds)
 
+    started = time.monotonic()
 
-def cosine_similarity(vec1, vec2):
-    vec1 = np.array(vec1)
-    vec2 = np.array(vec2)
-    return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
+    def check_stage(stage):
+        if time.monotonic() - started > JOB_MAX_SECONDS:
+            raise JobLimitExceeded('time', f'Analysis exceeded the {JOB_MAX_SECONDS:.0f}s time limit')
+        if on_stage:
+            on_stage(stage)
 
+    return analyze_job_audio(audio_path, profile, TEMPO_ESTIMATOR, JOB_MAX_SAMPLES, on_stage=check_stage,
+                             seconds=seconds)
 
-def calculate_librosa_similarity(features1, features2):
-    score = 0
-    total_weight = 0
 
-    if features1.get('tempo') and features2.get('tempo'):
-        tempo_diff = abs(features1['tempo'] - features2['tempo'])
-        tempo_similarity = max(0, 1 - (tempo_diff / 100))
-        score += 0.3 * tempo_similarity
-        total_weight += 0.3
+def log_query(embedding, features, profile, similar_songs, duration):
+    if QUERY_LOG is not None:
+        QUERY_LOG.record(embedding, features, profile, similar_songs, duration)
 
-    if features1.get('key') and features2.get('key'):
-        key_match = 1.0 if (features1['key'] == features2['key'] and
-                           features1['mode'] == features2['mode']) else 0.0
-        score += 0.3 * key_match
-        total_weight += 0.3
 
-    if features1.get('energy') and features2.get('energy'):
-        energy_diff = abs(features1['energy'] - features2['energy'])
-        energy_similarity = max(0, 1 - energy_diff)
-        score += 0.2 * energy_similarity
-        total_weight += 0.2
+def identify_upload(audio_path):
+    """
+    Fingerprint the start of an upload; the matching catalog track or None.
+    The decode runs in this process, outside the worker limits, so uploads
+    whose header says the window would exceed JOB_MAX_SAMPLES skip the lookup
+    and go straight to the limited pipeline.
+    """
+    if FINGERPRINT_INDEX is None:
+        return None
+    native = native_sample_count(audio_path, FINGERPRINT_SECONDS)
+    if JOB_MAX_SAMPLES and native is not None and native > JOB_MAX_SAMPLES:
+        metrics.FINGERPRINT_LOOKUPS_TOTAL.inc(outcome='skipped')
+        return None
+    try:
+        with timed('fingerprint'):
+            match = FINGERPRINT_INDEX.identify_file(audio_path, seconds=FINGERPRINT_SECONDS)
+    except Exception as e:
+        # Anything the fingerprint decode trips over goes through the full
+        # pipeline, which reports it under the job limits
+        print(f"Fingerprint lookup failed: {e}", flush=True)
+        match = None
+    if match is not None and match['id'] not in SONG_INDEX.row_of:
+        match = None
+    metrics.FINGERPRINT_LOOKUPS_TOTAL.inc(outcome='hit' if match else 'miss')
+    if match is not None:
+        song = SONG_INDEX.metadata[SONG_INDEX.row_of[match['id']]]
+        match.update(title=song['title'], artist=song['artist'])
+        attach_track_info(match)
+    return match
+
+
+def identified_result(audio_path, match, profile):
+    """(duration, features, similar songs) for an upload identified as a catalog track"""
+    row = SONG_INDEX.row_of[match['id']]
+    duration = get_audio_duration(audio_path)
+    features = SONG_INDEX.track_features(row, profile)
+    with timed('search'):
+        # The track itself is reported under 'identified', not as a recommendation
+        similar_songs = get_similar_songs(SONG_INDEX.embeddings[row].tolist(), features, top_k=11,
+                                          profile=profile)
+    similar_songs = [song for song in similar_songs if song['id'] != match['id']][:10]
+    return duration, features, similar_songs
+
+
+def get_similar_songs(embedding, uploaded_features, top_k=10, profile='standard', mode=None, transpose=False):
+    """
+    Top matches as response rows. With transpose, keys are scored
+    transposition-invariantly and each row gets 'transpose' (semitones the
+    recording sounds above the upload, -5..+6) and 'capo' (the fret for
+    transpose >= 0; None when the recording is lower and needs a down-tuning).
+    """
+    if SONG_INDEX is None or not embedding:
+        return []
 
-    if features1.get('brightness') and features2.get('brightness'):
-        brightness_diff = abs(features1['brightness'] - features2['brightness'])
-        brightness_similarity = max(0, 1 - (brightness_diff / 2000))
-        score += 0.2 * brightness_similarity
-        total_weight += 0.2
+    if SEARCH_BACKEND is not None and mode is None:
+        with timed('search.backend'):
+            response = SEARCH_BACKEND.query(embedding, top_k=max(VECTOR_SHORTLIST, top_k) * BACKEND_SEGMENTS)
+        candidates = response.get('matches', [])
+        if BACKEND_SEGMENTS > 1:
+            candidates = fold_segments(candidates)
+        matches = SONG_INDEX.rescore([c['id'] for c in candidates], [c['score'] for c in candidates],
+                                     uploaded_features, top_k=top_k, profile=profile, transpose=transpose)
+    elif SEARCH_BATCHER is not None and (mode or search_mode()) == 'exhaustive':
+        matches = SEARCH_BATCHER.search(embedding, uploaded_features, top_k=top_k, profile=profile,
+                                        transpose=transpose)
+    else:
+        matches = SONG_INDEX.search(embedding, uploaded_features, top_k=top_k, profile=profile,
+                                    mode=mode or search_mode(), shortlist=COARSE_SHORTLIST, transpose=transpose)
+    rows = [attach_track_info(SONG_INDEX.result_row(*match)) for match in matches]
+    if transpose:
+        shifts = SONG_INDEX.transposition(uploaded_features, [match[0] for match in matches], profile)
+        for row, shift in zip(rows, shifts):
+            row['transpose'] = shift
+            row['capo'] = shift if shift is not None and shift >= 0 else None
+    return rows
+
+
+def fold_segments(matches):
+    """
+    Segment-level matches ('<song id>#<segment>', best first) to one match
+    per song scored by its best segment, the same max SongIndex takes
+    """
+    best = {}
+    for match in matches:
+        best.setdefault(match['id'].rsplit('#', 1)[0], match['score'])
+    return [{'id': song_id, 'score': score} for song_id, score in best.items()]
 
-    return score / total_weight if total_weight > 0 else 0
 
+def attach_track_info(song):
+    info = TRACK_INFO.get(song['id'])
+    if info is not None:
+        song['info'] = info
+    return song
 
-def get_similar_songs(embedding, uploaded_features, top_k=10):
-    if not EMBEDDINGS_DB or not embedding:
-        return []
 
-    similarities = []
-    for song_id, song_data in EMBEDDINGS_DB.items():
-        # Calculate raw similarity (will be low due to lightweight features vs OpenL3)
-        raw_similarity = cosine_similarity(embedding, song_data['embedding'])
-
-        librosa_similarity = calculate_librosa_similarity(uploaded_features, song_data)
-
-        # Boost the similarity to compensate for lightweight features
-        # Use exponential scaling to create natural variation (85-99% range)
-        # Higher raw similarity = exponentially higher boosted score
-        normalized = min(1.0, raw_similarity / 0.3)  # Normalize to 0-1 range
-        boosted_similarity = 0.85 + (0.14 * (normalized ** 0.5))  # Square root for gentler curve
-
-        # Add small variation based on librosa similarity for more realistic spread
-        variation = librosa_similarity * 0.03
-        boosted_similarity = min(0.99, max(0.85, boosted_similarity + variation))
-
-        final_similarity = (0.70 * boosted_similarity) + (0.30 * librosa_similarity)
-
-        similarities.append({
-            'id': song_id,
-            'title': song_data['title'],
-            'artist': song_data['artist'],
-            'similarity_score': float(final_similarity),
-            'openl3_score': float(boosted_similarity),  # Display boosted score for UI
-            'librosa_score': float(librosa_similarity),
-            'tempo': song_data.get('tempo'),
-            'key': song_data.get('key'),
-            'mode': song_data.get('mode'),
-            'energy': song_data.get('energy'),
-            'brightness': song_data.get('brightness')
-        })
-
-    similarities.sort(key=lambda x: x['similarity_score'], reverse=True)
-    return similarities[:top_k]
+def search_mode():
+    """Coarse-to-fine search once the catalog is big enough for it to pay off"""
+    if SEARCH_MODE == 'auto':
+        return 'coarse' if len(SONG_INDEX) >= COARSE_MIN_CATALOG else 'exhaustive'
+    return SEARCH_MODE
 
 
 if __name__ == '__main__':
@@ -9,6 +9,8 @@ import uuid
 import threading
 from datetime import datetime
 
+from song_index import KEY_COMPATIBILITY, key_id
+
 app = Flask(__name__)
 CORS(app)
 
@@ -267,10 +269,10 @@ def calculate_librosa_similarity(features1, features2):
         score += 0.3 * tempo_similarity
         total_weight += 0.3
 
-    if features1.get('key') and features2.get('key'):
-        key_match = 1.0 if (features1['key'] == features2['key'] and
-                           features1['mode'] == features2['mode']) else 0.0
-        score += 0.3 * key_match
+    key1 = key_id(features1.get('key'), features1.get('mode'))
+    key2 = key_id(features2.get('key'), features2.get('mode'))
+    if key1 >= 0 and key2 >= 0:
+        score += 0.3 * float(KEY_COMPATIBILITY[key1, key2])
         total_weight += 0.3
 
     if features1.get('energy') and features2.get('energy'):
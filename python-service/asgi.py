@@ -0,0 +1,177 @@
+"""
+ASGI front end for the StrumSense audio analysis service.
+
+Uploads, status polls, long-polls and event streams are handled on the event
+loop, so slow clients only cost a coroutine instead of a WSGI thread. Decoded
+work is handed to the same bounded analysis pool the Flask app uses, and every
+other route falls through to the Flask app.
+
+Run with:
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+"""
+
+import asyncio
+import tempfile
+import time
+import uuid
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app,
+    JOBS,
+    MAX_LONG_POLL_SECONDS,
+    SSE_HEARTBEAT_SECONDS,
+    SSE_MAX_SECONDS,
+    TRUTHY,
+    build_job_response,
+    job_options,
+    submit_audio_job
+)
+import responses
+from metrics import timed
+
+# Upload chunks are written to disk on the thread pool (one hop per chunk)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def wait_for_job(job_id, since_version=None, timeout=30.0, partial=False):
+    """
+    Async counterpart of JobStore.wait: resolves as soon as the job changes
+    past since_version (or finishes, or with partial=True publishes a
+    preliminary result), without holding a thread.
+    """
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def on_update(snapshot):
+        loop.call_soon_threadsafe(changed.set)
+
+    JOBS.add_listener(job_id, on_update)
+    try:
+        job = JOBS.get(job_id)
+        if job is None:
+            return None
+        if job['status'] != 'processing' or (partial and job['partial']):
+            return job
+        if since_version is not None and job['version'] > since_version:
+            return job
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return JOBS.get(job_id)
+    finally:
+        JOBS.remove_listener(job_id, on_update)
+
+
+async def analyze_audio_async(request):
+    """Receive the upload on the event loop, then queue the analysis job"""
+    try:
+        form = await request.form()
+        audio_file = form.get('audio')
+        if audio_file is None or isinstance(audio_file, str):
+            return JSONResponse({'error': 'No audio file provided'}, status_code=400)
+
+        job_id = str(uuid.uuid4())
+
+        # File I/O runs on the thread pool so large uploads don't block the loop
+        with timed('upload_save'):
+            tmp_file = await run_in_threadpool(tempfile.NamedTemporaryFile, delete=False, suffix='.mp3')
+            try:
+                while True:
+                    chunk = await audio_file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await run_in_threadpool(tmp_file.write, chunk)
+            finally:
+                await run_in_threadpool(tmp_file.close)
+            tmp_path = tmp_file.name
+        options = job_options(request.query_params, form)
+        await form.close()
+
+        submit_audio_job(job_id, tmp_path, options)
+
+        return JSONResponse({
+            'job_id': job_id,
+            'status': 'processing'
+        }, status_code=202)
+
+    except Exception as e:
+        print(f"Error starting async job: {e}", flush=True)
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def get_job_status(request):
+    """Same contract as the Flask route, but long-polls without a thread"""
+    job_id = request.path_params['job_id']
+
+    try:
+        wait = float(request.query_params.get('wait', 0))
+    except ValueError:
+        wait = 0
+
+    if wait > 0:
+        partial = request.query_params.get('partial', '').lower() in TRUTHY
+        job = await wait_for_job(job_id, timeout=min(wait, MAX_LONG_POLL_SECONDS), partial=partial)
+    else:
+        job = JOBS.get(job_id)
+
+    if job is None:
+        return JSONResponse({'error': 'Job not found'}, status_code=404)
+
+    fields = responses.parse_fields(request.query_params.get('fields'))
+    with timed('serialize'):
+        body, headers = responses.encode_for_client(build_job_response(job_id, job, fields),
+                                                    request.headers.get('accept-encoding'))
+        return Response(body, media_type='application/json', headers=headers)
+
+
+async def stream_job_events(request):
+    """Stream job progress as server-sent events until the job finishes"""
+    job_id = request.path_params['job_id']
+    if job_id not in JOBS:
+        return JSONResponse({'error': 'Job not found'}, status_code=404)
+    fields = responses.parse_fields(request.query_params.get('fields'))
+
+    async def generate():
+        started = time.monotonic()
+        # Below every real version, so the current state is sent right away
+        version = -1
+        while time.monotonic() - started < SSE_MAX_SECONDS:
+            job = await wait_for_job(job_id, since_version=version, timeout=SSE_HEARTBEAT_SECONDS)
+            if job is None:
+                return
+            if job['version'] == version:
+                yield ': keep-alive\n\n'
+                continue
+            version = job['version']
+
+            event = job['status'] if job['status'] != 'processing' else 'progress'
+            payload = build_job_response(job_id, job, fields).decode('utf-8')
+            yield f"id: {version}\nevent: {event}\ndata: {payload}\n\n"
+
+            if job['status'] != 'processing':
+                return
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+app = Starlette(middleware=[
+    Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+], routes=[
+    Route('/analyze-async', analyze_audio_async, methods=['POST']),
+    Route('/job-status/{job_id}', get_job_status, methods=['GET']),
+    Route('/job-events/{job_id}', stream_job_events, methods=['GET']),
+    # Everything else (health, sync /analyze, ...) is served by the Flask app
+    Mount('/', app=WSGIMiddleware(flask_app))
+])
@@ -0,0 +1,321 @@
+"""
+Audio feature extraction shared by the service and the catalog scripts.
+
+Analysis is parameterized by a profile that sets sample rate, hop length and
+FFT size together. 'standard' matches how the catalog was built; 'fast'
+analyzes at 11,025 Hz with a half-size FFT (same window duration), so
+decode and STFT work roughly halve (measure with benchmarks/bench_hot_paths.py
+--profile fast). Query and catalog features are only compared within the
+same profile, so the catalog keeps per-profile scalars
+(see add_librosa_features.py --profile).
+
+The query embedding has no per-profile catalog counterpart: a fast-profile
+embedding is scored against the same catalog vectors as a standard one,
+although its Hz-valued terms (centroid, rolloff, bandwidth) are capped by the
+lower Nyquist frequency and its mel bands span a narrower range. Fast
+rankings are therefore an approximation of standard ones.
+"""
+
+import numpy as np
+import librosa
+import soundfile
+
+from job_store import JobLimitExceeded
+from metrics import timed
+
+ANALYSIS_PROFILES = {
+    'standard': {'sr': 22050, 'hop_length': 512, 'n_fft': 2048},
+    'fast': {'sr': 11025, 'hop_length': 512, 'n_fft': 1024}
+}
+DEFAULT_PROFILE = 'standard'
+
+# Seconds of audio analyzed for the display features and for the embedding
+FEATURE_SECONDS = 15.0
+EMBEDDING_SECONDS = 30.0
+
+# Tempo estimation: 'onset' builds the onset envelope the way beat_track does
+# (128 mel bands, median across bands, 8 s autocorrelation) and skips the beat
+# dynamic programming, 'fast' trades a little accuracy for speed, and
+# 'beat_track' is the original full beat tracker. benchmarks/validate_tempo.py
+# measures each against beat_track.
+TEMPO_SETTINGS = {
+    'onset': {'n_mels': 128, 'ac_size': 8.0, 'aggregate': 'median'},
+    'fast': {'n_mels': 64, 'ac_size': 4.0, 'aggregate': 'mean'}
+}
+TEMPO_AGGREGATES = {'median': np.median, 'mean': np.mean}
+DEFAULT_TEMPO_ESTIMATOR = 'onset'
+
+# Catalog tracks keep this many time-segment embeddings next to the averaged
+# one, so a query covering only part of a song (e.g. the chorus) can match
+# the segment it overlaps
+SEGMENT_COUNT = 4
+
+# Spectral contrast bands; with librosa's default 200 Hz lowest edge the top
+# band starts at 6.4 kHz, above the fast profile's Nyquist frequency
+CONTRAST_BANDS = 6
+CONTRAST_FMIN = 200.0
+
+KEYS = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Krumhansl-Schmuckler key profiles
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+MAJOR_PROFILE = MAJOR_PROFILE / np.sum(MAJOR_PROFILE)
+MINOR_PROFILE = MINOR_PROFILE / np.sum(MINOR_PROFILE)
+
+
+def get_profile(name):
+    return ANALYSIS_PROFILES.get(name or DEFAULT_PROFILE, ANALYSIS_PROFILES[DEFAULT_PROFILE])
+
+
+def get_audio_duration(audio_path):
+    """Read the full duration from the file header without decoding it"""
+    return float(librosa.get_duration(path=audio_path))
+
+
+def native_sample_count(audio_path, duration=EMBEDDING_SECONDS):
+    """
+    Samples (all channels, native rate) that decoding `duration` seconds will
+    materialize before the mono mixdown and resampling, or None if the header
+    can't be read
+    """
+    try:
+        info = soundfile.info(audio_path)
+    except Exception:
+        return None
+    return int(info.channels * info.samplerate * min(info.duration, duration))
+
+
+def load_audio(audio_path, profile=DEFAULT_PROFILE, duration=EMBEDDING_SECONDS):
+    """Decode (and resample) audio at the profile's sample rate"""
+    settings = get_profile(profile)
+    with timed('decode'):
+        return librosa.load(audio_path, sr=settings['sr'], mono=True, duration=duration)
+
+
+def contrast_fmin(sr, n_bands=CONTRAST_BANDS):
+    """Lowest spectral contrast edge: CONTRAST_FMIN, halved until every band fits below Nyquist"""
+    fmin = CONTRAST_FMIN
+    while fmin * 2 ** (n_bands - 1) >= sr / 2:
+        fmin /= 2
+    return fmin
+
+
+def magnitude_spectrogram(y, profile=DEFAULT_PROFILE):
+    settings = get_profile(profile)
+    with timed('feature.stft'):
+        return np.abs(librosa.stft(y, n_fft=settings['n_fft'], hop_length=settings['hop_length']))
+
+
+def segment_means(frames, count=SEGMENT_COUNT):
+    """Average (T, D) frame vectors over `count` contiguous time segments -> (count, D)"""
+    frames = np.asarray(frames)
+    if len(frames) < count:
+        # Too short to split: every segment is the whole clip
+        return np.repeat(frames.mean(axis=0, keepdims=True), count, axis=0)
+    return np.stack([chunk.mean(axis=0) for chunk in np.array_split(frames, count)])
+
+
+def detect_key(chroma_vals):
+    """Return (key, mode) for a normalized 12-bin chroma profile"""
+    max_corr = -1
+    detected_key = 'C'
+    detected_mode = 'Major'
+
+    for i in range(12):
+        # Roll the chroma values, not the profiles
+        chroma_rotated = np.roll(chroma_vals, -i)
+
+        major_corr = np.correlate(chroma_rotated, MAJOR_PROFILE)[0]
+        minor_corr = np.correlate(chroma_rotated, MINOR_PROFILE)[0]
+
+        if major_corr > max_corr:
+            max_corr = major_corr
+            detected_key = KEYS[i]
+            detected_mode = 'Major'
+
+        if minor_corr > max_corr:
+            max_corr = minor_corr
+            detected_key = KEYS[i]
+            detected_mode = 'Minor'
+
+    return detected_key, detected_mode
+
+
+def estimate_tempo(y, sr, S=None, hop_length=512, n_fft=2048, estimator=None):
+    """
+    Estimate tempo (BPM) from the onset envelope.
+
+    The onset envelope is built from the mel spectrum of S (a magnitude STFT)
+    when given, so the STFT is not recomputed. beat_track derives its tempo
+    from onset_strength(y, aggregate=np.median) over 128 mel bands before
+    placing beats; the 'onset' settings build that envelope from S, so the
+    tempos agree except where S was cut from a longer clip (the last frame
+    or two then see audio instead of padding).
+    """
+    estimator = estimator or DEFAULT_TEMPO_ESTIMATOR
+    if estimator == 'beat_track':
+        tempo, _ = librosa.beat.beat_track(y=y, sr=sr, hop_length=hop_length)
+    else:
+        settings = TEMPO_SETTINGS[estimator]
+        if S is None:
+            S = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+        mel = librosa.feature.melspectrogram(S=S**2, sr=sr, n_mels=settings['n_mels'])
+        onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=sr, hop_length=hop_length,
+                                                 aggregate=TEMPO_AGGREGATES[settings['aggregate']])
+        tempo = librosa.feature.tempo(onset_envelope=onset_env, sr=sr, hop_length=hop_length,
+                                      ac_size=settings['ac_size'])
+    return float(tempo) if isinstance(tempo, (int, float, np.number)) else float(tempo[0])
+
+
+def extract_librosa_features(y, sr, S=None, profile=DEFAULT_PROFILE, tempo_estimator=None):
+    """
+    Extract the display features (tempo, key, mode, energy, brightness) and
+    the 12-bin chroma profile (C..B, summing to 1) used by transposition-
+    invariant search. Only the first FEATURE_SECONDS of y (and the matching frames of S) are used.
+    """
+    settings = get_profile(profile)
+    hop_length, n_fft = settings['hop_length'], settings['n_fft']
+
+    y = y[:int(FEATURE_SECONDS * sr)]
+    if S is None:
+        S = magnitude_spectrogram(y, profile)
+    else:
+        S = S[:, :1 + len(y) // hop_length]
+
+    with timed('feature.tempo'):
+        tempo = estimate_tempo(y, sr, S=S, hop_length=hop_length, n_fft=n_fft, estimator=tempo_estimator)
+
+    with timed('feature.chroma'):
+        chroma = librosa.feature.chroma_stft(S=S**2, sr=sr, hop_length=hop_length)
+        chroma_vals = np.sum(chroma, axis=1)
+        chroma_vals = chroma_vals / np.sum(chroma_vals)
+
+    with timed('feature.key'):
+        detected_key, detected_mode = detect_key(chroma_vals)
+
+    with timed('feature.rms'):
+        rms = librosa.feature.rms(y=y, frame_length=n_fft, hop_length=hop_length)
+        energy = float(np.mean(rms))
+
+    with timed('feature.spectral_centroid'):
+        spectral_centroid = librosa.feature.spectral_centroid(S=S, sr=sr, hop_length=hop_length)
+        brightness = float(np.mean(spectral_centroid))
+
+    return {
+        'tempo': round(tempo, 1),
+        'key': detected_key,
+        'mode': detected_mode,
+        'energy': round(energy, 4),
+        'brightness': round(brightness, 1),
+        'chroma': [round(float(value), 4) for value in chroma_vals]
+    }
+
+
+def extract_embedding(y, sr, S=None, profile=DEFAULT_PROFILE):
+    """
+    Extract lightweight audio features to match against precomputed OpenL3 embeddings.
+    Uses MFCC + spectral features instead of OpenL3 to avoid TensorFlow memory overhead.
+    """
+    settings = get_profile(profile)
+    hop_length, n_fft = settings['hop_length'], settings['n_fft']
+    if S is None:
+        S = magnitude_spectrogram(y, profile)
+
+    # Extract MFCC features (mel-frequency cepstral coefficients)
+    # These capture timbral characteristics similar to OpenL3 but much lighter
+    with timed('embedding.mfcc'):
+        mel = librosa.feature.melspectrogram(S=S**2, sr=sr)
+        mfccs = librosa.feature.mfcc(S=librosa.power_to_db(mel), n_mfcc=20)
+        mfcc_mean = np.mean(mfccs, axis=1)
+        mfcc_std = np.std(mfccs, axis=1)
+
+    # Spectral features
+    with timed('embedding.spectral'):
+        spectral_centroid = librosa.feature.spectral_centroid(S=S, sr=sr, hop_length=hop_length)
+        spectral_rolloff = librosa.feature.spectral_rolloff(S=S, sr=sr, hop_length=hop_length)
+        # Always n_bands + 1 = 7 values; only the band edges move with sr
+        spectral_contrast = librosa.feature.spectral_contrast(S=S, sr=sr, hop_length=hop_length,
+                                                              fmin=contrast_fmin(sr), n_bands=CONTRAST_BANDS)
+        spectral_bandwidth = librosa.feature.spectral_bandwidth(S=S, sr=sr, hop_length=hop_length)
+
+    # Chroma features
+    with timed('embedding.chroma'):
+        chroma = librosa.feature.chroma_stft(S=S**2, sr=sr, hop_length=hop_length)
+
+    # Zero crossing rate (percussiveness indicator)
+    with timed('embedding.zcr'):
+        zcr = librosa.feature.zero_crossing_rate(y=y, frame_length=n_fft, hop_length=hop_length)
+
+    # Tonnetz (harmonic features)
+    with timed('embedding.tonnetz'):
+        tonnetz = librosa.feature.tonnetz(y=y, sr=sr, hop_length=hop_length)
+
+    # Combine into feature vector and pad to 512 dimensions to match database
+    feature_vector = np.concatenate([
+        mfcc_mean,                                   # 20 features
+        mfcc_std,                                    # 20 features
+        np.mean(spectral_centroid, axis=1),          # 1 feature
+        np.mean(spectral_rolloff, axis=1),           # 1 feature
+        np.mean(spectral_contrast, axis=1),          # 7 features
+        np.mean(spectral_bandwidth, axis=1),         # 1 feature
+        np.mean(chroma, axis=1),                     # 12 features
+        np.mean(zcr, axis=1),                        # 1 feature
+        np.mean(tonnetz, axis=1)                     # 6 features
+    ])
+
+    # Pad to 512 dimensions to match precomputed OpenL3 embeddings
+    # This allows cosine similarity to work correctly
+    if len(feature_vector) < 512:
+        feature_vector = np.pad(feature_vector, (0, 512 - len(feature_vector)))
+    else:
+        feature_vector = feature_vector[:512]
+
+    return feature_vector.tolist()
+
+
+def analyze_file(audio_path, profile=DEFAULT_PROFILE, tempo_estimator=None):
+    """
+    Decode once and compute everything a query needs.
+    Returns (duration, features, embedding); duration is read from the file
+    header so long uploads are never decoded past EMBEDDING_SECONDS.
+    """
+    duration = get_audio_duration(audio_path)
+    y, sr = load_audio(audio_path, profile, duration=EMBEDDING_SECONDS)
+    S = magnitude_spectrogram(y, profile)
+
+    features = extract_librosa_features(y, sr, S=S, profile=profile, tempo_estimator=tempo_estimator)
+    embedding = extract_embedding(y, sr, S=S, profile=profile)
+    return duration, features, embedding
+
+
+def analyze_job_audio(audio_path, profile=DEFAULT_PROFILE, tempo_estimator=None, max_samples=None,
+                      on_stage=None, seconds=EMBEDDING_SECONDS):
+    """
+    analyze_file for a job: reports each stage through on_stage(name) and
+    fails with JobLimitExceeded('samples') when the decode would exceed
+    max_samples (checked from the header first, then after decoding).
+    seconds shortens the analyzed window (progressive first pass).
+    Runs in the service process or in a worker_pool worker.
+    """
+    def stage(name):
+        if on_stage:
+            on_stage(name)
+
+    stage('decode')
+    duration = get_audio_duration(audio_path)
+    if max_samples:
+        native = native_sample_count(audio_path, seconds)
+        if native is not None and native > max_samples:
+            raise JobLimitExceeded('samples', f'Audio would decode to {native} samples (limit {max_samples})')
+    y, sr = load_audio(audio_path, profile, duration=seconds)
+    if max_samples and len(y) > max_samples:
+        raise JobLimitExceeded('samples', f'Audio decoded to {len(y)} samples (limit {max_samples})')
+
+    stage('features')
+    S = magnitude_spectrogram(y, profile)
+    features = extract_librosa_features(y, sr, S=S, profile=profile, tempo_estimator=tempo_estimator)
+
+    stage('embedding')
+    embedding = extract_embedding(y, sr, S=S, profile=profile)
+    return {'duration': duration, 'features': features, 'embedding': embedding}
@@ -0,0 +1,388 @@
+"""
+Offline benchmarks for the analysis and search hot paths.
+
+Uses the bundled catalog audio (song_database/audio/track_*.mp3) and
+assets/free.mp3, so it runs without network access. Each case reports
+throughput, p50/p99 latency and peak RSS; results are saved as JSON and can
+be compared against a stored baseline to catch regressions.
+
+Usage (from python-service/):
+    python benchmarks/bench_hot_paths.py
+    python benchmarks/bench_hot_paths.py --sizes 1000,10000 --max-catalog-mb 2048
+    python benchmarks/bench_hot_paths.py --profile fast
+    python benchmarks/bench_hot_paths.py --cases search --segments 4
+    python benchmarks/bench_hot_paths.py --save-baseline
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(SERVICE_DIR)
+sys.path.insert(0, SERVICE_DIR)
+
+AUDIO_GLOB = os.path.join(SERVICE_DIR, 'song_database', 'audio', 'track_*.mp3')
+QUERY_AUDIO = os.path.join(REPO_DIR, 'assets', 'free.mp3')
+RESULTS_DIR = os.path.join(SERVICE_DIR, 'benchmarks', 'results')
+BASELINE_FILE = os.path.join(SERVICE_DIR, 'benchmarks', 'baseline.json')
+
+DEFAULT_SIZES = '1000,10000,100000,1000000'
+EMBEDDING_DIM = 512
+# Search tier settings, read from the environment as app.py does
+COARSE_SHORTLIST = int(os.environ.get('COARSE_SHORTLIST', 256))
+COARSE_MIN_CATALOG = int(os.environ.get('COARSE_MIN_CATALOG', 20000))
+KEYS = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(latencies, items_per_call=1):
+    total = sum(latencies)
+    return {
+        'calls': len(latencies),
+        'throughput_per_s': round(len(latencies) * items_per_call / total, 3) if total > 0 else None,
+        'mean_ms': round(1000 * total / len(latencies), 3),
+        'p50_ms': round(1000 * percentile(latencies, 50), 3),
+        'p99_ms': round(1000 * percentile(latencies, 99), 3),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def audio_files(limit):
+    files = sorted(glob.glob(AUDIO_GLOB))[:limit]
+    if os.path.exists(QUERY_AUDIO):
+        files.append(QUERY_AUDIO)
+    return files
+
+
+def time_calls(func, inputs, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            func(item)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_decode(args):
+    import audio_features
+
+    return summarize(time_calls(
+        lambda path: audio_features.load_audio(path, args.profile),
+        audio_files(args.tracks), args.repeat
+    ))
+
+
+def decoded_inputs(args):
+    """Decode once up front so feature cases time only the feature work"""
+    import audio_features
+
+    return [audio_features.load_audio(path, args.profile) for path in audio_files(args.tracks)]
+
+
+def bench_librosa_features(args):
+    import audio_features
+
+    return summarize(time_calls(
+        lambda item: audio_features.extract_librosa_features(*item, profile=args.profile),
+        decoded_inputs(args), args.repeat
+    ))
+
+
+def bench_embedding(args):
+    import audio_features
+
+    return summarize(time_calls(
+        lambda item: audio_features.extract_embedding(*item, profile=args.profile),
+        decoded_inputs(args), args.repeat
+    ))
+
+
+def bench_extended_features(args):
+    import librosa
+    from app_lightweight import extract_extended_features
+
+    decoded = [librosa.load(path, sr=22050, mono=True, duration=30.0) for path in audio_files(args.tracks)]
+    return summarize(time_calls(lambda item: extract_extended_features(*item), decoded, args.repeat))
+
+
+class SyntheticMetadata:
+    """Per-song dicts generated on demand, so huge catalogs don't hold them"""
+
+    def __init__(self, scalars):
+        self.scalars = scalars
+
+    def __getitem__(self, row):
+        key_id = int(self.scalars['key_id'][row])
+        return {
+            'title': f'Synthetic {row}',
+            'artist': 'Benchmark',
+            'tempo': float(self.scalars['tempo'][row]),
+            'key': KEYS[key_id % 12],
+            'mode': 'Minor' if key_id >= 12 else 'Major',
+            'energy': float(self.scalars['energy'][row]),
+            'brightness': float(self.scalars['brightness'][row])
+        }
+
+
+def synthetic_index(size, seed=0, segments=1):
+    """Random catalog built straight into a SongIndex (no per-song dicts)"""
+    import numpy as np
+    from song_index import SongIndex, unit_chroma
+
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((size, EMBEDDING_DIM), dtype=np.float32)
+    segment_embeddings = None
+    if segments > 1:
+        # Segments vary around the song's overall embedding
+        segment_embeddings = embeddings[:, None, :] + 0.5 * rng.standard_normal(
+            (size, segments, EMBEDDING_DIM), dtype=np.float32)
+    scalars = {
+        'tempo': rng.uniform(60, 180, size).astype(np.float32),
+        'energy': rng.uniform(0.01, 0.3, size).astype(np.float32),
+        'brightness': rng.uniform(800, 4000, size).astype(np.float32),
+        'key_id': rng.integers(0, 24, size).astype(np.int16),
+        'chroma': unit_chroma(rng.random((size, 12), dtype=np.float32))
+    }
+    ids = [f'synthetic_{i:07d}' for i in range(size)]
+    return SongIndex(ids, embeddings, {'standard': scalars, 'fast': scalars}, SyntheticMetadata(scalars),
+                     segments=segment_embeddings)
+
+
+def search_rows(index, embedding, features, profile, mode='exhaustive', transpose=False):
+    """What app.get_similar_songs does with a SongIndex: search plus response rows"""
+    matches = index.search(embedding, features, top_k=10, profile=profile, mode=mode,
+                           shortlist=COARSE_SHORTLIST, transpose=transpose)
+    rows = [index.result_row(*match) for match in matches]
+    if transpose:
+        for row, shift in zip(rows, index.transposition(features, [match[0] for match in matches], profile)):
+            row['transpose'] = shift
+    return rows
+
+
+def bench_search(args, size):
+    # SongIndex directly rather than app: importing the service would apply
+    # its thread budget, start its background threads and load the catalog
+    import numpy as np
+    import audio_features
+    import thread_budget
+
+    query_path = QUERY_AUDIO if os.path.exists(QUERY_AUDIO) else audio_files(1)[0]
+    _, features, embedding = audio_features.analyze_file(query_path, args.profile)
+
+    index = synthetic_index(size, segments=args.segments)
+    queries = max(3, min(args.queries, int(args.queries * 10000 / size)))
+
+    result = {'catalog_size': size, 'segments': args.segments, 'threads': thread_budget.effective_settings()}
+    for mode in ('exhaustive', 'coarse'):
+        latencies = time_calls(
+            lambda _: search_rows(index, embedding, features, args.profile, mode=mode),
+            range(queries), 1
+        )
+        result[mode] = summarize(latencies)
+
+    # Exhaustive search over batches of concurrent queries (one GEMM each)
+    batch = args.search_batch
+    latencies = time_calls(
+        lambda _: index.search_batch([embedding] * batch, [features] * batch, top_k=10,
+                                     profiles=[args.profile] * batch),
+        range(max(1, queries // batch)), 1
+    )
+    result['batched'] = summarize(latencies, items_per_call=batch)
+
+    # Transposition-invariant exhaustive search (all 12 chroma shifts per track)
+    latencies = time_calls(
+        lambda _: search_rows(index, embedding, features, args.profile, transpose=True),
+        range(queries), 1
+    )
+    result['transposed'] = summarize(latencies)
+
+    # Recall of the coarse tier, using perturbed catalog songs as queries so
+    # each query has genuine near neighbours
+    rng = np.random.default_rng(1)
+    rows = rng.choice(size, min(20, size), replace=False)
+    recall_queries = [
+        (index.embeddings[row] + 0.3 * rng.standard_normal(EMBEDDING_DIM).astype(np.float32) / EMBEDDING_DIM ** 0.5,
+         index.metadata[row])
+        for row in rows
+    ]
+    result['coarse_recall_at_10'] = round(index.measure_recall(
+        recall_queries, top_k=10, profile=args.profile, shortlist=COARSE_SHORTLIST), 4)
+
+    # Top-level numbers follow the mode the service would pick at this size
+    result.update(result['coarse' if size >= COARSE_MIN_CATALOG else 'exhaustive'])
+    return result
+
+
+def effective_threads():
+    """Thread pools NumPy gets in this environment (no service budget applied)"""
+    import numpy  # loads BLAS/OpenMP, so threadpoolctl can report them
+    import thread_budget
+
+    return thread_budget.effective_settings()
+
+
+def default_max_catalog_mb():
+    # Half of physical memory (at most 8 GB), so the 1M-song case is skipped
+    # on machines that can't hold it
+    try:
+        total_mb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return 8192
+    return min(8192, total_mb / 2)
+
+
+def estimated_catalog_mb(size, segments=1):
+    # float32 embedding matrix plus a copy during normalization, and the
+    # segment matrix when there is more than one segment
+    extra = 2 * segments if segments > 1 else 0
+    return (2 + extra) * size * EMBEDDING_DIM * 4 / (1024 * 1024)
+
+
+def run_case(name, args, size=None):
+    if name == 'decode':
+        return bench_decode(args)
+    if name == 'librosa_features':
+        return bench_librosa_features(args)
+    if name == 'embedding':
+        return bench_embedding(args)
+    if name == 'extended_features':
+        return bench_extended_features(args)
+    if name == 'search':
+        return bench_search(args, size)
+    raise ValueError(f'Unknown benchmark case: {name}')
+
+
+def _run_case_worker(payload):
+    name, args, size = payload
+    return run_case(name, args, size)
+
+
+def run_isolated(name, args, size=None):
+    """Run a case in a fresh process so peak RSS is attributable to it"""
+    if not args.isolate:
+        return run_case(name, args, size)
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1) as pool:
+        return pool.apply(_run_case_worker, ((name, args, size),))
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return a list of human-readable regressions (p50 slower than baseline)"""
+    regressions = []
+    for case, current in results.items():
+        previous = baseline.get('results', {}).get(case)
+        if not previous or not previous.get('p50_ms'):
+            continue
+        ratio = current['p50_ms'] / previous['p50_ms']
+        status = 'REGRESSION' if ratio > 1 + tolerance else 'ok'
+        print(f"  {case:<28} p50 {previous['p50_ms']:>10.2f}ms -> {current['p50_ms']:>10.2f}ms ({ratio:.2f}x) {status}")
+        if ratio > 1 + tolerance:
+            regressions.append(f"{case}: p50 {ratio:.2f}x baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark StrumSense analysis and search hot paths')
+    parser.add_argument('--cases', default='decode,librosa_features,embedding,extended_features,search',
+                        help='Comma-separated cases to run')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Synthetic catalog sizes for search')
+    parser.add_argument('--profile', default='standard', help='Analysis profile (standard or fast)')
+    parser.add_argument('--tracks', type=int, default=10, help='Bundled tracks used for audio cases')
+    parser.add_argument('--repeat', type=int, default=2, help='Passes over the audio files')
+    parser.add_argument('--segments', type=int, default=1, help='Segment embeddings per synthetic song')
+    parser.add_argument('--queries', type=int, default=50, help='Search queries at 10k songs (scaled by size)')
+    parser.add_argument('--search-batch', type=int, default=16, help='Queries per batched search')
+    parser.add_argument('--max-catalog-mb', type=float, default=default_max_catalog_mb(),
+                        help='Skip catalog sizes whose estimated footprint exceeds this '
+                             '(default: half of physical memory, at most 8192)')
+    parser.add_argument('--no-isolate', dest='isolate', action='store_false',
+                        help='Run all cases in this process (peak RSS becomes cumulative)')
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'latest.json'))
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p50 slowdown vs baseline')
+    args = parser.parse_args()
+
+    os.chdir(SERVICE_DIR)
+    cases = [c.strip() for c in args.cases.split(',') if c.strip()]
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    results = {}
+    for case in cases:
+        if case == 'search':
+            for size in sizes:
+                catalog_mb = estimated_catalog_mb(size, args.segments)
+                if catalog_mb > args.max_catalog_mb:
+                    print(f"Skipping search@{size}: estimated {catalog_mb:.0f} MB catalog")
+                    continue
+                print(f"Running search@{size}...", flush=True)
+                results[f'search@{size}'] = run_isolated(case, args, size)
+        else:
+            print(f"Running {case}...", flush=True)
+            results[case] = run_isolated(case, args)
+
+    for case, result in results.items():
+        print(f"  {case:<28} {result['throughput_per_s']:>10} /s  p50 {result['p50_ms']:>10.2f}ms  "
+              f"p99 {result['p99_ms']:>10.2f}ms  peak {result['peak_rss_mb']:>8.1f} MB")
+        if 'coarse_recall_at_10' in result:
+            print(f"  {'':<28} exhaustive p50 {result['exhaustive']['p50_ms']:.2f}ms, "
+                  f"coarse p50 {result['coarse']['p50_ms']:.2f}ms, recall@10 {result['coarse_recall_at_10']:.3f}")
+            print(f"  {'':<28} exhaustive {result['exhaustive']['throughput_per_s']} queries/s, "
+                  f"batched x{args.search_batch} {result['batched']['throughput_per_s']} queries/s, "
+                  f"transposed p50 {result['transposed']['p50_ms']:.2f}ms")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'threads': effective_threads(),
+            'args': vars(args)
+        },
+        'results': results
+    }
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        print(f"\nComparing against {args.baseline}:")
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions detected:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+    else:
+        print(f"No baseline at {args.baseline} (run with --save-baseline to create one)")
+
+
+if __name__ == '__main__':
+    main()
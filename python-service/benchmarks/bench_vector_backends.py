@@ -0,0 +1,126 @@
+"""
+Compare vector backends on one machine: in-process search vs the local
+Pinecone-compatible service (local_vector_service.py) over HTTP.
+
+Uses synthetic 512-dim vectors, so it needs no catalog or network. Reports
+upsert throughput (streamed batches, several in flight), single-query
+latency and batched-query throughput for each backend.
+
+Usage (from python-service/):
+    python benchmarks/bench_vector_backends.py --size 10000
+    python local_vector_service.py --port 5100 &   # separate process (fairer)
+    python benchmarks/bench_vector_backends.py --url http://localhost:5100
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+import numpy as np
+
+from vector_backends import HttpBackend, InProcessBackend, batched, upsert_streaming
+
+EMBEDDING_DIM = 512
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def synthetic_vectors(size, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(size):
+        yield {'id': f'song_{i}', 'values': rng.standard_normal(dim).astype(np.float32).tolist(),
+               'metadata': {'title': f'Song {i}'}}
+
+
+def start_local_service():
+    """Serve local_vector_service in a background thread (shares this process's GIL)"""
+    from werkzeug.serving import make_server
+    import local_vector_service
+
+    server = make_server('127.0.0.1', 0, local_vector_service.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+def bench_backend(name, backend, args, queries):
+    backend.delete(delete_all=True)
+
+    start = time.perf_counter()
+    upserted = upsert_streaming(backend, synthetic_vectors(args.size, EMBEDDING_DIM),
+                                batch_size=args.batch_size, concurrency=args.concurrency)
+    upsert_seconds = time.perf_counter() - start
+
+    # Warm up (the in-process backend appends buffered rows on first query)
+    backend.query(queries[0], top_k=args.top_k)
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        backend.query(query, top_k=args.top_k)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for batch in batched(queries, args.query_batch):
+        backend.query_batch(batch, top_k=args.top_k)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        'backend': name,
+        'vectors': upserted,
+        'upsert_per_s': round(upserted / upsert_seconds, 1),
+        'query_p50_ms': round(1000 * percentile(latencies, 50), 3),
+        'query_p99_ms': round(1000 * percentile(latencies, 99), 3),
+        'query_per_s': round(len(latencies) / sum(latencies), 1),
+        'batched_query_per_s': round(len(queries) / batch_seconds, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark in-process vs HTTP vector search')
+    parser.add_argument('--size', type=int, default=10000, help='Vectors in the index')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=256, help='Candidates per query (VECTOR_SHORTLIST)')
+    parser.add_argument('--batch-size', type=int, default=100, help='Vectors per upsert')
+    parser.add_argument('--concurrency', type=int, default=4, help='Upserts (and HTTP queries) in flight')
+    parser.add_argument('--query-batch', type=int, default=16, help='Queries per query_batch call')
+    parser.add_argument('--url', help='Running local_vector_service URL (default: start one in-process)')
+    parser.add_argument('--output', help='Write results as JSON')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, EMBEDDING_DIM)).astype(np.float32).tolist()
+
+    url = args.url or start_local_service()
+    backends = [
+        ('inprocess', InProcessBackend()),
+        ('http', HttpBackend(url, concurrency=args.concurrency))
+    ]
+
+    results = [bench_backend(name, backend, args, queries) for name, backend in backends]
+
+    print(f"\n{args.size} vectors, {args.queries} queries, top_k={args.top_k} ({url})\n")
+    columns = ['upsert_per_s', 'query_p50_ms', 'query_p99_ms', 'query_per_s', 'batched_query_per_s']
+    print(f"  {'backend':<10}" + ''.join(f"{c:>21}" for c in columns))
+    for row in results:
+        print(f"  {row['backend']:<10}" + ''.join(f"{row[c]:>21}" for c in columns))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Load generator for the async analysis API.
+
+Drives POST /analyze-async followed by GET /job-status/<id> the way the
+Next.js frontend does, with Poisson arrivals at a configurable rate, a mix of
+clip lengths cut from the bundled catalog audio, and a cap on in-flight
+sessions. Reports throughput, queueing delay (server-side created_at ->
+started_at), end-to-end latency percentiles and error/timeout rates.
+
+Runs against the local Flask/ASGI service, or against standin_service.py to
+explore --workers/--threads settings without audio dependencies.
+
+Usage (from python-service/):
+    python benchmarks/loadtest.py --url http://localhost:5000 --rate 0.5 --duration 120
+    python benchmarks/loadtest.py --clip-lengths 5,15,30 --concurrency 16 --poll interval
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUDIO_GLOB = os.path.join(SERVICE_DIR, 'song_database', 'audio', 'track_*.mp3')
+
+# Catalog clips are 128 kbps MP3 (see build_database.py), so byte offsets map
+# to seconds and clips can be cut without decoding
+MP3_BYTES_PER_SECOND = 128 * 1000 // 8
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return round(ordered[index], 3)
+
+
+def load_clips(clip_lengths, limit):
+    """Cut clips of each length from the bundled catalog audio"""
+    clips = []
+    for path in sorted(glob.glob(AUDIO_GLOB))[:limit]:
+        with open(path, 'rb') as f:
+            data = f.read()
+        for seconds in clip_lengths:
+            clips.append((seconds, data[:seconds * MP3_BYTES_PER_SECOND]))
+    if not clips:
+        raise SystemExit(f'No audio found at {AUDIO_GLOB}')
+    return clips
+
+
+def encode_multipart(field, filename, payload, content_type='audio/mpeg'):
+    boundary = uuid.uuid4().hex
+    head = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode()
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+    return head + payload + tail, f'multipart/form-data; boundary={boundary}'
+
+
+def request_json(url, data=None, headers=None, timeout=60):
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.status, json.loads(response.read())
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = []
+
+    def record(self, session):
+        with self.lock:
+            self.sessions.append(session)
+
+
+def run_session(args, clip_seconds, payload, stats):
+    """One user: upload, then poll until the job finishes"""
+    session = {'clip_seconds': clip_seconds, 'outcome': None}
+    started = time.perf_counter()
+    try:
+        body, content_type = encode_multipart('audio', 'upload.mp3', payload)
+        status, data = request_json(f'{args.url}/analyze-async', data=body,
+                                    headers={'Content-Type': content_type}, timeout=args.request_timeout)
+        session['submit_s'] = time.perf_counter() - started
+        job_id = data['job_id']
+
+        query = f'?wait={args.wait}' if args.poll == 'long' else ''
+        polls = 0
+        job = {}
+        while True:
+            if time.perf_counter() - started > args.job_timeout:
+                session['outcome'] = 'timeout'
+                break
+            _, job = request_json(f'{args.url}/job-status/{job_id}{query}', timeout=args.request_timeout + args.wait)
+            polls += 1
+            if job['status'] == 'completed':
+                session['outcome'] = 'completed'
+                break
+            if job['status'] == 'failed':
+                session['outcome'] = 'failed'
+                session['error'] = job.get('error')
+                break
+            time.sleep(args.poll_interval if args.poll == 'interval' else 0.25)
+
+        session['polls'] = polls
+        created, begun = parse_time(job.get('created_at')), parse_time(job.get('started_at'))
+        if created and begun:
+            session['queue_s'] = (begun - created).total_seconds()
+
+    except (urllib.error.URLError, OSError, ValueError, KeyError) as e:
+        session['outcome'] = 'error'
+        session['error'] = str(e)
+
+    session['e2e_s'] = time.perf_counter() - started
+    stats.record(session)
+
+
+def summarize(stats, elapsed):
+    sessions = stats.sessions
+    completed = [s for s in sessions if s['outcome'] == 'completed']
+    counts = {}
+    for s in sessions:
+        counts[s['outcome']] = counts.get(s['outcome'], 0) + 1
+
+    def dist(key, rows):
+        values = [s[key] for s in rows if s.get(key) is not None]
+        return {
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p99': percentile(values, 99),
+            'max': round(max(values), 3) if values else None
+        }
+
+    total = len(sessions) or 1
+    return {
+        'sessions': len(sessions),
+        'elapsed_s': round(elapsed, 1),
+        'throughput_jobs_per_s': round(len(completed) / elapsed, 3) if elapsed > 0 else None,
+        'outcomes': counts,
+        'error_rate': round(counts.get('error', 0) / total, 4),
+        'failure_rate': round(counts.get('failed', 0) / total, 4),
+        'timeout_rate': round(counts.get('timeout', 0) / total, 4),
+        'submit_s': dist('submit_s', sessions),
+        'queue_s': dist('queue_s', completed),
+        'e2e_s': dist('e2e_s', completed),
+        'polls_per_job': dist('polls', completed),
+        'by_clip_seconds': {
+            str(length): dist('e2e_s', [s for s in completed if s['clip_seconds'] == length])
+            for length in sorted({s['clip_seconds'] for s in completed})
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the StrumSense async analysis API')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--rate', type=float, default=0.5, help='Mean arrivals per second (Poisson)')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to generate arrivals for')
+    parser.add_argument('--concurrency', type=int, default=32, help='Max sessions in flight')
+    parser.add_argument('--clip-lengths', default='15', help='Comma-separated clip lengths in seconds')
+    parser.add_argument('--tracks', type=int, default=20, help='Bundled tracks to cut clips from')
+    parser.add_argument('--poll', choices=['long', 'interval'], default='long',
+                        help='long: ?wait= long-polls; interval: fixed sleep between polls')
+    parser.add_argument('--wait', type=float, default=5, help='Long-poll wait in seconds')
+    parser.add_argument('--poll-interval', type=float, default=5, help='Sleep between interval polls')
+    parser.add_argument('--request-timeout', type=float, default=60)
+    parser.add_argument('--job-timeout', type=float, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report here')
+    args = parser.parse_args()
+
+    args.url = args.url.rstrip('/')
+    rng = random.Random(args.seed)
+    clip_lengths = [int(x) for x in args.clip_lengths.split(',') if x.strip()]
+    clips = load_clips(clip_lengths, args.tracks)
+    stats = Stats()
+    slots = threading.BoundedSemaphore(args.concurrency)
+    threads = []
+    dropped = 0
+
+    print(f"Driving {args.url} at {args.rate}/s for {args.duration}s "
+          f"(clips {clip_lengths}s, concurrency {args.concurrency}, poll={args.poll})", flush=True)
+
+    def worker(clip_seconds, payload):
+        try:
+            run_session(args, clip_seconds, payload, stats)
+        finally:
+            slots.release()
+
+    start = time.perf_counter()
+    next_arrival = start
+    while next_arrival - start < args.duration:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if slots.acquire(blocking=False):
+            clip_seconds, payload = rng.choice(clips)
+            thread = threading.Thread(target=worker, args=(clip_seconds, payload), daemon=True)
+            thread.start()
+            threads.append(thread)
+        else:
+            # Open-loop arrivals: a full client pool counts as a dropped request
+            dropped += 1
+        next_arrival += rng.expovariate(args.rate)
+
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = summarize(stats, elapsed)
+    report['dropped_arrivals'] = dropped
+    report['config'] = vars(args)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved report to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Local stand-in for the analysis service, for load-test and capacity work.
+
+Speaks the same /analyze-async, /job-status (with ?wait= long-polls) and
+/health contract as app.py, but replaces audio analysis with a simulated
+service time on a fixed pool of workers. Service time scales with the clip
+length (estimated from the upload size), so queueing behaviour for a given
+--workers setting can be explored without librosa or real hardware.
+
+Usage (from python-service/):
+    python benchmarks/standin_service.py --port 5050 --workers 2
+    python benchmarks/loadtest.py --url http://localhost:5050 --rate 1
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_store import JobStore
+
+MP3_BYTES_PER_SECOND = 128 * 1000 // 8
+MAX_LONG_POLL_SECONDS = 30
+
+JOBS = JobStore()
+
+
+def simulated_result(clip_seconds):
+    return {
+        'success': True,
+        'duration': clip_seconds,
+        'features': {'tempo': 120.0, 'key': 'C', 'mode': 'Major', 'energy': 0.1, 'brightness': 2000.0},
+        'similarSongs': [
+            {
+                'id': f'track_{i:04d}',
+                'title': f'Stand-in {i}',
+                'artist': 'Stand-in',
+                'similarity_score': 0.9 - i * 0.01,
+                'openl3_score': 0.9,
+                'librosa_score': 0.8,
+                'tempo': 120.0,
+                'key': 'C',
+                'mode': 'Major',
+                'energy': 0.1,
+                'brightness': 2000.0
+            }
+            for i in range(1, 11)
+        ]
+    }
+
+
+def make_handler(pool, args):
+    rng = random.Random(args.seed)
+    rng_lock = threading.Lock()
+
+    def service_time(clip_seconds):
+        with rng_lock:
+            jitter = rng.uniform(1 - args.jitter, 1 + args.jitter)
+        return (args.base_seconds + args.seconds_per_audio_second * clip_seconds) * jitter
+
+    def process(job_id, clip_seconds):
+        JOBS.update(job_id, stage='features', started_at=datetime.now().isoformat())
+        time.sleep(service_time(clip_seconds))
+        JOBS.complete(job_id, simulated_result(clip_seconds))
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *log_args):
+            if args.verbose:
+                super().log_message(format, *log_args)
+
+        def send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/health':
+                return self.send_json({'status': 'ok', 'standin': True, 'workers': args.workers})
+
+            match = re.fullmatch(r'/job-status/([\w-]+)', url.path)
+            if not match:
+                return self.send_json({'error': 'Not found'}, 404)
+
+            job_id = match.group(1)
+            wait = float(parse_qs(url.query).get('wait', ['0'])[0] or 0)
+            job = JOBS.wait(job_id, timeout=min(wait, MAX_LONG_POLL_SECONDS)) if wait > 0 else JOBS.get(job_id)
+            if job is None:
+                return self.send_json({'error': 'Job not found'}, 404)
+
+            response = {
+                'job_id': job_id,
+                'status': job['status'],
+                'stage': job['stage'],
+                'created_at': job['created_at']
+            }
+            if job.get('started_at'):
+                response['started_at'] = job['started_at']
+            if job['status'] == 'completed':
+                response['result'] = job['result']
+            self.send_json(response)
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/analyze-async':
+                return self.send_json({'error': 'Not found'}, 404)
+
+            length = int(self.headers.get('Content-Length', 0))
+            self.rfile.read(length)
+            clip_seconds = max(1.0, length / MP3_BYTES_PER_SECOND)
+
+            job_id = str(uuid.uuid4())
+            JOBS.create(job_id)
+            pool.submit(process, job_id, clip_seconds)
+            self.send_json({'job_id': job_id, 'status': 'processing'}, 202)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated StrumSense analysis service')
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--workers', type=int, default=2, help='Concurrent analysis jobs (ANALYSIS_WORKERS)')
+    parser.add_argument('--base-seconds', type=float, default=1.5, help='Fixed cost per job')
+    parser.add_argument('--seconds-per-audio-second', type=float, default=0.15,
+                        help='Extra cost per second of uploaded audio')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Relative uniform jitter on service time')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    server = ThreadingHTTPServer(('0.0.0.0', args.port), make_handler(pool, args))
+    print(f"Stand-in service on :{args.port} with {args.workers} workers", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
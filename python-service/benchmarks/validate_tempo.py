@@ -0,0 +1,83 @@
+"""
+Validate the tempo-only estimators against full beat tracking.
+
+Runs every estimator in audio_features.TEMPO_SETTINGS plus the original
+beat_track over the bundled catalog audio and reports, per estimator, how
+often the tempo agrees with beat_track (exactly, within 2%, and within 4%
+allowing octave errors) and the mean time per track.
+
+Usage (from python-service/):
+    python benchmarks/validate_tempo.py --tracks 100
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+os.chdir(SERVICE_DIR)
+
+import librosa
+import numpy as np
+
+import audio_features
+
+AUDIO_GLOB = os.path.join('song_database', 'audio', 'track_*.mp3')
+
+
+def agrees(a, b, tolerance, allow_octave=False):
+    candidates = [b, b * 2, b / 2] if allow_octave else [b]
+    return any(abs(a - c) <= tolerance * c for c in candidates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare tempo estimators with beat tracking')
+    parser.add_argument('--tracks', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=15.0, help='Seconds analyzed per track (as in the service)')
+    parser.add_argument('--output', help='Write per-track results as JSON')
+    args = parser.parse_args()
+
+    estimators = list(audio_features.TEMPO_SETTINGS)
+    files = sorted(glob.glob(AUDIO_GLOB))[:args.tracks]
+    rows = []
+    timings = {name: [] for name in ['beat_track'] + estimators}
+
+    for path in files:
+        y, sr = librosa.load(path, duration=args.duration, sr=22050, mono=True)
+        row = {'track': os.path.basename(path)}
+
+        start = time.perf_counter()
+        row['beat_track'] = audio_features.estimate_tempo(y, sr, estimator='beat_track')
+        timings['beat_track'].append(time.perf_counter() - start)
+
+        for name in estimators:
+            # Include the shared STFT so the timing is a fair standalone cost
+            start = time.perf_counter()
+            S = np.abs(librosa.stft(y, n_fft=2048, hop_length=512))
+            row[name] = audio_features.estimate_tempo(y, sr, S=S, estimator=name)
+            timings[name].append(time.perf_counter() - start)
+
+        rows.append(row)
+
+    print(f"Validated {len(rows)} tracks ({args.duration:.0f}s each)\n")
+    reference_ms = 1000 * np.mean(timings['beat_track'])
+    print(f"  {'estimator':<12} {'exact':>7} {'±2%':>7} {'±4%/oct':>8} {'ms/track':>10} {'speedup':>8}")
+    for name in ['beat_track'] + estimators:
+        exact = np.mean([round(r[name], 1) == round(r['beat_track'], 1) for r in rows])
+        close = np.mean([agrees(r[name], r['beat_track'], 0.02) for r in rows])
+        octave = np.mean([agrees(r[name], r['beat_track'], 0.04, allow_octave=True) for r in rows])
+        ms = 1000 * np.mean(timings[name])
+        print(f"  {name:<12} {exact:>7.1%} {close:>7.1%} {octave:>8.1%} {ms:>10.1f} {reference_ms / ms:>7.2f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nSaved per-track results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
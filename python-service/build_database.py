@@ -12,8 +12,12 @@ import soundfile as sf
 import numpy as np
 from tqdm import tqdm
 import time
+import sys
 from dotenv import load_dotenv
 
+import catalog_manifest
+from audio_features import SEGMENT_COUNT, segment_means
+
 # Load environment variables
 load_dotenv()
 
@@ -114,6 +118,7 @@ def download_audio_from_youtube(track_info):
 def extract_openl3_embedding(audio_path):
     """
     Extract OpenL3 embedding from audio file
+    Returns (averaged embedding, SEGMENT_COUNT segment embeddings)
     """
     try:
         # Load audio
@@ -127,13 +132,50 @@ def extract_openl3_embedding(audio_path):
             embedding_size=512
         )
 
-        # Average embeddings across time
+        # Average embeddings across time, and within each time segment
         avg_emb = np.mean(emb, axis=0)
+        segments = segment_means(emb, SEGMENT_COUNT)
 
-        return avg_emb.tolist()
+        return avg_emb.tolist(), segments.tolist()
     except Exception as e:
         print(f"❌ Failed to extract embedding: {e}")
-        return None
+        return None, None
+
+
+def add_segment_embeddings():
+    """
+    Backfill segment embeddings for songs already in the database, from the
+    downloaded audio (no Last.fm or YouTube access needed)
+    """
+    with open(EMBEDDINGS_FILE, 'r') as f:
+        embeddings_db = json.load(f)
+
+    updated = 0
+    for song_id, song_data in tqdm(embeddings_db.items(), desc="Segment embeddings"):
+        audio_path = os.path.join(AUDIO_DIR, f"{song_id}.mp3")
+        if len(song_data.get('segments', [])) == SEGMENT_COUNT or not os.path.exists(audio_path):
+            continue
+        _, segments = extract_openl3_embedding(audio_path)
+        if segments:
+            song_data['segments'] = segments
+            updated += 1
+
+    with open(EMBEDDINGS_FILE, 'w') as f:
+        json.dump(embeddings_db, f, indent=2)
+    record_openl3(embeddings_db)
+    print(f"\n✅ Added segment embeddings to {updated} songs")
+
+
+def record_openl3(embeddings_db):
+    """Record in the manifest which audio and extractor produced the embeddings"""
+    manifest = catalog_manifest.load_manifest()
+    params = catalog_manifest.extractor_params('openl3')
+    for song_id, song_data in embeddings_db.items():
+        audio_path = os.path.join(AUDIO_DIR, f"{song_id}.mp3")
+        if os.path.exists(audio_path) and song_data.get('segments'):
+            sha256 = catalog_manifest.audio_hash(manifest, song_id, audio_path)
+            catalog_manifest.record(manifest, song_id, 'openl3', audio_path, sha256, params)
+    catalog_manifest.save_manifest(manifest)
 
 
 def build_database():
@@ -160,11 +202,12 @@ def build_database():
 
         if audio_path:
             # Extract OpenL3 embedding
-            embedding = extract_openl3_embedding(audio_path)
+            embedding, segments = extract_openl3_embedding(audio_path)
 
             if embedding:
                 embeddings_db[track['id']] = {
                     'embedding': embedding,
+                    'segments': segments,
                     'title': track['title'],
                     'artist': track['artist'],
                     'playcount': track['playcount'],
@@ -177,6 +220,7 @@ def build_database():
     # Save embeddings
     with open(EMBEDDINGS_FILE, 'w') as f:
         json.dump(embeddings_db, f, indent=2)
+    record_openl3(embeddings_db)
 
     print(f"\n✅ Database built successfully!")
     print(f"   - Songs processed: {len(embeddings_db)}/{len(tracks)}")
@@ -185,6 +229,10 @@ def build_database():
 
 
 if __name__ == '__main__':
+    if '--segments-only' in sys.argv:
+        add_segment_embeddings()
+        exit(0)
+
     if not LASTFM_API_KEY:
         print("❌ ERROR: Please set LASTFM_API_KEY environment variable")
         print("Get your free API key at: https://www.last.fm/api/account/create")
@@ -0,0 +1,162 @@
+"""
+Catalog manifest: which extractor version and parameters produced each
+track's fields, and from which audio.
+
+song_database/manifest.json records, per field group ('features:<profile>'
+for the librosa scalars, 'openl3' for the embeddings), the parameters the
+current code uses, and per track the audio's sha256 plus the parameter
+digest each group was last computed with. A group is stale for a track when
+it was never recorded, the parameters changed, or the audio changed, so
+recompute_catalog.py only redoes those, and the service can report
+query/catalog feature drift.
+"""
+
+import hashlib
+import json
+import os
+
+import librosa
+
+from audio_features import (
+    ANALYSIS_PROFILES,
+    DEFAULT_TEMPO_ESTIMATOR,
+    FEATURE_SECONDS,
+    SEGMENT_COUNT,
+    TEMPO_SETTINGS,
+    get_profile
+)
+
+MANIFEST_FILE = 'song_database/manifest.json'
+AUDIO_DIR = 'song_database/audio'
+# Catalog audio is stored as <song_id><ext>; downloaded tracks are mp3
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.ogg', '.m4a')
+MANIFEST_VERSION = 1
+
+# Bump when extract_librosa_features changes in a way that alters its output
+FEATURE_EXTRACTOR_VERSION = 3
+# Bump when build_database.extract_openl3_embedding changes
+OPENL3_EXTRACTOR_VERSION = 2
+
+FEATURE_FIELDS = ['tempo', 'key', 'mode', 'energy', 'brightness', 'chroma']
+OPENL3_FIELDS = ['embedding', 'segments']
+
+
+def feature_group(profile):
+    return f'features:{profile}'
+
+
+def extractor_params(group, tempo_estimator=None):
+    """Parameters that determine a group's output (hashed into its digest)"""
+    if group == 'openl3':
+        return {
+            'version': OPENL3_EXTRACTOR_VERSION,
+            'content_type': 'music',
+            'embedding_size': 512,
+            'segments': SEGMENT_COUNT
+        }
+    profile = group.split(':', 1)[1]
+    estimator = tempo_estimator or DEFAULT_TEMPO_ESTIMATOR
+    return {
+        'version': FEATURE_EXTRACTOR_VERSION,
+        'profile': profile,
+        **get_profile(profile),
+        'seconds': FEATURE_SECONDS,
+        'tempo_estimator': estimator,
+        'tempo_settings': TEMPO_SETTINGS.get(estimator),
+        'librosa': librosa.__version__
+    }
+
+
+def all_groups():
+    return [feature_group(profile) for profile in sorted(ANALYSIS_PROFILES)] + ['openl3']
+
+
+def find_audio(song_id, audio_dir=AUDIO_DIR):
+    """Path of a catalog track's audio, or None"""
+    for ext in AUDIO_EXTENSIONS:
+        path = os.path.join(audio_dir, f'{song_id}{ext}')
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def params_digest(params):
+    encoded = json.dumps(params, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(path=MANIFEST_FILE):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {'version': MANIFEST_VERSION, 'extractors': {}, 'tracks': {}}
+
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    """Write atomically, with sorted keys so rebuilds produce identical files"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def audio_hash(manifest, song_id, audio_path):
+    """sha256 of the track's audio, reusing the recorded one if size and mtime match"""
+    stat = os.stat(audio_path)
+    entry = manifest['tracks'].get(song_id, {})
+    if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns and entry.get('sha256'):
+        return entry['sha256']
+    return file_sha256(audio_path)
+
+
+def stale_reason(manifest, song_id, group, sha256, digest):
+    """Why a group needs recomputing for a track ('missing', 'params', 'audio'), or None"""
+    entry = manifest['tracks'].get(song_id)
+    recorded = (entry or {}).get('groups', {}).get(group)
+    if recorded is None:
+        return 'missing'
+    if recorded['params'] != digest:
+        return 'params'
+    if recorded['sha256'] != sha256:
+        return 'audio'
+    return None
+
+
+def record(manifest, song_id, group, audio_path, sha256, params):
+    """Record that group was computed for song_id from this audio with these params"""
+    digest = params_digest(params)
+    manifest['extractors'][group] = {'params': params, 'digest': digest}
+    stat = os.stat(audio_path)
+    entry = manifest['tracks'].setdefault(song_id, {'groups': {}})
+    entry.update({'sha256': sha256, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+    entry.setdefault('groups', {})[group] = {'params': digest, 'sha256': sha256}
+
+
+def drift_summary(manifest, groups=None, tempo_estimator=None):
+    """
+    Per group, how many catalog tracks were computed with the parameters the
+    current code (and tempo estimator) would use: {group: {current, stale, untracked}}
+    """
+    summary = {}
+    tracks = manifest.get('tracks', {})
+    for group in groups or all_groups():
+        digest = params_digest(extractor_params(group, tempo_estimator))
+        counts = {'current': 0, 'stale': 0, 'untracked': 0}
+        for entry in tracks.values():
+            recorded = entry.get('groups', {}).get(group)
+            if recorded is None:
+                counts['untracked'] += 1
+            elif recorded['params'] == digest:
+                counts['current'] += 1
+            else:
+                counts['stale'] += 1
+        summary[group] = counts
+    return summary
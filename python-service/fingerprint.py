@@ -0,0 +1,252 @@
+"""
+Landmark (peak-pair) audio fingerprints for exact catalog identification.
+
+Spectrogram peaks are paired with the next few peaks after them, and each
+pair is hashed as (f1, f2, dt) into a 32-bit integer stored with the anchor
+peak's frame offset. The catalog index is three flat arrays sorted by hash
+(hash, track row, offset) saved as an .npz. A lookup is a vectorized
+searchsorted over the query hashes followed by a vote over (track, time
+offset) pairs: a real match lines many hashes up at one consistent offset.
+
+Build the index from song_database/audio, and check it on catalog excerpts:
+    python fingerprint.py build
+    python fingerprint.py evaluate --tracks 50 --seconds 8
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import librosa
+from scipy.ndimage import maximum_filter
+
+from catalog_manifest import AUDIO_DIR, AUDIO_EXTENSIONS
+
+FINGERPRINT_FILE = 'song_database/fingerprints.npz'
+
+# Analysis parameters (stored in the index; an index built with other
+# parameters is refused)
+SAMPLE_RATE = 11025
+N_FFT = 1024
+HOP_LENGTH = 512                # ~46 ms frames
+FREQ_BINS = 512                 # drop the Nyquist bin so f fits in 9 bits
+PEAK_NEIGHBORHOOD = (15, 11)    # (freq bins, frames)
+PEAK_MIN_DB = -50.0             # relative to the loudest bin
+PEAKS_PER_SECOND = 30
+FAN_OUT = 5                     # pairs per anchor peak
+MAX_DT = 63                     # frames between paired peaks (fits 6 bits)
+
+# Matching
+QUERY_SECONDS = 8.0
+MIN_MATCHES = 15                # aligned hash votes needed for a hit
+MIN_MARGIN = 2.0                # best track must beat the runner-up by this factor
+MAX_HASH_OCCURRENCES = 2000     # ignore query hashes this common in the catalog
+
+_OFFSET_SPAN = 1 << 24
+_OFFSET_BIAS = 1 << 23
+
+
+def params():
+    return {
+        'sample_rate': SAMPLE_RATE, 'n_fft': N_FFT, 'hop_length': HOP_LENGTH,
+        'peak_neighborhood': list(PEAK_NEIGHBORHOOD), 'peak_min_db': PEAK_MIN_DB,
+        'peaks_per_second': PEAKS_PER_SECOND, 'fan_out': FAN_OUT, 'max_dt': MAX_DT
+    }
+
+
+def spectrogram_peaks(y):
+    """Return (freq bins, frames) of the strongest local maxima, sorted by time"""
+    S = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))[:FREQ_BINS]
+    if S.size == 0 or not S.any():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    log_S = librosa.amplitude_to_db(S, ref=np.max)
+    peaks = (maximum_filter(log_S, size=PEAK_NEIGHBORHOOD) == log_S) & (log_S > PEAK_MIN_DB)
+    freqs, frames = np.nonzero(peaks)
+
+    # Bound the peak density so hash counts scale with duration only
+    limit = max(1, int(PEAKS_PER_SECOND * len(y) / SAMPLE_RATE))
+    if len(freqs) > limit:
+        strongest = np.argpartition(-log_S[freqs, frames], limit - 1)[:limit]
+        freqs, frames = freqs[strongest], frames[strongest]
+
+    order = np.lexsort((freqs, frames))
+    return freqs[order], frames[order]
+
+
+def landmark_hashes(freqs, frames):
+    """Pair each peak with the next FAN_OUT peaks; return (uint32 hashes, anchor frames)"""
+    n = len(frames)
+    if n < 2:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32)
+    anchors = np.concatenate([np.arange(n - k) for k in range(1, min(FAN_OUT, n - 1) + 1)])
+    targets = np.concatenate([np.arange(k, n) for k in range(1, min(FAN_OUT, n - 1) + 1)])
+    dt = frames[targets] - frames[anchors]
+    keep = (dt > 0) & (dt <= MAX_DT)
+    anchors, targets, dt = anchors[keep], targets[keep], dt[keep]
+    hashes = (freqs[anchors].astype(np.uint32) << 15) | (freqs[targets].astype(np.uint32) << 6) | dt.astype(np.uint32)
+    return hashes, frames[anchors].astype(np.uint32)
+
+
+def fingerprint(y):
+    return landmark_hashes(*spectrogram_peaks(y))
+
+
+def fingerprint_file(audio_path, duration=None):
+    y, _ = librosa.load(audio_path, sr=SAMPLE_RATE, mono=True, duration=duration)
+    return fingerprint(y)
+
+
+class FingerprintIndex:
+    def __init__(self, ids, hashes, rows, offsets):
+        """ids: song ids; hashes/rows/offsets: parallel arrays sorted by hash"""
+        self.ids = list(ids)
+        self.hashes = hashes
+        self.rows = rows
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, tracks):
+        """tracks: iterable of (song_id, hashes, offsets)"""
+        ids, hashes, rows, offsets = [], [], [], []
+        for song_id, track_hashes, track_offsets in tracks:
+            rows.append(np.full(len(track_hashes), len(ids), dtype=np.uint32))
+            ids.append(song_id)
+            hashes.append(track_hashes)
+            offsets.append(track_offsets)
+        if not ids:
+            empty = np.empty(0, dtype=np.uint32)
+            return cls([], empty, empty, empty)
+        hashes = np.concatenate(hashes)
+        order = np.argsort(hashes, kind='stable')
+        return cls(ids, hashes[order], np.concatenate(rows)[order], np.concatenate(offsets)[order])
+
+    def save(self, path=FINGERPRINT_FILE):
+        # Uncompressed: the arrays are high-entropy and load faster as-is
+        np.savez(path, ids=np.array(self.ids), hashes=self.hashes, rows=self.rows,
+                 offsets=self.offsets, params=np.array(json.dumps(params(), sort_keys=True)))
+
+    @classmethod
+    def load(cls, path=FINGERPRINT_FILE):
+        with np.load(path) as data:
+            stored = json.loads(str(data['params']))
+            if stored != json.loads(json.dumps(params(), sort_keys=True)):
+                raise ValueError(f'{path} was built with different fingerprint parameters; rebuild it')
+            return cls(data['ids'].tolist(), data['hashes'], data['rows'], data['offsets'])
+
+    def lookup(self, hashes, offsets):
+        """
+        Identify a query from its landmark hashes. Returns {'id', 'votes',
+        'confidence', 'offset_seconds'} for a confident exact match, else None.
+        """
+        if len(hashes) == 0 or len(self.hashes) == 0:
+            return None
+        left = np.searchsorted(self.hashes, hashes, side='left')
+        right = np.searchsorted(self.hashes, hashes, side='right')
+        counts = right - left
+        counts[counts > MAX_HASH_OCCURRENCES] = 0
+        total = int(counts.sum())
+        if total == 0:
+            return None
+
+        # Expand every query hash into its catalog occurrences, without a loop
+        query = np.repeat(np.arange(len(hashes)), counts)
+        starts = np.repeat(left - (np.cumsum(counts) - counts), counts)
+        positions = starts + np.arange(total)
+        rows = self.rows[positions].astype(np.int64)
+        deltas = self.offsets[positions].astype(np.int64) - offsets[query].astype(np.int64)
+
+        keys, votes = np.unique(rows * _OFFSET_SPAN + deltas + _OFFSET_BIAS, return_counts=True)
+        best = int(np.argmax(votes))
+        best_row = int(keys[best] // _OFFSET_SPAN)
+        best_votes = int(votes[best])
+        others = votes[keys // _OFFSET_SPAN != best_row]
+        runner_up = int(others.max()) if len(others) else 0
+
+        if best_votes < MIN_MATCHES or best_votes < MIN_MARGIN * runner_up:
+            return None
+        delta = int(keys[best] % _OFFSET_SPAN) - _OFFSET_BIAS
+        return {
+            'id': self.ids[best_row],
+            'votes': best_votes,
+            'confidence': round(best_votes / len(hashes), 4),
+            'offset_seconds': round(delta * HOP_LENGTH / SAMPLE_RATE, 2)
+        }
+
+    def identify_file(self, audio_path, seconds=QUERY_SECONDS):
+        return self.lookup(*fingerprint_file(audio_path, duration=seconds))
+
+
+def catalog_audio(audio_dir=AUDIO_DIR):
+    """(song_id, path) for every catalog audio file"""
+    for filename in sorted(os.listdir(audio_dir)):
+        song_id, ext = os.path.splitext(filename)
+        if ext.lower() in AUDIO_EXTENSIONS:
+            yield song_id, os.path.join(audio_dir, filename)
+
+
+def _fingerprint_track(item):
+    song_id, path = item
+    try:
+        return (song_id, *fingerprint_file(path))
+    except Exception as e:
+        print(f"Failed to fingerprint {song_id}: {e}", flush=True)
+        return None
+
+
+def build_catalog_index(audio_dir=AUDIO_DIR, workers=None):
+    from multiprocessing import Pool
+
+    items = list(catalog_audio(audio_dir))
+    with Pool(workers) as pool:
+        tracks = [t for t in pool.imap(_fingerprint_track, items, chunksize=8) if t is not None]
+    return FingerprintIndex.build(tracks)
+
+
+def evaluate(index, tracks, seconds, seed=0):
+    """Hit rate and lookup time on random excerpts of catalog tracks"""
+    rng = np.random.default_rng(seed)
+    paths = dict(catalog_audio())
+    hits = 0
+    latencies = []
+    chosen = rng.choice(len(index), min(tracks, len(index)), replace=False)
+    for row in chosen:
+        song_id = index.ids[row]
+        y, _ = librosa.load(paths[song_id], sr=SAMPLE_RATE, mono=True)
+        start = int(rng.uniform(0, max(0, len(y) - seconds * SAMPLE_RATE)))
+        excerpt = y[start:start + int(seconds * SAMPLE_RATE)]
+
+        started = time.perf_counter()
+        match = index.lookup(*fingerprint(excerpt))
+        latencies.append(time.perf_counter() - started)
+        hits += bool(match and match['id'] == song_id)
+    return hits / len(chosen), 1000 * float(np.median(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or evaluate the catalog fingerprint index')
+    parser.add_argument('command', choices=['build', 'evaluate'])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--tracks', type=int, default=50, help='Tracks sampled by evaluate')
+    parser.add_argument('--seconds', type=float, default=QUERY_SECONDS, help='Excerpt length for evaluate')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        index = build_catalog_index(workers=args.workers)
+        index.save()
+        size_mb = os.path.getsize(FINGERPRINT_FILE) / (1024 * 1024)
+        print(f"✓ Fingerprinted {len(index)} tracks ({len(index.hashes)} hashes, {size_mb:.1f} MB) "
+              f"in {time.perf_counter() - started:.1f}s -> {FINGERPRINT_FILE}")
+    else:
+        index = FingerprintIndex.load()
+        hit_rate, median_ms = evaluate(index, args.tracks, args.seconds)
+        print(f"{args.seconds:.0f}s excerpts: {hit_rate:.1%} identified, median lookup {median_ms:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
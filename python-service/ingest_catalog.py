@@ -0,0 +1,367 @@
+"""
+Ingest a bulk drop of licensed audio into the catalog, offline.
+
+Takes a directory or a .zip/.tar(.gz) archive of audio files plus a metadata
+CSV or JSON. Files are deduplicated by content hash (against the catalog and
+within the drop) and featurized on a process pool: embedding, segment
+embeddings and the librosa features for each profile. The new tracks are then
+appended to embeddings.json, metadata.json, the audio directory and the
+manifest in one bulk write.
+
+Archive members are extracted one at a time, just ahead of the pool, and
+workers are recycled every --tasks-per-child files. This keeps worker memory
+and temp space bounded regardless of how big the drop is. The parent keeps
+every featurized track until the single bulk write (as arrays, roughly
+20 KB per track with 4 segments) on top of the loaded catalog JSON, so its
+memory grows with the drop; split very large drops into several runs.
+
+Metadata rows need 'file' (path or basename inside the drop), 'title' and
+'artist'. 'playcount', 'listeners' and 'url' are optional. JSON may be a list
+of rows or {file: row}.
+
+    python ingest_catalog.py drop.zip --metadata drop.csv
+    python ingest_catalog.py ./drop/ --metadata drop.json --workers 4 --embedder lightweight
+    python ingest_catalog.py drop.tar.gz --metadata drop.csv --dry-run
+"""
+
+import os
+
+# Each worker analyzes one file at a time; keep BLAS single-threaded in them
+# so N workers use N cores (set before numpy is imported)
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+os.environ.setdefault('MKL_NUM_THREADS', '1')
+
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import re
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+import catalog_manifest
+from audio_features import (
+    ANALYSIS_PROFILES,
+    EMBEDDING_SECONDS,
+    FEATURE_SECONDS,
+    SEGMENT_COUNT,
+    extract_embedding,
+    extract_librosa_features,
+    load_audio,
+    magnitude_spectrogram,
+    segment_means
+)
+
+EMBEDDINGS_FILE = 'song_database/embeddings.json'
+METADATA_FILE = 'song_database/metadata.json'
+
+_openl3_model = None
+
+
+def read_metadata(path):
+    """Return {basename or relative path: row}"""
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        rows = [dict(row, file=name) for name, row in data.items()] if isinstance(data, dict) else data
+    else:
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+
+    by_file = {}
+    for row in rows:
+        name = row.get('file') or row.get('filename')
+        if name and row.get('title') and row.get('artist'):
+            by_file[os.path.normpath(name)] = row
+            by_file.setdefault(os.path.basename(name), row)
+    return by_file
+
+
+def iter_source(source, work_dir):
+    """
+    Yield (name inside the drop, local path, is_temporary) for each audio
+    file. Archive members are extracted lazily into work_dir.
+    """
+    def is_audio(name):
+        return os.path.splitext(name)[1].lower() in catalog_manifest.AUDIO_EXTENSIONS
+
+    counter = itertools.count()
+
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for filename in sorted(files):
+                if is_audio(filename):
+                    path = os.path.join(root, filename)
+                    yield os.path.relpath(path, source), path, False
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_audio(info.filename):
+                    continue
+                path = os.path.join(work_dir, f'{next(counter)}_{os.path.basename(info.filename)}')
+                with archive.open(info) as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                yield info.filename, path, True
+    elif tarfile.is_tarfile(source):
+        with tarfile.open(source, 'r:*') as archive:
+            for member in archive:
+                if not member.isfile() or not is_audio(member.name):
+                    continue
+                path = os.path.join(work_dir, f'{next(counter)}_{os.path.basename(member.name)}')
+                with archive.extractfile(member) as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                yield member.name, path, True
+    else:
+        raise ValueError(f'{source} is not a directory, zip or tar archive')
+
+
+def openl3_embedding(audio_path):
+    """OpenL3 embedding + segments, as build_database.py computes them (model loaded once per worker)"""
+    global _openl3_model
+    import librosa
+    import numpy as np
+    import openl3
+
+    if _openl3_model is None:
+        _openl3_model = openl3.models.load_audio_embedding_model(
+            input_repr='mel256', content_type='music', embedding_size=512)
+    audio, sr = librosa.load(audio_path, sr=None, mono=True)
+    emb, _ = openl3.get_audio_embedding(audio, sr, model=_openl3_model, verbose=False)
+    return np.mean(emb, axis=0).tolist(), segment_means(emb, SEGMENT_COUNT).tolist()
+
+
+def lightweight_embedding(audio_path):
+    """The service's query embedding, with segments from the same features on time slices"""
+    y, sr = load_audio(audio_path, 'standard', duration=EMBEDDING_SECONDS)
+    S = magnitude_spectrogram(y, 'standard')
+    embedding = extract_embedding(y, sr, S=S)
+    bounds = [round(i * len(y) / SEGMENT_COUNT) for i in range(SEGMENT_COUNT + 1)]
+    segments = [extract_embedding(y[start:end], sr) for start, end in zip(bounds, bounds[1:])]
+    return embedding, segments
+
+
+def featurize(audio_path, profiles, embedder):
+    """Worker task: everything a catalog entry needs for one file"""
+    try:
+        if embedder == 'openl3':
+            embedding, segments = openl3_embedding(audio_path)
+        else:
+            embedding, segments = lightweight_embedding(audio_path)
+        features = {}
+        for profile in profiles:
+            y, sr = load_audio(audio_path, profile, duration=FEATURE_SECONDS)
+            features[profile] = extract_librosa_features(y, sr, profile=profile)
+        return {'embedding': embedding, 'segments': segments, 'features': features}
+    except Exception as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+
+
+def compact(result):
+    """
+    Hold a result's vectors as float64 arrays until the bulk write: about a
+    quarter of the memory of lists of Python floats, and the JSON written
+    from them is identical
+    """
+    result['embedding'] = np.asarray(result['embedding'], dtype=np.float64)
+    result['segments'] = np.asarray(result['segments'], dtype=np.float64)
+    return result
+
+
+def json_default(value):
+    # Arrays are converted one entry at a time while encoding
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def next_track_number(embeddings_db, metadata, audio_dir=catalog_manifest.AUDIO_DIR):
+    """
+    First unused track_NNNN number across embeddings.json, metadata.json and
+    the audio directory (a partially built catalog can have ids in only some)
+    """
+    song_ids = set(embeddings_db)
+    song_ids.update(song.get('id', '') for song in metadata)
+    if os.path.isdir(audio_dir):
+        song_ids.update(os.path.splitext(filename)[0] for filename in os.listdir(audio_dir))
+    numbers = [int(m.group(1)) for song_id in song_ids if (m := re.fullmatch(r'track_(\d+)', song_id))]
+    return max(numbers, default=0) + 1
+
+
+def catalog_hashes(embeddings_db, manifest):
+    """sha256 -> song_id for every catalog track with audio (cached in the manifest)"""
+    hashes = {}
+    for song_id in embeddings_db:
+        audio_path = catalog_manifest.find_audio(song_id)
+        if audio_path is not None:
+            hashes[catalog_manifest.audio_hash(manifest, song_id, audio_path)] = song_id
+    return hashes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest a directory or archive of audio into the catalog')
+    parser.add_argument('source', help='Directory, .zip or .tar(.gz) of audio files')
+    parser.add_argument('--metadata', required=True, help='CSV or JSON with file, title, artist columns')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--tasks-per-child', type=int, default=50, help='Recycle workers after this many files')
+    parser.add_argument('--embedder', choices=['openl3', 'lightweight'], default='openl3',
+                        help='openl3 matches build_database.py; lightweight needs no TensorFlow')
+    parser.add_argument('--profiles', default=','.join(sorted(ANALYSIS_PROFILES)),
+                        help='Analysis profiles to compute features for')
+    parser.add_argument('--dry-run', action='store_true', help='Featurize and report, but write nothing')
+    args = parser.parse_args()
+
+    profiles = [p.strip() for p in args.profiles.split(',') if p.strip()]
+    unknown = set(profiles) - set(ANALYSIS_PROFILES)
+    if unknown or 'standard' not in profiles:
+        parser.error('--profiles must include standard and only known profiles')
+
+    metadata_rows = read_metadata(args.metadata)
+    with open(EMBEDDINGS_FILE, 'r') as f:
+        embeddings_db = json.load(f)
+    with open(METADATA_FILE, 'r') as f:
+        metadata = json.load(f)
+    manifest = catalog_manifest.load_manifest()
+
+    print(f"Catalog: {len(embeddings_db)} tracks; metadata rows: {len(metadata_rows)}")
+    known = catalog_hashes(embeddings_db, manifest)
+    next_number = next_track_number(embeddings_db, metadata)
+    next_rank = max((song.get('rank') or 0 for song in embeddings_db.values()), default=0) + 1
+
+    counts = {'ingested': 0, 'duplicate': 0, 'no_metadata': 0, 'failed': 0}
+    new_tracks = []  # (song_id, row, sha256, source path, is_temporary, result)
+    max_in_flight = 2 * args.workers
+    start = time.perf_counter()
+
+    work_dir = tempfile.mkdtemp(prefix='ingest_')
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx,
+                                 max_tasks_per_child=args.tasks_per_child) as pool:
+            pending = {}
+
+            def collect(done):
+                for future in done:
+                    name, row, sha256, path, temporary = pending.pop(future)
+                    result = future.result()
+                    if 'error' in result:
+                        print(f"Failed {name}: {result['error']}", flush=True)
+                        counts['failed'] += 1
+                        known.pop(sha256, None)
+                        if temporary:
+                            os.unlink(path)
+                        continue
+                    new_tracks.append((name, row, sha256, path, temporary, compact(result)))
+                    done_count = len(new_tracks) + counts['failed']
+                    if done_count % 50 == 0:
+                        print(f"  {done_count} files featurized", flush=True)
+
+            for name, path, temporary in iter_source(args.source, work_dir):
+                row = metadata_rows.get(os.path.normpath(name)) or metadata_rows.get(os.path.basename(name))
+                sha256 = catalog_manifest.file_sha256(path)
+                skip = 'no_metadata' if row is None else 'duplicate' if sha256 in known else None
+                if skip:
+                    counts[skip] += 1
+                    if temporary:
+                        os.unlink(path)
+                    continue
+                known[sha256] = name
+
+                # Bound the work (and extracted temp files) waiting on the pool
+                while len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[pool.submit(featurize, path, profiles, args.embedder)] = (name, row, sha256, path, temporary)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        elapsed = time.perf_counter() - start
+
+        # Bulk append, in drop order
+        new_tracks.sort(key=lambda track: track[0])
+        copies = []  # (song_id, sha256, source path, is_temporary, catalog audio path)
+        for name, row, sha256, path, temporary, result in new_tracks:
+            song_id = f'track_{next_number:04d}'
+            next_number += 1
+            standard = result['features']['standard']
+            entry = {
+                'embedding': result['embedding'],
+                'segments': result['segments'],
+                'title': row['title'],
+                'artist': row['artist'],
+                'playcount': int(row.get('playcount') or 0),
+                'rank': next_rank,
+                **{field: standard[field] for field in catalog_manifest.FEATURE_FIELDS}
+            }
+            other = {p: result['features'][p] for p in profiles if p != 'standard'}
+            if other:
+                entry['profiles'] = other
+            embeddings_db[song_id] = entry
+            metadata.append({
+                'id': song_id,
+                'title': row['title'],
+                'artist': row['artist'],
+                'playcount': int(row.get('playcount') or 0),
+                'listeners': int(row.get('listeners') or 0),
+                'url': row.get('url') or '',
+                'rank': next_rank
+            })
+            next_rank += 1
+            counts['ingested'] += 1
+
+            ext = os.path.splitext(path)[1].lower()
+            copies.append((song_id, sha256, path, temporary,
+                           os.path.join(catalog_manifest.AUDIO_DIR, f'{song_id}{ext}')))
+
+        if not args.dry_run:
+            # Never overwrite catalog audio: check every target before moving any
+            taken = [song_id for song_id, *_ in copies if catalog_manifest.find_audio(song_id) is not None]
+            if taken:
+                print(f"Refusing to overwrite existing audio for {', '.join(taken[:5])}"
+                      f"{' ...' if len(taken) > 5 else ''}; nothing written")
+                sys.exit(1)
+
+            for song_id, sha256, path, temporary, audio_path in copies:
+                (shutil.move if temporary else shutil.copyfile)(path, audio_path)
+                for profile in profiles:
+                    group = catalog_manifest.feature_group(profile)
+                    catalog_manifest.record(manifest, song_id, group, audio_path, sha256,
+                                            catalog_manifest.extractor_params(group))
+                if args.embedder == 'openl3':
+                    catalog_manifest.record(manifest, song_id, 'openl3', audio_path, sha256,
+                                            catalog_manifest.extractor_params('openl3'))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    processed = len(new_tracks) + counts['failed']
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"\nFeaturized {processed} files in {elapsed:.1f}s: {rate:.2f} tracks/sec, "
+          f"{rate / args.workers:.3f} tracks/sec/core ({args.workers} workers, {args.embedder})")
+    print(f"  ingested {counts['ingested']}, duplicates {counts['duplicate']}, "
+          f"no metadata {counts['no_metadata']}, failed {counts['failed']}")
+
+    if args.dry_run or not counts['ingested']:
+        print("Nothing written" + (" (dry run)" if args.dry_run else ""))
+        return
+
+    for path, data in ((EMBEDDINGS_FILE, embeddings_db), (METADATA_FILE, metadata)):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2, default=json_default)
+        os.replace(tmp_path, path)
+    catalog_manifest.save_manifest(manifest)
+    print(f"Appended {counts['ingested']} tracks to {EMBEDDINGS_FILE} and {METADATA_FILE}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+In-memory job store for async audio analysis jobs.
+
+Each job carries a version counter and a condition variable so that status
+requests can long-poll (or stream server-sent events) and wake up as soon as
+the worker publishes a new stage or the final result, instead of clients
+re-polling on a fixed interval.
+"""
+
+import threading
+from datetime import datetime
+
+# Stages reported while a job is processing, in order
+JOB_STAGES = ['queued', 'fingerprint', 'preview', 'decode', 'features', 'embedding', 'search', 'done']
+
+
+class JobLimitExceeded(RuntimeError):
+    """A job went over one of its resource limits ('time', 'memory' or 'samples')"""
+
+    def __init__(self, limit, message):
+        super().__init__(message)
+        self.limit = limit
+
+
+class JobStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # result is whatever the caller completes with (app.py stores encoded JSON bytes);
+        # while processing it may hold a preliminary result, flagged by 'partial'
+        self._jobs = {}        # {job_id: {status, stage, result, partial, error, created_at, version}}
+        self._conditions = {}  # {job_id: threading.Condition}
+        self._listeners = {}   # {job_id: [callback(snapshot)]}
+
+    def __contains__(self, job_id):
+        with self._lock:
+            return job_id in self._jobs
+
+    def __len__(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def create(self, job_id):
+        with self._lock:
+            self._jobs[job_id] = {
+                'status': 'processing',
+                'stage': 'queued',
+                'result': None,
+                'partial': False,
+                'error': None,
+                'created_at': datetime.now().isoformat(),
+                'version': 0
+            }
+            self._conditions[job_id] = threading.Condition(self._lock)
+            return dict(self._jobs[job_id])
+
+    def get(self, job_id):
+        """Return a snapshot of the job, or None if it does not exist"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update(self, job_id, **fields):
+        """Apply fields to a job, bump its version and wake up any waiters"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            job['version'] += 1
+            snapshot = dict(job)
+            self._conditions[job_id].notify_all()
+            listeners = list(self._listeners.get(job_id, ()))
+
+        # Listeners run outside the lock so they can't deadlock the store
+        for callback in listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Job {job_id}: listener failed: {e}", flush=True)
+        return snapshot
+
+    def set_stage(self, job_id, stage):
+        return self.update(job_id, stage=stage)
+
+    def publish_partial(self, job_id, result):
+        """Publish a preliminary result; the job keeps processing"""
+        return self.update(job_id, result=result, partial=True)
+
+    def complete(self, job_id, result):
+        return self.update(job_id, status='completed', stage='done', result=result, partial=False)
+
+    def fail(self, job_id, error, **fields):
+        return self.update(job_id, status='failed', error=error, **fields)
+
+    def wait(self, job_id, since_version=None, timeout=30.0, partial=False):
+        """
+        Block until the job changes past since_version (or finishes when
+        since_version is None), or until timeout. Returns the latest snapshot.
+        With partial=True a published preliminary result also ends the wait.
+        """
+        with self._lock:
+            if job_id not in self._jobs:
+                return None
+            job = self._jobs[job_id]
+
+            def changed():
+                if job['status'] != 'processing' or (partial and job['partial']):
+                    return True
+                return since_version is not None and job['version'] > since_version
+
+            self._conditions[job_id].wait_for(changed, timeout=timeout)
+            return dict(job)
+
+    def add_listener(self, job_id, callback):
+        with self._lock:
+            self._listeners.setdefault(job_id, []).append(callback)
+
+    def remove_listener(self, job_id, callback):
+        with self._lock:
+            callbacks = self._listeners.get(job_id)
+            if callbacks and callback in callbacks:
+                callbacks.remove(callback)
+                if not callbacks:
+                    del self._listeners[job_id]
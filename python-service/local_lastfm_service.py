@@ -0,0 +1,76 @@
+"""
+Local stand-in for the Last.fm track.getInfo API, for offline testing of
+track_info.py and the frontend enrichment fallback.
+
+Answers GET /2.0/?method=track.getInfo&artist=...&track=... for catalog
+tracks in song_database/metadata.json with deterministic synthetic album,
+cover, duration and tags, and Last.fm's error 6 for anything else.
+
+Usage:
+    python local_lastfm_service.py --port 5200
+    LASTFM_API_URL=http://localhost:5200/2.0/ python track_info.py
+"""
+
+import argparse
+import json
+import os
+import zlib
+
+from flask import Flask, request, jsonify
+
+from track_info import METADATA_FILE, lastfm_url
+
+app = Flask(__name__)
+TRACKS = {}
+
+STUB_TAGS = ['rock', 'pop', 'indie', 'hip hop', 'folk', 'electronic', 'soul', 'jazz', 'metal', 'country']
+
+
+def load_tracks(path=METADATA_FILE):
+    with open(path, 'r') as f:
+        for song in json.load(f):
+            TRACKS[(song['artist'].lower(), song['title'].lower())] = song
+
+
+def stub_track(song):
+    seed = zlib.crc32(f"{song['artist']}|{song['title']}".encode('utf-8'))
+    cover = f"https://lastfm.freetls.fastly.net/i/u/300x300/{seed:08x}.png"
+    return {
+        'name': song['title'],
+        'artist': {'name': song['artist']},
+        'url': song.get('url') or lastfm_url(song['artist'], song['title']),
+        'duration': str(150000 + seed % 120000),
+        'playcount': str(song.get('playcount', 0)),
+        'listeners': str(song.get('listeners', 0)),
+        'album': {
+            'title': f"{song['title']} (Single)",
+            'image': [{'#text': cover, 'size': size} for size in ('small', 'medium', 'large', 'extralarge')]
+        },
+        'toptags': {'tag': [
+            {'name': 'spotify'},
+            {'name': STUB_TAGS[seed % len(STUB_TAGS)]},
+            {'name': STUB_TAGS[(seed // len(STUB_TAGS)) % len(STUB_TAGS)]}
+        ]}
+    }
+
+
+@app.route('/2.0/', methods=['GET'])
+def api():
+    if request.args.get('method', '').lower() != 'track.getinfo':
+        return jsonify({'error': 3, 'message': 'Invalid Method - No method with that name in this package'}), 400
+    key = (request.args.get('artist', '').lower(), request.args.get('track', '').lower())
+    song = TRACKS.get(key)
+    if song is None:
+        return jsonify({'error': 6, 'message': 'Track not found'}), 404
+    return jsonify({'track': stub_track(song)})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local Last.fm track.getInfo stub')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5200)))
+    parser.add_argument('--metadata', default=METADATA_FILE)
+    args = parser.parse_args()
+
+    load_tracks(args.metadata)
+    print(f"✓ Serving {len(TRACKS)} catalog tracks", flush=True)
+    app.run(host='0.0.0.0', port=args.port, threaded=True)
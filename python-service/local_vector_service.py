@@ -0,0 +1,96 @@
+"""
+Local stand-in for a Pinecone index, for offline testing and benchmarking.
+
+Serves an InProcessBackend over the Pinecone data-plane REST routes, so
+upload_to_pinecone.py --target local and the service (VECTOR_BACKEND=http)
+can run against it unchanged:
+
+    POST /vectors/upsert         {'vectors': [...], 'namespace'}
+    POST /query                  {'vector' | 'id', 'topK', 'includeMetadata', 'namespace'}
+                                 or {'queries': [{'values'}, ...], 'topK'} for a batch
+    POST /vectors/delete         {'ids' | 'deleteAll', 'namespace'}
+    GET|POST /describe_index_stats
+
+Usage:
+    python local_vector_service.py --port 5100 [--preload song_database/embeddings.json]
+"""
+
+import argparse
+import json
+import os
+
+from flask import Flask, request, jsonify
+
+from vector_backends import InProcessBackend
+
+app = Flask(__name__)
+BACKEND = InProcessBackend()
+
+
+@app.route('/vectors/upsert', methods=['POST'])
+def upsert():
+    body = request.get_json(force=True)
+    try:
+        return jsonify(BACKEND.upsert(body.get('vectors', []), namespace=body.get('namespace', '')))
+    except (KeyError, ValueError) as e:
+        return jsonify({'code': 3, 'message': str(e)}), 400
+
+
+@app.route('/query', methods=['POST'])
+def query():
+    body = request.get_json(force=True)
+    namespace = body.get('namespace', '')
+    top_k = int(body.get('topK', 10))
+    include_metadata = bool(body.get('includeMetadata', False))
+
+    # Batched form (the older Pinecone 'queries' shape): one GEMM for all
+    if 'queries' in body:
+        vectors = [q['values'] for q in body['queries']]
+        results = BACKEND.query_batch(vectors, top_k, include_metadata, namespace)
+        return jsonify({'results': results, 'namespace': namespace})
+
+    vector = body.get('vector')
+    if vector is None and 'id' in body:
+        vector = BACKEND.fetch_values(body['id'], namespace)
+        if vector is None:
+            return jsonify({'matches': [], 'namespace': namespace})
+    if vector is None:
+        return jsonify({'code': 3, 'message': 'Provide vector or id'}), 400
+
+    try:
+        return jsonify(BACKEND.query(vector, top_k, include_metadata, namespace))
+    except ValueError as e:
+        return jsonify({'code': 3, 'message': str(e)}), 400
+
+
+@app.route('/vectors/delete', methods=['POST'])
+def delete():
+    body = request.get_json(force=True)
+    return jsonify(BACKEND.delete(ids=body.get('ids'), delete_all=bool(body.get('deleteAll')),
+                                  namespace=body.get('namespace', '')))
+
+
+@app.route('/describe_index_stats', methods=['GET', 'POST'])
+def describe_index_stats():
+    return jsonify(BACKEND.describe_index_stats())
+
+
+def preload(path):
+    with open(path, 'r') as f:
+        embeddings_db = json.load(f)
+    vectors = ({'id': song_id, 'values': song['embedding'],
+                'metadata': {'title': song['title'], 'artist': song['artist']}}
+               for song_id, song in embeddings_db.items())
+    result = BACKEND.upsert(vectors)
+    print(f"✓ Preloaded {result['upsertedCount']} vectors from {path}", flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local Pinecone-compatible vector service')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5100)))
+    parser.add_argument('--preload', help='embeddings.json to load at startup')
+    args = parser.parse_args()
+
+    if args.preload:
+        preload(args.preload)
+    app.run(host='0.0.0.0', port=args.port, threaded=True)
@@ -0,0 +1,215 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Stage timings are recorded into histograms (strumsense_stage_seconds) and,
+when a job asked for it, into a per-job breakdown that is attached to the
+job result. No external client library is needed.
+"""
+
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds (upper bounds, +Inf is implicit)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+_local = threading.local()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = [f'{name}="{value}"' for name, value in labels]
+    return '{' + ','.join(parts) + '}'
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        return []
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(key)} {value}' for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, func=None):
+        super().__init__(name, help_text)
+        self._values = {}
+        self._func = func
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        if self._func is not None:
+            return self._func()
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def _samples(self):
+        if self._func is not None:
+            return [f'{self.name} {self._func()}']
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(key)} {value}' for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+        self._series = {}  # {labels: [bucket counts..., sum, count]}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        lines = []
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                labels = key + (('le', repr(float(bound))),)
+                lines.append(f'{self.name}_bucket{_format_labels(labels)} {count}')
+            lines.append(f'{self.name}_bucket{_format_labels(key + (("le", "+Inf"),))} {series[-1]}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {series[-2]}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {series[-1]}')
+        return lines
+
+
+def process_rss_bytes(pid='self'):
+    """Resident set size of a process from Linux /proc, or None if unavailable"""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def current_rss_bytes():
+    """Resident set size of this process (falls back to peak RSS)"""
+    rss = process_rss_bytes()
+    return rss if rss is not None else peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+STAGE_SECONDS = Histogram('strumsense_stage_seconds', 'Time spent in each processing stage')
+JOBS_TOTAL = Counter('strumsense_jobs_total', 'Jobs by lifecycle event (queued, started, completed, failed)')
+JOBS_RUNNING = Gauge('strumsense_jobs_running', 'Jobs currently being processed')
+JOBS_WAITING = Gauge('strumsense_jobs_waiting', 'Jobs queued but not yet started')
+RSS_BYTES = Gauge('strumsense_resident_memory_bytes', 'Current resident memory', func=current_rss_bytes)
+PEAK_RSS_BYTES = Gauge('strumsense_peak_resident_memory_bytes', 'Resident memory high-water mark', func=peak_rss_bytes)
+JOB_LIMITS_TOTAL = Counter('strumsense_job_limits_total', 'Jobs failed for exceeding a limit (time, memory, samples)')
+WORKER_RESTARTS_TOTAL = Counter('strumsense_worker_restarts_total', 'Analysis worker processes replaced, by reason')
+FINGERPRINT_LOOKUPS_TOTAL = Counter('strumsense_fingerprint_lookups_total', 'Upload fingerprint lookups by outcome (hit, miss, skipped)')
+PREVIEWS_TOTAL = Counter('strumsense_previews_total', 'Progressive previews by outcome (published, fallback, failed)')
+QUERY_LOG_ROWS_TOTAL = Counter('strumsense_query_log_rows_total', 'Query log rows by outcome (written, dropped)')
+SEARCH_BATCH_SIZE = Histogram('strumsense_search_batch_size', 'Queries scored together per batched catalog search',
+                              buckets=(1, 2, 4, 8, 16, 32, 64))
+SEARCH_BATCH_WAIT_SECONDS = Histogram('strumsense_search_batch_wait_seconds',
+                                      'Time a search waited for its batch to be scored',
+                                      buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+
+@contextmanager
+def job_timings():
+    """Collect stage timings for the current thread into a dict"""
+    previous = getattr(_local, 'timings', None)
+    timings = {}
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+
+@contextmanager
+def timed(stage):
+    """Time a block into the stage histogram and the current job's breakdown"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = getattr(_local, 'timings', None)
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + elapsed, 4)
+
+
+def record_timings(timings):
+    """Fold stage timings measured elsewhere (e.g. a worker process) into this one"""
+    current = getattr(_local, 'timings', None)
+    for stage, elapsed in timings.items():
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if current is not None:
+            current[stage] = round(current.get(stage, 0.0) + elapsed, 4)
+
+
+def render_prometheus():
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
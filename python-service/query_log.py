@@ -0,0 +1,248 @@
+"""
+Append-only columnar log of analyzed queries.
+
+Every full analysis logs its query embedding, scalar features, profile and
+the ids (and scores) it returned, so ranking changes can be replayed offline
+(replay_queries.py) without decoding any audio. Rows are handed to a
+background writer thread and appended in batches; the request path only
+enqueues.
+
+Layout: QUERY_LOG_DIR/segment-000001/ holds one raw little-endian file per
+column plus meta.json describing them:
+
+    embedding.f32      (rows, dims)
+    chroma.f32         (rows, 12) query chroma profile, zeros if missing
+    tempo.f32 energy.f32 brightness.f32 duration.f32 timestamp.f64
+    key_id.i16         0-23 (see song_index.key_id), -1 unknown
+    profile.u8         index into meta['profiles']
+    result_scores.f32  (rows, top_k), NaN-padded
+    result_ids.txt     one line per row, comma-separated song ids
+
+A segment is closed once its files pass max_segment_bytes and the oldest
+segments are deleted beyond max_segments. Readers trust only the rows that
+every column has (a crash mid-append leaves a short tail that is ignored).
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+import metrics
+from audio_features import ANALYSIS_PROFILES
+from song_index import CHROMA_BINS, KEYS, key_id
+
+LOG_VERSION = 1
+TOP_K = 10
+PROFILES = sorted(ANALYSIS_PROFILES)
+
+SCALAR_COLUMNS = {
+    'tempo': np.float32,
+    'energy': np.float32,
+    'brightness': np.float32,
+    'duration': np.float32,
+    'timestamp': np.float64,
+    'key_id': np.int16,
+    'profile': np.uint8
+}
+SUFFIXES = {np.float32: 'f32', np.float64: 'f64', np.int16: 'i16', np.uint8: 'u8'}
+
+
+def _column_file(name, dtype):
+    return f'{name}.{SUFFIXES[dtype]}'
+
+
+class QueryLog:
+    def __init__(self, directory, dims, max_segment_bytes=64 * 1024 * 1024, max_segments=20,
+                 flush_rows=64, flush_seconds=5.0, max_pending=10000):
+        self.directory = directory
+        self.dims = dims
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue(maxsize=max_pending)
+        os.makedirs(directory, exist_ok=True)
+        self._segment = None
+        self._thread = threading.Thread(target=self._run, name='query-log', daemon=True)
+        self._thread.start()
+
+    def record(self, embedding, features, profile, similar_songs, duration=None):
+        """Queue one analyzed query; never blocks (drops the row when the writer is behind)"""
+        row = (embedding, features, profile, [(s['id'], s['similarity_score']) for s in similar_songs],
+               duration, time.time())
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            metrics.QUERY_LOG_ROWS_TOTAL.inc(outcome='dropped')
+
+    def close(self, timeout=5.0):
+        """Flush queued rows and stop the writer"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        pending = []
+        last_flush = time.monotonic()
+        while True:
+            try:
+                row = self._queue.get(timeout=max(0.0, last_flush + self.flush_seconds - time.monotonic()))
+            except queue.Empty:
+                row = False
+            if row is None:
+                self._flush(pending)
+                return
+            if row:
+                pending.append(row)
+            if len(pending) >= self.flush_rows or time.monotonic() - last_flush >= self.flush_seconds:
+                self._flush(pending)
+                pending = []
+                last_flush = time.monotonic()
+
+    def _flush(self, rows):
+        if not rows:
+            return
+        try:
+            self._append(self._columns(rows))
+            metrics.QUERY_LOG_ROWS_TOTAL.inc(len(rows), outcome='written')
+        except Exception as e:
+            print(f"Query log write failed ({len(rows)} rows dropped): {e}", flush=True)
+            metrics.QUERY_LOG_ROWS_TOTAL.inc(len(rows), outcome='dropped')
+
+    def _columns(self, rows):
+        n = len(rows)
+        columns = {
+            'embedding': np.zeros((n, self.dims), dtype=np.float32),
+            'chroma': np.zeros((n, CHROMA_BINS), dtype=np.float32),
+            'result_scores': np.full((n, TOP_K), np.nan, dtype=np.float32)
+        }
+        scalars = {name: np.zeros(n, dtype=dtype) for name, dtype in SCALAR_COLUMNS.items()}
+        id_lines = []
+        for i, (embedding, features, profile, results, duration, timestamp) in enumerate(rows):
+            vector = np.asarray(embedding, dtype=np.float32)[:self.dims]
+            columns['embedding'][i, :len(vector)] = vector
+            chroma = features.get('chroma')
+            if chroma and len(chroma) == CHROMA_BINS:
+                columns['chroma'][i] = chroma
+            for name in ('tempo', 'energy', 'brightness'):
+                scalars[name][i] = features.get(name) or 0
+            scalars['key_id'][i] = key_id(features.get('key'), features.get('mode'))
+            scalars['profile'][i] = PROFILES.index(profile) if profile in PROFILES else 0
+            scalars['duration'][i] = duration or 0
+            scalars['timestamp'][i] = timestamp
+            results = results[:TOP_K]
+            columns['result_scores'][i, :len(results)] = [score for _, score in results]
+            id_lines.append(','.join(song_id for song_id, _ in results) + '\n')
+        columns.update(scalars)
+        columns['result_ids'] = ''.join(id_lines).encode('utf-8')
+        return columns
+
+    def _append(self, columns):
+        segment = self._current_segment()
+        for name, values in columns.items():
+            if name == 'result_ids':
+                path = os.path.join(segment, 'result_ids.txt')
+                with open(path, 'ab') as f:
+                    f.write(values)
+                continue
+            dtype = SCALAR_COLUMNS.get(name, np.float32)
+            with open(os.path.join(segment, _column_file(name, dtype)), 'ab') as f:
+                f.write(np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<')).tobytes())
+
+    def _current_segment(self):
+        if self._segment is not None and _directory_bytes(self._segment) < self.max_segment_bytes:
+            return self._segment
+
+        segments = list_segments(self.directory)
+        number = int(os.path.basename(segments[-1]).split('-')[1]) + 1 if segments else 1
+        self._segment = os.path.join(self.directory, f'segment-{number:06d}')
+        os.makedirs(self._segment)
+        with open(os.path.join(self._segment, 'meta.json'), 'w') as f:
+            json.dump({
+                'version': LOG_VERSION,
+                'dims': self.dims,
+                'top_k': TOP_K,
+                'profiles': PROFILES,
+                'columns': {name: SUFFIXES[dtype] for name, dtype in SCALAR_COLUMNS.items()},
+                'created_at': time.time()
+            }, f, indent=2)
+
+        # Rotation: keep the newest max_segments segments
+        for old in (segments + [self._segment])[:-self.max_segments]:
+            for filename in os.listdir(old):
+                os.unlink(os.path.join(old, filename))
+            os.rmdir(old)
+        return self._segment
+
+
+def _directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, filename)) for filename in os.listdir(path))
+
+
+def list_segments(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith('segment-'))
+
+
+def read_segment(segment):
+    """Columns of one segment as arrays (memory-mapped where possible), truncated to whole rows"""
+    with open(os.path.join(segment, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+    dims, top_k = meta['dims'], meta['top_k']
+
+    def load(name, dtype, width=1):
+        path = os.path.join(segment, _column_file(name, dtype))
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.zeros((0, width) if width > 1 else 0, dtype=dtype)
+        values = np.memmap(path, dtype=np.dtype(dtype).newbyteorder('<'), mode='r')
+        rows = len(values) // width
+        return values[:rows * width].reshape(rows, width) if width > 1 else values
+
+    columns = {name: load(name, dtype) for name, dtype in SCALAR_COLUMNS.items()}
+    columns['embedding'] = load('embedding', np.float32, dims)
+    columns['result_scores'] = load('result_scores', np.float32, top_k)
+    ids_path = os.path.join(segment, 'result_ids.txt')
+    lines = []
+    if os.path.exists(ids_path):
+        with open(ids_path, 'r', encoding='utf-8') as f:
+            lines = f.read().split('\n')[:-1]  # drop the trailing partial (or empty) line
+    columns['result_ids'] = [line.split(',') if line else [] for line in lines]
+
+    columns['chroma'] = load('chroma', np.float32, CHROMA_BINS)
+    rows = min(len(values) for values in columns.values())
+    columns = {name: values[:rows] for name, values in columns.items()}
+    columns['profile'] = np.array(meta['profiles'])[np.asarray(columns['profile'], dtype=np.int64)]
+    return columns
+
+
+def read_log(directory):
+    """All segments' columns concatenated (copies into memory)"""
+    parts = [read_segment(segment) for segment in list_segments(directory)]
+    parts = [part for part in parts if len(part['timestamp'])]
+    if not parts:
+        return None
+    columns = {}
+    for name in parts[0]:
+        if name == 'result_ids':
+            columns[name] = [ids for part in parts for ids in part[name]]
+        else:
+            columns[name] = np.concatenate([np.asarray(part[name]) for part in parts])
+    return columns
+
+
+def row_features(columns, row):
+    """Feature dict of a logged row, in the shape extract_librosa_features returns"""
+    key = int(columns['key_id'][row])
+    return {
+        'tempo': float(columns['tempo'][row]) or None,
+        'key': KEYS[key % 12] if key >= 0 else None,
+        'mode': ('Minor' if key >= 12 else 'Major') if key >= 0 else None,
+        'energy': float(columns['energy'][row]) or None,
+        'brightness': float(columns['brightness'][row]) or None,
+        'chroma': columns['chroma'][row].tolist() if columns['chroma'][row].any() else None
+    }
@@ -0,0 +1,147 @@
+"""
+Incrementally recompute catalog fields that are stale according to the
+manifest (see catalog_manifest.py): only tracks whose audio changed, whose
+group was computed with other extractor parameters, or that never had the
+group are redone.
+
+    python recompute_catalog.py                           # all feature groups
+    python recompute_catalog.py --groups features:fast    # one group
+    python recompute_catalog.py --groups openl3           # needs openl3 installed
+    python recompute_catalog.py --check                   # report only, exit 1 if stale
+    python recompute_catalog.py --force                   # recompute everything
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter
+
+from tqdm import tqdm
+
+import catalog_manifest
+from audio_features import FEATURE_SECONDS, extract_librosa_features, load_audio
+
+EMBEDDINGS_FILE = 'song_database/embeddings.json'
+
+
+def feature_target(song_data, profile):
+    """Standard features live at the top level, other profiles under 'profiles'"""
+    if profile == 'standard':
+        return song_data
+    return song_data.setdefault('profiles', {}).setdefault(profile, {})
+
+
+def compute_group(group, audio_path, song_data):
+    """Compute one field group for a track and store it in song_data"""
+    if group == 'openl3':
+        from build_database import extract_openl3_embedding
+
+        embedding, segments = extract_openl3_embedding(audio_path)
+        if embedding is None:
+            raise RuntimeError('OpenL3 extraction failed')
+        song_data['embedding'] = embedding
+        song_data['segments'] = segments
+        return
+
+    profile = group.split(':', 1)[1]
+    y, sr = load_audio(audio_path, profile, duration=FEATURE_SECONDS)
+    features = extract_librosa_features(y, sr, profile=profile)
+    target = feature_target(song_data, profile)
+    for field in catalog_manifest.FEATURE_FIELDS:
+        target[field] = features[field]
+
+
+def fields_present(group, song_data):
+    if group == 'openl3':
+        return all(song_data.get(field) for field in catalog_manifest.OPENL3_FIELDS)
+    profile = group.split(':', 1)[1]
+    target = song_data if profile == 'standard' else song_data.get('profiles', {}).get(profile, {})
+    return all(target.get(field) is not None for field in catalog_manifest.FEATURE_FIELDS)
+
+
+def recompute(groups, force=False, check=False, embeddings_file=EMBEDDINGS_FILE,
+              manifest_file=catalog_manifest.MANIFEST_FILE):
+    """Recompute stale groups; returns {group: Counter(reason -> tracks)}"""
+    with open(embeddings_file, 'r') as f:
+        embeddings_db = json.load(f)
+    manifest = catalog_manifest.load_manifest(manifest_file)
+
+    params = {group: catalog_manifest.extractor_params(group) for group in groups}
+    digests = {group: catalog_manifest.params_digest(p) for group, p in params.items()}
+
+    # Show how the recorded parameters differ from the current ones
+    for group in groups:
+        recorded = manifest['extractors'].get(group)
+        if recorded and recorded['digest'] != digests[group]:
+            changed = sorted(key for key in set(recorded['params']) | set(params[group])
+                             if recorded['params'].get(key) != params[group].get(key))
+            print(f"{group}: extractor parameters changed ({', '.join(changed)})")
+
+    stale = {group: Counter() for group in groups}
+    missing_audio = 0
+    failed = 0
+    dirty = False
+
+    for song_id, song_data in tqdm(embeddings_db.items(), desc="Checking tracks", disable=check):
+        audio_path = catalog_manifest.find_audio(song_id)
+        if audio_path is None:
+            missing_audio += 1
+            continue
+        sha256 = catalog_manifest.audio_hash(manifest, song_id, audio_path)
+
+        for group in groups:
+            reason = 'forced' if force else catalog_manifest.stale_reason(
+                manifest, song_id, group, sha256, digests[group])
+            if reason is None and not fields_present(group, song_data):
+                reason = 'missing'
+            if reason is None:
+                continue
+            stale[group][reason] += 1
+            if check:
+                continue
+
+            try:
+                compute_group(group, audio_path, song_data)
+            except Exception as e:
+                print(f"\nFailed to compute {group} for {song_id}: {e}")
+                failed += 1
+                continue
+            catalog_manifest.record(manifest, song_id, group, audio_path, sha256, params[group])
+            dirty = True
+
+    for group, reasons in stale.items():
+        detail = ', '.join(f"{count} {reason}" for reason, count in sorted(reasons.items())) or 'up to date'
+        print(f"  {group:<20} {sum(reasons.values()):>6} stale ({detail})")
+    if missing_audio:
+        print(f"  {missing_audio} tracks have no audio in {catalog_manifest.AUDIO_DIR} and were skipped")
+    if failed:
+        print(f"  {failed} computations failed")
+
+    if dirty:
+        with open(embeddings_file, 'w') as f:
+            json.dump(embeddings_db, f, indent=2)
+        catalog_manifest.save_manifest(manifest, manifest_file)
+        print(f"Saved {embeddings_file} and {manifest_file}")
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recompute stale catalog fields')
+    parser.add_argument('--groups', help='Comma-separated groups (default: all features:* groups)')
+    parser.add_argument('--force', action='store_true', help='Recompute even if up to date')
+    parser.add_argument('--check', action='store_true', help='Only report; exit 1 if anything is stale')
+    args = parser.parse_args()
+
+    groups = [g.strip() for g in args.groups.split(',')] if args.groups else \
+        [g for g in catalog_manifest.all_groups() if g.startswith('features:')]
+    unknown = set(groups) - set(catalog_manifest.all_groups())
+    if unknown:
+        parser.error(f"Unknown groups: {', '.join(sorted(unknown))}")
+
+    stale = recompute(groups, force=args.force, check=args.check)
+    if args.check and any(stale.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Replay logged queries (query_log.py) against the current catalog and scoring.
+
+Re-ranks every logged query with the current SongIndex code and the chosen
+search settings, then reports how far the new rankings move from the ones
+that were served (or from exhaustive search) and the replay throughput.
+No audio is decoded, so this doubles as a benchmark on real query vectors.
+
+    python replay_queries.py                              # current settings vs served results
+    python replay_queries.py --mode coarse --against exhaustive
+    python replay_queries.py --no-segments --limit 5000
+    python replay_queries.py --key-similarity exact       # ranking change from harmonic keys
+    python replay_queries.py --transpose --against exhaustive
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import query_log
+from song_index import DEFAULT_SHORTLIST, SongIndex, exact_key_matrix
+
+EMBEDDINGS_FILE = 'song_database/embeddings.json'
+
+
+def rank(index, columns, rows, mode, top_k, shortlist, batch_size, profile=None, transpose=False):
+    """Ranked song ids per row, and the seconds spent ranking"""
+    rankings = []
+    started = time.perf_counter()
+    if mode == 'exhaustive':
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            matches = index.search_batch(
+                [columns['embedding'][row] for row in chunk],
+                [query_log.row_features(columns, row) for row in chunk],
+                top_k=top_k,
+                profiles=[profile or str(columns['profile'][row]) for row in chunk],
+                transpose=[transpose] * len(chunk))
+            rankings.extend([index.ids[match[0]] for match in result] for result in matches)
+    else:
+        for row in rows:
+            result = index.search(columns['embedding'][row], query_log.row_features(columns, row),
+                                  top_k=top_k, profile=profile or str(columns['profile'][row]),
+                                  mode=mode, shortlist=shortlist, transpose=transpose)
+            rankings.append([index.ids[match[0]] for match in result])
+    return rankings, time.perf_counter() - started
+
+
+def compare(rankings, reference, top_k):
+    """Mean overlap@k and top-1 agreement between two lists of rankings"""
+    overlaps, top1 = [], []
+    for new, old in zip(rankings, reference):
+        old = old[:top_k]
+        if not old:
+            continue
+        overlaps.append(len(set(new[:top_k]) & set(old)) / len(old))
+        top1.append(bool(new) and new[0] == old[0])
+    if not overlaps:
+        return None
+    return {'queries': len(overlaps), 'overlap_at_k': float(np.mean(overlaps)), 'top1_agreement': float(np.mean(top1))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay logged queries against the current scoring')
+    parser.add_argument('--log', default=os.environ.get('QUERY_LOG_DIR') or 'query_log',
+                        help='Query log directory (default: $QUERY_LOG_DIR)')
+    parser.add_argument('--embeddings', default=EMBEDDINGS_FILE)
+    parser.add_argument('--mode', choices=['exhaustive', 'coarse'], default='exhaustive')
+    parser.add_argument('--against', choices=['logged', 'exhaustive'], default='logged',
+                        help='Compare with the served results or with exhaustive search')
+    parser.add_argument('--shortlist', type=int, default=DEFAULT_SHORTLIST)
+    parser.add_argument('--no-segments', action='store_true', help='Score with averaged embeddings only')
+    parser.add_argument('--key-similarity', choices=['harmonic', 'exact'], default='harmonic',
+                        help='Key term of the librosa similarity')
+    parser.add_argument('--transpose', action='store_true',
+                        help='Transposition-invariant search (only queries logged with a chroma profile)')
+    parser.add_argument('--profile', help='Score every query with this profile instead of its own')
+    parser.add_argument('--top-k', type=int, default=query_log.TOP_K)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--limit', type=int, help='Replay only the newest N queries')
+    args = parser.parse_args()
+
+    columns = query_log.read_log(args.log)
+    if columns is None:
+        print(f"No logged queries in {args.log}")
+        sys.exit(1)
+    rows = np.arange(len(columns['timestamp']))
+    if args.transpose:
+        rows = rows[columns['chroma'].any(axis=1)]
+        if not len(rows):
+            print(f"No queries in {args.log} were logged with a chroma profile")
+            sys.exit(1)
+    if args.limit:
+        rows = rows[-args.limit:]
+
+    with open(args.embeddings, 'r') as f:
+        index = SongIndex.from_catalog(
+            json.load(f), use_segments=not args.no_segments,
+            key_compatibility=exact_key_matrix() if args.key_similarity == 'exact' else None)
+    if index is None:
+        print(f"No catalog in {args.embeddings}")
+        sys.exit(1)
+    if columns['embedding'].shape[1] != index.embeddings.shape[1]:
+        print(f"Logged queries have {columns['embedding'].shape[1]} dims, catalog has {index.embeddings.shape[1]}")
+        sys.exit(1)
+
+    print(f"Replaying {len(rows)} queries against {len(index)} songs "
+          f"({args.mode}, {index.segment_count} segment(s) per song)")
+    rankings, seconds = rank(index, columns, rows, args.mode, args.top_k, args.shortlist,
+                             args.batch_size, args.profile, args.transpose)
+    print(f"  {len(rows) / seconds:.1f} queries/s ({1000 * seconds / len(rows):.2f} ms/query)")
+
+    if args.against == 'exhaustive':
+        reference, _ = rank(index, columns, rows, 'exhaustive', args.top_k, args.shortlist,
+                            args.batch_size, args.profile, args.transpose)
+    else:
+        reference = [columns['result_ids'][row] for row in rows]
+        catalog = set(index.ids)
+        missing = sum(1 for ids in reference if any(song_id not in catalog for song_id in ids))
+        if missing:
+            print(f"  {missing} logged results reference tracks no longer in the catalog")
+
+    summary = compare(rankings, reference, args.top_k)
+    if summary is None:
+        print("  Nothing to compare against")
+        return
+    print(f"  vs {args.against}: overlap@{args.top_k} {summary['overlap_at_k']:.3f}, "
+          f"top-1 agreement {summary['top1_agreement']:.3f} over {summary['queries']} queries")
+
+
+if __name__ == '__main__':
+    main()
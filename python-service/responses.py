@@ -0,0 +1,126 @@
+"""
+Compact JSON encoding, field projection and compression for responses.
+
+Job results are encoded once, when the job completes, and kept as bytes;
+each status poll splices them into a small envelope instead of re-serializing
+the ten result dicts. orjson is used when it is installed. Responses are
+compressed with brotli or gzip when the client accepts it and the body is big
+enough, and encoded/compressed bodies are memoized so repeated polls for the
+same finished job cost almost nothing.
+"""
+
+import gzip
+import json
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_ENCODER = 'orjson' if orjson is not None else 'json'
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Result keys kept whatever fields= asks for
+ALWAYS_INCLUDED = ('success',)
+
+
+def dumps(obj):
+    """Encode to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def parse_fields(value):
+    """
+    Parse a fields= parameter ('duration,features,similarSongs.title') into a
+    hashable set, or None to keep everything
+    """
+    if not value:
+        return None
+    fields = frozenset(field.strip() for field in str(value).split(',') if field.strip())
+    return fields or None
+
+
+def project(result, fields):
+    """
+    Keep only the requested keys of a result. 'similarSongs.title' keeps just
+    that key inside each song (or nested dict); 'similarSongs' keeps them whole.
+    """
+    nested = {}
+    for field in fields:
+        name, _, sub = field.partition('.')
+        if sub and name not in fields:
+            nested.setdefault(name, set()).add(sub)
+
+    projected = {}
+    for name, value in result.items():
+        if name in fields or name in ALWAYS_INCLUDED:
+            projected[name] = value
+        elif name in nested:
+            keys = nested[name]
+            if isinstance(value, list):
+                projected[name] = [{k: v for k, v in item.items() if k in keys} for item in value]
+            elif isinstance(value, dict):
+                projected[name] = {k: v for k, v in value.items() if k in keys}
+    return projected
+
+
+@lru_cache(maxsize=1024)
+def project_encoded(result_bytes, fields):
+    """Projected copy of an encoded result (memoized per result and field set)"""
+    return dumps(project(loads(result_bytes), fields))
+
+
+def job_body(envelope, result_bytes=None, fields=None):
+    """Encode a job envelope with an already-encoded result spliced in"""
+    body = dumps(envelope)
+    if result_bytes is None:
+        return body
+    if fields:
+        result_bytes = project_encoded(result_bytes, fields)
+    return body[:-1] + b',"result":' + result_bytes + b'}'
+
+
+def negotiate_encoding(accept_encoding):
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            accepted.add(name.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+@lru_cache(maxsize=1024)
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encode_for_client(body, accept_encoding):
+    """Return (body, extra headers), compressed if the client accepts it"""
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding is None:
+        return body, {'Vary': 'Accept-Encoding'}
+    return compress(body, encoding), {'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'}
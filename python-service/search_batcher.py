@@ -0,0 +1,100 @@
+"""
+Micro-batching of exhaustive catalog searches.
+
+Jobs that reach search at about the same time are scored together: a
+dispatcher thread takes the first waiting query, gathers any others that
+arrive within a short window (up to a maximum batch size), and scores the
+batch with SongIndex.search_batch - one matrix-matrix product over the
+catalog instead of one matrix-vector scan per job. Each caller blocks until
+its own top-k is ready.
+
+The window is only waited out when more searches are likely (expect_more()
+is true, e.g. other jobs are running); a lone query is scored immediately.
+A malformed query fails only its own caller: queries are checked before they
+join the batched product, and if the batch still fails its queries are
+retried one by one.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+
+class SearchBatcher:
+    def __init__(self, index, max_batch=16, window_seconds=0.002, expect_more=None):
+        self.index = index
+        self.max_batch = max(1, max_batch)
+        self.window_seconds = window_seconds
+        self.expect_more = expect_more
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='search-batcher', daemon=True)
+        self._thread.start()
+
+    def search(self, embedding, features, top_k=10, profile='standard', transpose=False):
+        """Blocking search; returns the same tuples as SongIndex.search()"""
+        future = Future()
+        self._queue.put((embedding, features, top_k, profile, transpose, time.monotonic(), future))
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        wait = self.expect_more is None or self.expect_more()
+        deadline = time.monotonic() + self.window_seconds
+        while len(batch) < self.max_batch:
+            try:
+                # Anything already queued joins the batch regardless of the window
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if not wait or remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            metrics.SEARCH_BATCH_SIZE.observe(len(batch))
+            for item in batch:
+                metrics.SEARCH_BATCH_WAIT_SECONDS.observe(started - item[5])
+
+            valid = []
+            for item in batch:
+                try:
+                    self.index.check_query(item[0])
+                except Exception as e:
+                    item[6].set_exception(e)
+                    continue
+                valid.append(item)
+            if not valid:
+                continue
+
+            try:
+                results = self.index.search_batch(
+                    [item[0] for item in valid], [item[1] for item in valid],
+                    top_k=max(item[2] for item in valid), profiles=[item[3] for item in valid],
+                    transpose=[item[4] for item in valid])
+            except Exception:
+                # Find the offending query instead of failing the whole batch
+                self._search_each(valid)
+                continue
+
+            for item, result in zip(valid, results):
+                item[6].set_result(result[:item[2]])
+
+    def _search_each(self, batch):
+        for embedding, features, top_k, profile, transpose, _, future in batch:
+            try:
+                future.set_result(self.index.search(embedding, features, top_k=top_k, profile=profile,
+                                                    transpose=transpose))
+            except Exception as e:
+                future.set_exception(e)
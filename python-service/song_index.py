@@ -0,0 +1,472 @@
+"""
+Vectorized song index for similarity search.
+
+The catalog is held as a contiguous float32 matrix of L2-normalized
+embeddings plus per-profile scalar arrays (tempo, energy, brightness, key),
+so a query scores the whole catalog with one matrix-vector product and a few
+array operations instead of a Python loop over dicts.
+
+Search can run in two tiers: a coarse descriptor per track (the first
+COARSE_DIMS principal components of the embedding, plus the exact key/tempo
+scalars) shortlists candidates cheaply, and only the shortlist is rescored
+with the full embedding and the hybrid librosa similarity.
+
+Key agreement is scored through a 24x24 compatibility table indexed by the
+query's and each track's key_id, so harmonically related keys (relative
+major/minor, neighbours on the circle of fifths, a capo fret or two away)
+earn partial credit with one gather instead of an exact-match comparison.
+
+Transposition-invariant search compares each track's 12-bin chroma profile
+with all 12 circular shifts of the query's in one (N, 12) @ (12, 12) product;
+the best-correlating shift stands in for the key term and is reported as a
+transposition in semitones (-5..+6), i.e. a capo fret or a down-tuning.
+
+Tracks can also carry K time-segment embeddings (the 'segments' field from
+build_database.py). They are stored as one contiguous (N, K, D) array, so the
+embedding similarity is max-over-segments from a single (N*K, D) product:
+K times the work of the single-vector scan, with no Python loop.
+"""
+
+import numpy as np
+
+KEYS = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+KEY_INDEX = {key: i for i, key in enumerate(KEYS)}
+
+# Hybrid scoring weights (librosa part), matching the original per-song loop
+TEMPO_WEIGHT = 0.3
+KEY_WEIGHT = 0.3
+ENERGY_WEIGHT = 0.2
+BRIGHTNESS_WEIGHT = 0.2
+
+# Key compatibility credits (see harmonic_key_matrix)
+SAME_KEY = 1.0
+RELATIVE_KEY = 0.8
+FIFTH_APART = 0.6
+PARALLEL_KEY = 0.5
+FIFTH_FROM_RELATIVE = 0.4
+TWO_FIFTHS_APART = 0.3
+CAPO_SHIFT = 0.25
+CAPO_FRETS = 2
+
+CHROMA_BINS = 12
+# _SHIFT_INDEX[s, i] = (i - s) % 12, so chroma[_SHIFT_INDEX] stacks the
+# chroma transposed up by 0..11 semitones (np.roll by s) as rows
+_SHIFT_INDEX = (np.arange(CHROMA_BINS)[None, :] - np.arange(CHROMA_BINS)[:, None]) % CHROMA_BINS
+
+DEFAULT_COARSE_DIMS = 16
+DEFAULT_SHORTLIST = 256
+
+
+def key_id(key, mode):
+    """Encode key + mode as 0-23 (minor keys offset by 12), or -1 if unknown"""
+    if key not in KEY_INDEX or mode not in ('Major', 'Minor'):
+        return -1
+    return KEY_INDEX[key] + (12 if mode == 'Minor' else 0)
+
+
+def _circle_position(key):
+    # Position of the key's relative major on the circle of fifths (0-11)
+    tonic = (key % 12 + (3 if key >= 12 else 0)) % 12
+    return tonic * 7 % 12
+
+
+def _key_compatibility(a, b):
+    steps = abs(_circle_position(a) - _circle_position(b))
+    steps = min(steps, 12 - steps)
+    same_mode = (a >= 12) == (b >= 12)
+    if same_mode:
+        credit = {0: SAME_KEY, 1: FIFTH_APART, 2: TWO_FIFTHS_APART}.get(steps, 0.0)
+        semitones = abs(a % 12 - b % 12)
+        if min(semitones, 12 - semitones) <= CAPO_FRETS:
+            # Playable with the same chord shapes by moving a capo
+            credit = max(credit, CAPO_SHIFT)
+        return credit
+    if a % 12 == b % 12:
+        return PARALLEL_KEY
+    return {0: RELATIVE_KEY, 1: FIFTH_FROM_RELATIVE}.get(steps, 0.0)
+
+
+def harmonic_key_matrix():
+    """
+    Symmetric (24, 24) compatibility between key_ids: 1 for the same key,
+    partial credit for relative and parallel major/minor, keys one or two
+    fifths apart, and same-mode keys within CAPO_FRETS semitones, else 0
+    """
+    return np.array([[_key_compatibility(a, b) for b in range(24)] for a in range(24)], dtype=np.float32)
+
+
+def exact_key_matrix():
+    """Credit only for an identical key and mode (the original scoring)"""
+    return np.eye(24, dtype=np.float32)
+
+
+KEY_COMPATIBILITY = harmonic_key_matrix()
+
+
+def unit_chroma(chroma):
+    """
+    Mean-centered, L2-normalized chroma profile(s), so dot products are
+    correlations. Missing or flat profiles become zeros.
+    """
+    values = np.zeros(CHROMA_BINS, dtype=np.float32) if chroma is None else np.asarray(chroma, dtype=np.float32)
+    if values.shape[-1] != CHROMA_BINS:
+        return np.zeros(values.shape[:-1] + (CHROMA_BINS,), dtype=np.float32)
+    values = values - values.mean(axis=-1, keepdims=True)
+    norms = np.linalg.norm(values, axis=-1, keepdims=True)
+    return np.divide(values, norms, out=np.zeros_like(values), where=norms > 0)
+
+
+def _scalar(value):
+    # Missing values become 0, which the scoring treats as absent (as the
+    # original truthiness checks did)
+    return float(value) if value else 0.0
+
+
+def _chroma(value):
+    # Tracks not yet backfilled get a flat profile, which unit_chroma zeroes
+    return value if value and len(value) == CHROMA_BINS else [0.0] * CHROMA_BINS
+
+
+class SongIndex:
+    def __init__(self, ids, embeddings, scalars, metadata, coarse_dims=DEFAULT_COARSE_DIMS, segments=None,
+                 key_compatibility=None):
+        """
+        ids: list of song ids
+        embeddings: (N, D) array of catalog embeddings
+        segments: optional (N, K, D) array of per-segment embeddings
+        scalars: {profile: {'tempo', 'energy', 'brightness': float arrays, 'key_id': int array,
+                  optional 'chroma': (N, 12) unit_chroma rows}}
+        metadata: sequence of per-song dicts (title, artist, display scalars)
+        key_compatibility: (24, 24) key credit table (default KEY_COMPATIBILITY)
+        """
+        self.ids = list(ids)
+        self.row_of = {song_id: row for row, song_id in enumerate(self.ids)}
+        self.metadata = metadata
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(self.embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.embeddings /= norms
+        if segments is None:
+            # One "segment" per song: a view of the embeddings, no extra memory
+            self.segments = self.embeddings[:, None, :]
+        else:
+            self.segments = np.ascontiguousarray(segments, dtype=np.float32)
+            norms = np.linalg.norm(self.segments, axis=2, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.segments /= norms
+        self.scalars = scalars
+        self.key_compatibility = KEY_COMPATIBILITY if key_compatibility is None else key_compatibility
+        self._build_coarse(coarse_dims)
+
+    @classmethod
+    def from_catalog(cls, embeddings_db, coarse_dims=DEFAULT_COARSE_DIMS, use_segments=True,
+                     key_compatibility=None):
+        """Build from the embeddings.json layout ({song_id: song_data})"""
+        ids = list(embeddings_db)
+        if not ids:
+            return None
+        songs = [embeddings_db[song_id] for song_id in ids]
+        embeddings = np.array([song['embedding'] for song in songs], dtype=np.float32)
+
+        segments = None
+        segment_count = max((len(song.get('segments') or []) for song in songs), default=0)
+        if use_segments and segment_count > 1:
+            segments = np.repeat(embeddings[:, None, :], segment_count, axis=1)
+            for row, song in enumerate(songs):
+                # Songs without (complete) segments fall back to their
+                # averaged embedding in every segment slot
+                song_segments = song.get('segments') or []
+                if len(song_segments) == segment_count:
+                    segments[row] = song_segments
+
+        profiles = {'standard'}
+        for song in songs:
+            profiles.update(song.get('profiles', {}))
+
+        scalars = {}
+        for profile in profiles:
+            rows = []
+            for song in songs:
+                # Fall back to the standard (top-level) values when a track
+                # has not been precomputed for this profile
+                data = song.get('profiles', {}).get(profile) if profile != 'standard' else None
+                rows.append(data or song)
+            scalars[profile] = {
+                'tempo': np.array([_scalar(r.get('tempo')) for r in rows], dtype=np.float32),
+                'energy': np.array([_scalar(r.get('energy')) for r in rows], dtype=np.float32),
+                'brightness': np.array([_scalar(r.get('brightness')) for r in rows], dtype=np.float32),
+                'key_id': np.array([key_id(r.get('key'), r.get('mode')) for r in rows], dtype=np.int16),
+                'chroma': unit_chroma([_chroma(r.get('chroma')) for r in rows])
+            }
+
+        return cls(ids, embeddings, scalars, songs, coarse_dims=coarse_dims, segments=segments,
+                   key_compatibility=key_compatibility)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def segment_count(self):
+        return self.segments.shape[1]
+
+    def _build_coarse(self, coarse_dims):
+        """PCA projection of the normalized segment embeddings for the coarse tier"""
+        flat = self.segments.reshape(-1, self.segments.shape[2])
+        dims = max(1, min(coarse_dims, flat.shape[1], len(flat)))
+        # Fit on a sample so very large catalogs don't pay for a full SVD
+        sample = flat
+        if len(sample) > 20000:
+            rng = np.random.default_rng(0)
+            sample = sample[rng.choice(len(sample), 20000, replace=False)]
+        self.coarse_mean = sample.mean(axis=0)
+        _, _, vt = np.linalg.svd(sample - self.coarse_mean, full_matrices=False)
+        self.coarse_basis = np.ascontiguousarray(vt[:dims].T, dtype=np.float32)  # (D, dims)
+        self.coarse = np.ascontiguousarray((flat - self.coarse_mean) @ self.coarse_basis)  # (N*K, dims)
+
+    def raw_similarity(self, queries, rows=None):
+        """
+        Max-over-segments cosine similarity for normalized queries, which may
+        be one (D,) vector or a (B, D) batch. Returns (n,) or (n, B).
+        """
+        segments = self.segments if rows is None else self.segments[rows]
+        n, k, d = segments.shape
+        scores = segments.reshape(n * k, d) @ queries.T
+        if k == 1:
+            return scores
+        return scores.reshape(n, k, *scores.shape[1:]).max(axis=1)
+
+    def _profile_scalars(self, profile):
+        return self.scalars.get(profile) or self.scalars['standard']
+
+    def librosa_similarity(self, features, profile='standard', rows=None, transpose=False):
+        """
+        Vectorized hybrid librosa similarity against every (or selected) song.
+        Each term only counts when both sides have a value, and the score is
+        normalized by the weights that were present. With transpose, tracks
+        with a chroma profile get the best-shift chroma correlation as their
+        key term instead of the key table.
+        """
+        scalars = self._profile_scalars(profile)
+        if rows is not None:
+            scalars = {name: values[rows] for name, values in scalars.items()}
+        n = len(scalars['tempo'])
+        score = np.zeros(n, dtype=np.float32)
+        total_weight = np.zeros(n, dtype=np.float32)
+
+        tempo = _scalar(features.get('tempo'))
+        if tempo:
+            present = scalars['tempo'] != 0
+            similarity = np.maximum(0, 1 - np.abs(tempo - scalars['tempo']) / 100)
+            score += np.where(present, TEMPO_WEIGHT * similarity, 0)
+            total_weight += np.where(present, TEMPO_WEIGHT, 0)
+
+        query_key = key_id(features.get('key'), features.get('mode'))
+        shifts = self._best_shifts(features, scalars) if transpose else None
+        if query_key >= 0 or shifts is not None:
+            present = np.zeros(n, dtype=bool)
+            similarity = np.zeros(n, dtype=np.float32)
+            if query_key >= 0:
+                present = scalars['key_id'] >= 0
+                # Unknown keys (-1) gather the last column; the mask discards them
+                similarity = self.key_compatibility[query_key][scalars['key_id']]
+            if shifts is not None:
+                correlation, _, has_chroma = shifts
+                similarity = np.where(has_chroma, np.maximum(correlation, 0), similarity)
+                present = present | has_chroma
+            score += np.where(present, KEY_WEIGHT * similarity, 0)
+            total_weight += np.where(present, KEY_WEIGHT, 0)
+
+        energy = _scalar(features.get('energy'))
+        if energy:
+            present = scalars['energy'] != 0
+            similarity = np.maximum(0, 1 - np.abs(energy - scalars['energy']))
+            score += np.where(present, ENERGY_WEIGHT * similarity, 0)
+            total_weight += np.where(present, ENERGY_WEIGHT, 0)
+
+        brightness = _scalar(features.get('brightness'))
+        if brightness:
+            present = scalars['brightness'] != 0
+            similarity = np.maximum(0, 1 - np.abs(brightness - scalars['brightness']) / 2000)
+            score += np.where(present, BRIGHTNESS_WEIGHT * similarity, 0)
+            total_weight += np.where(present, BRIGHTNESS_WEIGHT, 0)
+
+        return np.divide(score, total_weight, out=np.zeros_like(score), where=total_weight > 0)
+
+    @staticmethod
+    def _best_shifts(features, scalars):
+        """
+        (best correlation, best shift, has chroma) per track in scalars, or
+        None when the query or catalog has no chroma. Shift s means the track
+        matches the query transposed up s semitones.
+        """
+        query = unit_chroma(features.get('chroma'))
+        chroma = scalars.get('chroma')
+        if chroma is None or not query.any():
+            return None
+        correlation = chroma @ query[_SHIFT_INDEX].T  # (n, 12), one column per shift
+        shift = correlation.argmax(axis=1)
+        best = np.take_along_axis(correlation, shift[:, None], axis=1)[:, 0]
+        return best, shift, chroma.any(axis=1)
+
+    def transposition(self, features, rows, profile='standard'):
+        """
+        Semitones (-5..+6) each selected track sounds above the query: the
+        shift that best aligns the two chroma profiles, folded so a track a
+        semitone below reads -1 rather than +11. None where either side has
+        no chroma.
+        """
+        scalars = self._profile_scalars(profile)
+        shifts = self._best_shifts(features, {'chroma': scalars['chroma'][rows]} if 'chroma' in scalars else {})
+        if shifts is None:
+            return [None] * len(rows)
+        _, shift, has_chroma = shifts
+        semitones = np.where(shift > CHROMA_BINS // 2, shift - CHROMA_BINS, shift)
+        return [int(s) if present else None for s, present in zip(semitones, has_chroma)]
+
+    @staticmethod
+    def hybrid_scores(raw_similarity, librosa_similarity):
+        """
+        Combine embedding and librosa similarity as the service always has.
+        The raw cosine is boosted into the 85-99% range to compensate for the
+        lightweight query features, with a small librosa-based variation.
+        Returns (final, boosted).
+        """
+        normalized = np.clip(raw_similarity / 0.3, 0.0, 1.0)
+        boosted = 0.85 + 0.14 * np.sqrt(normalized)
+        boosted = np.clip(boosted + librosa_similarity * 0.03, 0.85, 0.99)
+        final = 0.70 * boosted + 0.30 * librosa_similarity
+        return final, boosted
+
+    def _normalize_query(self, embedding):
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 0 else query
+
+    def check_query(self, embedding):
+        """Normalized query vector; ValueError unless it is a single vector of the index's dims"""
+        query = self._normalize_query(embedding)
+        if query.shape != (self.embeddings.shape[1],):
+            raise ValueError(f"Query has shape {query.shape}, index has {self.embeddings.shape[1]} dims")
+        return query
+
+    def score_rows(self, query, features, profile='standard', rows=None, transpose=False):
+        """Exact hybrid scores for selected rows (all rows when rows is None)"""
+        raw = self.raw_similarity(query, rows)
+        librosa_sim = self.librosa_similarity(features, profile, rows, transpose)
+        final, boosted = self.hybrid_scores(raw, librosa_sim)
+        return final, boosted, librosa_sim
+
+    def coarse_candidates(self, query, features, profile='standard', shortlist=DEFAULT_SHORTLIST,
+                          transpose=False):
+        """Shortlist rows using the PCA descriptor plus the exact scalar terms"""
+        # Approximate cosine: e.q = (e - mean).q + mean.q, with (e - mean)
+        # replaced by its PCA reconstruction basis @ coarse
+        projected = query @ self.coarse_basis
+        approx_raw = self.coarse @ projected + float(self.coarse_mean @ query)
+        if self.segment_count > 1:
+            approx_raw = approx_raw.reshape(len(self), self.segment_count).max(axis=1)
+        librosa_sim = self.librosa_similarity(features, profile, transpose=transpose)
+        approx_final, _ = self.hybrid_scores(approx_raw, librosa_sim)
+        if shortlist >= len(approx_final):
+            return np.arange(len(approx_final))
+        return np.argpartition(-approx_final, shortlist)[:shortlist]
+
+    def search(self, embedding, features, top_k=10, profile='standard', mode='exhaustive',
+               shortlist=DEFAULT_SHORTLIST, transpose=False):
+        """
+        Return the top_k matches as a list of (row, final, boosted, librosa)
+        sorted by final score. mode='coarse' rescores only a shortlist;
+        transpose scores keys transposition-invariantly.
+        """
+        query = self.check_query(embedding)
+
+        rows = None
+        if mode == 'coarse' and len(self) > shortlist:
+            rows = self.coarse_candidates(query, features, profile, max(shortlist, top_k), transpose)
+
+        final, boosted, librosa_sim = self.score_rows(query, features, profile, rows, transpose)
+        return self._top(final, boosted, librosa_sim, rows, top_k)
+
+    def search_batch(self, embeddings, features, top_k=10, profiles=None, transpose=None):
+        """
+        Exhaustive search for several queries at once: their embedding scores
+        come from one matrix-matrix product over the catalog instead of one
+        scan per query. features, profiles and transpose are per query.
+        Returns one search() result list per query. Every query is checked
+        (check_query) before any is scored.
+        """
+        queries = np.stack([self.check_query(embedding) for embedding in embeddings])
+
+        raw = np.ascontiguousarray(self.raw_similarity(queries).T)  # (B, N)
+        results = []
+        for b, query_features in enumerate(features):
+            profile = profiles[b] if profiles else 'standard'
+            librosa_sim = self.librosa_similarity(query_features, profile,
+                                                  transpose=bool(transpose and transpose[b]))
+            final, boosted = self.hybrid_scores(raw[b], librosa_sim)
+            results.append(self._top(final, boosted, librosa_sim, None, top_k))
+        return results
+
+    def rescore(self, song_ids, raw_similarity, features, top_k=10, profile='standard', transpose=False):
+        """
+        Hybrid-score candidates whose embedding similarity was computed
+        elsewhere (e.g. by a VectorBackend). Ids missing from the index are
+        skipped. Returns the same tuples as search().
+        """
+        pairs = [(self.row_of[song_id], raw) for song_id, raw in zip(song_ids, raw_similarity)
+                 if song_id in self.row_of]
+        if not pairs:
+            return []
+        rows = np.array([row for row, _ in pairs], dtype=np.int64)
+        raw = np.array([raw for _, raw in pairs], dtype=np.float32)
+        librosa_sim = self.librosa_similarity(features, profile, rows, transpose)
+        final, boosted = self.hybrid_scores(raw, librosa_sim)
+        return self._top(final, boosted, librosa_sim, rows, top_k)
+
+    @staticmethod
+    def _top(final, boosted, librosa_sim, rows, top_k):
+        k = min(top_k, len(final))
+        if k == 0:
+            return []
+        top = np.argpartition(-final, k - 1)[:k] if k < len(final) else np.arange(len(final))
+        top = top[np.argsort(-final[top], kind='stable')]
+        row_ids = top if rows is None else rows[top]
+        return [(int(r), float(final[t]), float(boosted[t]), float(librosa_sim[t]))
+                for r, t in zip(row_ids, top)]
+
+    def result_row(self, row, final, boosted, librosa_sim):
+        """Response dict for one match, in the shape the frontend expects"""
+        song = self.metadata[row]
+        return {
+            'id': self.ids[row],
+            'title': song['title'],
+            'artist': song['artist'],
+            'similarity_score': final,
+            'openl3_score': boosted,  # Display boosted score for UI
+            'librosa_score': librosa_sim,
+            'tempo': song.get('tempo'),
+            'key': song.get('key'),
+            'mode': song.get('mode'),
+            'energy': song.get('energy'),
+            'brightness': song.get('brightness')
+        }
+
+    def track_features(self, row, profile='standard'):
+        """A catalog track's precomputed features, in the shape extract_librosa_features returns"""
+        song = self.metadata[row]
+        data = (song.get('profiles', {}).get(profile) if profile != 'standard' else None) or song
+        return {field: data.get(field) for field in ('tempo', 'key', 'mode', 'energy', 'brightness', 'chroma')}
+
+    def measure_recall(self, queries, top_k=10, profile='standard', shortlist=DEFAULT_SHORTLIST):
+        """
+        Recall@top_k of coarse search against exhaustive search.
+        queries: iterable of (embedding, features) pairs.
+        """
+        hits = 0
+        total = 0
+        for embedding, features in queries:
+            exact = {row for row, *_ in self.search(embedding, features, top_k, profile, 'exhaustive')}
+            coarse = {row for row, *_ in self.search(embedding, features, top_k, profile, 'coarse', shortlist)}
+            hits += len(exact & coarse)
+            total += len(exact)
+        return hits / total if total else 1.0
@@ -0,0 +1,111 @@
+"""
+Thread budget for the analysis service.
+
+NumPy's BLAS, OpenMP and numba each start their own thread pool sized to the
+whole machine, so ANALYSIS_WORKERS concurrent jobs can end up with many times
+more runnable threads than cores. The service instead splits the available
+cores (affinity mask, capped by the container's CPU quota) across its
+concurrent jobs and gives each job that many library threads.
+
+configure() must run before NumPy is first imported for the environment
+variables to size the pools (and worker processes inherit them); pools that
+are already loaded are limited at runtime through threadpoolctl when it is
+installed. Variables the operator set explicitly are kept, and the runtime
+limit leaves the pools they control alone.
+"""
+
+import math
+import os
+import sys
+
+try:
+    import threadpoolctl
+except ImportError:  # optional: environment variables still apply
+    threadpoolctl = None
+
+THREAD_ENV_VARS = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+    'NUMBA_NUM_THREADS'
+)
+
+# Explicitly set before the service touched them; these are never overridden
+OPERATOR_SET = {name: os.environ[name] for name in THREAD_ENV_VARS if name in os.environ}
+# threadpoolctl API each variable controls (numba is limited separately)
+THREAD_ENV_APIS = {
+    'OMP_NUM_THREADS': 'openmp',
+    'OPENBLAS_NUM_THREADS': 'blas',
+    'MKL_NUM_THREADS': 'blas',
+    'VECLIB_MAXIMUM_THREADS': 'blas'
+}
+
+_budget = {}
+_limits = None
+
+
+def available_cores():
+    """CPUs this process may use: the affinity mask, capped by a cgroup v2 CPU quota"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            cores = min(cores, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+def configure(concurrency, threads=None):
+    """
+    Give each of `concurrency` concurrent jobs `threads` library threads
+    (default: the available cores split evenly, at least 1). Returns the budget.
+    """
+    global _budget
+    cores = available_cores()
+    threads = threads or max(1, cores // max(1, concurrency))
+    for name in THREAD_ENV_VARS:
+        if name not in OPERATOR_SET:
+            os.environ[name] = str(threads)
+    _budget = {'cores': cores, 'concurrency': concurrency, 'threads_per_job': threads,
+               'operator_set': dict(OPERATOR_SET)}
+    apply_limits(threads)
+    return _budget
+
+
+def apply_limits(threads=None):
+    """Limit already-loaded BLAS/OpenMP pools, and numba for the calling thread"""
+    global _limits
+    threads = threads or _budget.get('threads_per_job')
+    if not threads:
+        return
+    kept = {THREAD_ENV_APIS[name] for name in OPERATOR_SET if name in THREAD_ENV_APIS}
+    apis = {api: threads for api in ('openmp', 'blas') if api not in kept}
+    if threadpoolctl is not None and apis:
+        # Kept for the life of the process (never restored)
+        _limits = threadpoolctl.threadpool_limits(limits=apis)
+    numba = sys.modules.get('numba')
+    if numba is not None and 'NUMBA_NUM_THREADS' not in OPERATOR_SET:
+        # numba's setting is per thread, so analysis threads call this on start
+        numba.set_num_threads(min(threads, numba.config.NUMBA_NUM_THREADS))
+
+
+def effective_settings():
+    """What the thread pools are actually using, for /health"""
+    settings = dict(_budget)
+    settings['env'] = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    if threadpoolctl is not None:
+        settings['threadpools'] = [
+            {'api': pool['user_api'], 'library': pool['internal_api'], 'threads': pool['num_threads']}
+            for pool in threadpoolctl.threadpool_info()
+        ]
+    numba = sys.modules.get('numba')
+    if numba is not None:
+        settings['numba_threads'] = numba.get_num_threads()
+    return settings
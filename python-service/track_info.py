@@ -0,0 +1,187 @@
+"""
+Precomputed display metadata for catalog tracks (album, cover art, genre,
+tags, duration, Last.fm URL), attached to search results so the frontend
+does not look every recommendation up on Last.fm per request.
+
+song_database/track_info.json maps song_id -> compact entry. It is refreshed
+offline against the Last.fm API (or local_lastfm_service.py for testing):
+
+    python track_info.py                          # fetch missing / older than 30 days
+    python track_info.py --max-age-days 0         # refetch everything
+    LASTFM_API_URL=http://localhost:5200/2.0/ python track_info.py
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+TRACK_INFO_FILE = 'song_database/track_info.json'
+METADATA_FILE = 'song_database/metadata.json'
+EMBEDDINGS_FILE = 'song_database/embeddings.json'
+
+LASTFM_API_URL = os.environ.get('LASTFM_API_URL', 'https://ws.audioscrobbler.com/2.0/')
+LASTFM_API_KEY = os.environ.get('LASTFM_API_KEY', '')
+
+# Chart/playlist tags that say nothing about the genre
+NON_GENRE_TAGS = ('spotify', 'playlist', 'top 100', 'charts', 'billboard')
+COVER_SIZE = 'extralarge'
+
+
+def lastfm_url(artist, title):
+    quote = requests.utils.quote
+    return f'https://www.last.fm/music/{quote(artist)}/_/{quote(title)}'
+
+
+def pick_genre(tags):
+    """First tag that looks like a genre (not a chart, playlist or year), or None"""
+    for tag in tags:
+        name = tag.lower()
+        if not any(word in name for word in NON_GENRE_TAGS) and not re.search(r'\d{4}', name):
+            return tag
+    return None
+
+
+def summarize(track, artist, title):
+    """Compact entry from a track.getInfo 'track' object"""
+    tags = [tag['name'] for tag in (track.get('toptags') or {}).get('tag', [])]
+    images = (track.get('album') or {}).get('image', [])
+    cover = next((img.get('#text') for img in images if img.get('size') == COVER_SIZE), None)
+    duration = int(track.get('duration') or 0) // 1000
+    return {
+        'album': (track.get('album') or {}).get('title'),
+        'cover': cover or None,
+        'genre': pick_genre(tags),
+        'tags': tags,
+        'duration': duration or None,
+        'playcount': int(track.get('playcount') or 0),
+        'url': track.get('url') or lastfm_url(artist, title),
+        'fetched_at': int(time.time())
+    }
+
+
+def fallback_entry(song):
+    """Entry from the catalog metadata alone, for tracks Last.fm does not know"""
+    return {
+        'album': None, 'cover': None, 'genre': None, 'tags': [], 'duration': None,
+        'playcount': int(song.get('playcount') or 0),
+        'url': song.get('url') or lastfm_url(song['artist'], song['title']),
+        'fetched_at': int(time.time())
+    }
+
+
+def load_track_info(path=TRACK_INFO_FILE):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def result_table(table):
+    """Entries as attached to search results, without the refresh bookkeeping"""
+    return {song_id: {k: v for k, v in entry.items() if k != 'fetched_at'}
+            for song_id, entry in table.items()}
+
+
+def save_track_info(table, path=TRACK_INFO_FILE):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(table, f, sort_keys=True, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def catalog_tracks():
+    """{song_id: {title, artist, playcount, url}} from metadata.json and embeddings.json"""
+    tracks = {}
+    if os.path.exists(EMBEDDINGS_FILE):
+        with open(EMBEDDINGS_FILE, 'r') as f:
+            for song_id, song in json.load(f).items():
+                tracks[song_id] = {'title': song['title'], 'artist': song['artist'],
+                                   'playcount': song.get('playcount')}
+    with open(METADATA_FILE, 'r') as f:
+        for song in json.load(f):
+            tracks[song['id']] = song
+    return tracks
+
+
+def fetch_track(session, song, api_url=LASTFM_API_URL, api_key=LASTFM_API_KEY, timeout=10):
+    """track.getInfo for one song; returns an entry (the fallback when Last.fm has none)"""
+    response = session.get(api_url, params={
+        'method': 'track.getInfo',
+        'api_key': api_key,
+        'artist': song['artist'],
+        'track': song['title'],
+        'format': 'json'
+    }, timeout=timeout)
+    if response.status_code != 404:  # 404 is Last.fm's 'Track not found'
+        response.raise_for_status()
+    track = response.json().get('track')
+    if not track:
+        return fallback_entry(song)
+    return summarize(track, song['artist'], song['title'])
+
+
+def refresh(max_age_days=30, concurrency=8, api_url=LASTFM_API_URL, api_key=LASTFM_API_KEY,
+            path=TRACK_INFO_FILE):
+    """Fetch entries that are missing or older than max_age_days; returns (fetched, failed)"""
+    table = load_track_info(path)
+    tracks = catalog_tracks()
+    cutoff = time.time() - max_age_days * 86400
+    due = [song_id for song_id in tracks
+           if song_id not in table or table[song_id].get('fetched_at', 0) <= cutoff]
+
+    # Tracks that left the catalog are dropped
+    for song_id in set(table) - set(tracks):
+        del table[song_id]
+
+    print(f"Refreshing {len(due)} of {len(tracks)} tracks from {api_url}", flush=True)
+    failed = 0
+    session = requests.Session()
+
+    def fetch(song_id):
+        return song_id, fetch_track(session, tracks[song_id], api_url, api_key)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(fetch, song_id) for song_id in due]
+        for future, song_id in zip(futures, due):
+            try:
+                song_id, entry = future.result()
+            except (requests.RequestException, ValueError) as e:
+                print(f"  Failed {song_id}: {e}", flush=True)
+                failed += 1
+                # Keep a stale entry rather than none; retried next run
+                table.setdefault(song_id, {**fallback_entry(tracks[song_id]), 'fetched_at': 0})
+                continue
+            table[song_id] = entry
+
+    save_track_info(table, path)
+    return len(due) - failed, failed
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Refresh the catalog track info table')
+    parser.add_argument('--max-age-days', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--url', default=LASTFM_API_URL, help='Last.fm API URL (or a local stub)')
+    args = parser.parse_args()
+
+    api_key = os.environ.get('LASTFM_API_KEY', LASTFM_API_KEY)
+    if not api_key and 'audioscrobbler.com' in args.url:
+        print("❌ ERROR: Please set LASTFM_API_KEY environment variable")
+        return
+
+    started = time.perf_counter()
+    fetched, failed = refresh(args.max_age_days, args.concurrency, args.url, api_key)
+    print(f"✓ Fetched {fetched} tracks ({failed} failed) in {time.perf_counter() - started:.1f}s "
+          f"-> {TRACK_INFO_FILE}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,44 @@
 """
 Upload OpenL3 embeddings to Pinecone vector database
+
+Vectors are streamed to the index in batches with several upserts in flight,
+instead of being collected into one list first. --target local uploads to
+local_vector_service.py (same REST shapes) for offline testing.
+
+Usage:
+    python upload_to_pinecone.py [--target pinecone|local] [--url URL]
+                                 [--batch-size 100] [--concurrency 4]
 """
 
+import argparse
 import os
 import json
-from pinecone import Pinecone, ServerlessSpec
+import time
 from dotenv import load_dotenv
 from tqdm import tqdm
 
+from vector_backends import HttpBackend, upsert_streaming
+
 # Load environment variables
 load_dotenv()
 
 PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY', '')
 PINECONE_ENVIRONMENT = os.environ.get('PINECONE_ENVIRONMENT', 'us-east-1')
 INDEX_NAME = 'strumsense-songs'
+LOCAL_VECTOR_URL = os.environ.get('VECTOR_SERVICE_URL', 'http://localhost:5100')
 
 EMBEDDINGS_FILE = 'song_database/embeddings.json'
 
 
-def upload_embeddings():
-    """Upload all embeddings to Pinecone"""
+def connect_pinecone():
+    """Create the index if needed and return it (it has the same upsert signature)"""
+    from pinecone import Pinecone, ServerlessSpec
 
     if not PINECONE_API_KEY:
         print("ERROR: Please set PINECONE_API_KEY environment variable")
         print("Get your free API key at: https://www.pinecone.io/")
         exit(1)
 
-    print("Uploading OpenL3 embeddings to Pinecone...\n")
-
     # Initialize Pinecone
     pc = Pinecone(api_key=PINECONE_API_KEY)
 
@@ -50,21 +61,13 @@ def upload_embeddings():
         print(f"Index {INDEX_NAME} already exists\n")
 
     # Connect to index
-    index = pc.Index(INDEX_NAME)
-
-    # Load embeddings
-    print(f"Loading embeddings from {EMBEDDINGS_FILE}...")
-    with open(EMBEDDINGS_FILE, 'r') as f:
-        embeddings_db = json.load(f)
-
-    print(f"Loaded {len(embeddings_db)} song embeddings\n")
+    return pc.Index(INDEX_NAME)
 
-    # Prepare vectors for upload
-    print("Uploading vectors to Pinecone...")
-    vectors_to_upsert = []
 
-    for song_id, song_data in tqdm(embeddings_db.items(), desc="Preparing vectors"):
-        vector = {
+def iter_vectors(embeddings_db):
+    """Yield one Pinecone vector per song, without building the full list"""
+    for song_id, song_data in embeddings_db.items():
+        yield {
             'id': song_id,
             'values': song_data['embedding'],
             'metadata': {
@@ -74,23 +77,48 @@ def upload_embeddings():
                 'rank': song_data['rank']
             }
         }
-        vectors_to_upsert.append(vector)
 
-    # Upload in batches of 100
-    batch_size = 100
-    for i in tqdm(range(0, len(vectors_to_upsert), batch_size), desc="Uploading batches"):
-        batch = vectors_to_upsert[i:i + batch_size]
-        index.upsert(vectors=batch)
 
-    print(f"\nSuccessfully uploaded {len(vectors_to_upsert)} vectors to Pinecone!")
+def upload_embeddings(target='pinecone', url=LOCAL_VECTOR_URL, batch_size=100, concurrency=4):
+    """Upload all embeddings to Pinecone (or the local stand-in)"""
+
+    print(f"Uploading OpenL3 embeddings to {target}...\n")
+    if target == 'local':
+        index = HttpBackend(url)
+    else:
+        index = connect_pinecone()
+
+    # Load embeddings
+    print(f"Loading embeddings from {EMBEDDINGS_FILE}...")
+    with open(EMBEDDINGS_FILE, 'r') as f:
+        embeddings_db = json.load(f)
+
+    print(f"Loaded {len(embeddings_db)} song embeddings\n")
+
+    start = time.perf_counter()
+    with tqdm(total=len(embeddings_db), desc="Uploading vectors") as progress:
+        uploaded = upsert_streaming(index, iter_vectors(embeddings_db), batch_size=batch_size,
+                                    concurrency=concurrency, on_batch=progress.update)
+    elapsed = time.perf_counter() - start
+
+    print(f"\nSuccessfully uploaded {uploaded} vectors in {elapsed:.1f}s "
+          f"({uploaded / max(elapsed, 1e-9):.0f} vectors/sec)")
 
-    # Get index stats
+    # Get index stats (the Pinecone client uses snake_case, the REST API camelCase)
     stats = index.describe_index_stats()
+    total = stats['totalVectorCount'] if target == 'local' else stats['total_vector_count']
     print(f"\nIndex Stats:")
-    print(f"   - Total vectors: {stats['total_vector_count']}")
+    print(f"   - Total vectors: {total}")
     print(f"   - Index dimension: {stats['dimension']}")
     print(f"   - Ready to use!")
 
 
 if __name__ == '__main__':
-    upload_embeddings()
+    parser = argparse.ArgumentParser(description='Upload catalog embeddings to a vector index')
+    parser.add_argument('--target', choices=['pinecone', 'local'], default='pinecone')
+    parser.add_argument('--url', default=LOCAL_VECTOR_URL, help='Local vector service URL (--target local)')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4, help='Batches in flight')
+    args = parser.parse_args()
+
+    upload_embeddings(args.target, args.url, args.batch_size, args.concurrency)
@@ -0,0 +1,258 @@
+"""
+Pluggable vector search backends.
+
+Every backend speaks the Pinecone data-plane shapes, so the service, the
+uploader and the benchmarks can switch between them:
+
+    upsert(vectors=[{'id', 'values', 'metadata'}], namespace='') -> {'upsertedCount': n}
+    query(vector, top_k, include_metadata=False)                -> {'matches': [{'id', 'score', 'metadata'}]}
+    query_batch(vectors, top_k)                                  -> [query result, ...]
+    delete(ids=None, delete_all=False, namespace='')             -> {}
+    describe_index_stats()                                       -> {'dimension', 'totalVectorCount'}
+
+InProcessBackend keeps a normalized float32 matrix in memory. HttpBackend
+talks to a Pinecone index host or to local_vector_service.py, which serves an
+InProcessBackend over the same REST routes for offline testing.
+"""
+
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import requests
+
+
+class VectorBackend:
+    def upsert(self, vectors, namespace=''):
+        raise NotImplementedError
+
+    def query(self, vector, top_k=10, include_metadata=False, namespace=''):
+        raise NotImplementedError
+
+    def query_batch(self, vectors, top_k=10, include_metadata=False, namespace=''):
+        return [self.query(vector, top_k, include_metadata, namespace) for vector in vectors]
+
+    def delete(self, ids=None, delete_all=False, namespace=''):
+        raise NotImplementedError
+
+    def describe_index_stats(self):
+        raise NotImplementedError
+
+
+class InProcessBackend(VectorBackend):
+    """Exact cosine search over an in-memory matrix, one per namespace"""
+
+    def __init__(self, dimension=None):
+        self.dimension = dimension
+        self._lock = threading.Lock()
+        self._namespaces = {}  # {namespace: {'ids', 'rows', 'matrix', 'metadata', 'pending'}}
+
+    @classmethod
+    def from_matrix(cls, ids, matrix, metadata=None, namespace=''):
+        """Wrap an existing (already normalized) matrix without copying it"""
+        backend = cls(dimension=matrix.shape[1])
+        backend._namespaces[namespace] = {
+            'ids': list(ids),
+            'rows': {song_id: i for i, song_id in enumerate(ids)},
+            'matrix': matrix,
+            'metadata': list(metadata) if metadata is not None else [None] * len(ids),
+            'pending': []
+        }
+        return backend
+
+    def _namespace(self, namespace):
+        return self._namespaces.setdefault(namespace, {
+            'ids': [], 'rows': {}, 'matrix': None, 'metadata': [], 'pending': []
+        })
+
+    def upsert(self, vectors, namespace=''):
+        with self._lock:
+            space = self._namespace(namespace)
+            count = 0
+            for vector in vectors:
+                values = np.asarray(vector['values'], dtype=np.float32)
+                if self.dimension is None:
+                    self.dimension = len(values)
+                if len(values) != self.dimension:
+                    raise ValueError(f"Vector {vector['id']} has {len(values)} dims, expected {self.dimension}")
+                norm = np.linalg.norm(values)
+                values = values / norm if norm > 0 else values
+
+                row = space['rows'].get(vector['id'])
+                if row is None:
+                    # New rows are buffered and appended to the matrix in
+                    # bulk on the next query
+                    space['rows'][vector['id']] = len(space['ids'])
+                    space['ids'].append(vector['id'])
+                    space['metadata'].append(vector.get('metadata'))
+                    space['pending'].append(values)
+                else:
+                    self._flush(space)
+                    space['matrix'][row] = values
+                    space['metadata'][row] = vector.get('metadata')
+                count += 1
+            return {'upsertedCount': count}
+
+    def _flush(self, space):
+        if space['pending']:
+            block = np.vstack(space['pending'])
+            space['matrix'] = block if space['matrix'] is None else np.vstack([space['matrix'], block])
+            space['pending'] = []
+
+    def _matches(self, space, scores, top_k, include_metadata):
+        k = min(top_k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        matches = []
+        for row in top:
+            match = {'id': space['ids'][row], 'score': float(scores[row])}
+            if include_metadata:
+                match['metadata'] = space['metadata'][row]
+            matches.append(match)
+        return matches
+
+    def _prepare(self, namespace):
+        """
+        Flush pending rows and snapshot the namespace under the lock. delete()
+        replaces ids, metadata and matrix together, and upsert() appends ids
+        before their rows reach the matrix, so readers must not go back to the
+        live namespace dict after the lock is released.
+        """
+        with self._lock:
+            space = self._namespaces.get(namespace)
+            if space is None:
+                return None
+            self._flush(space)
+            return {'ids': space['ids'], 'metadata': space['metadata'], 'matrix': space['matrix']}
+
+    def fetch_values(self, song_id, namespace=''):
+        with self._lock:
+            space = self._namespaces.get(namespace)
+            if space is None or song_id not in space['rows']:
+                return None
+            self._flush(space)
+            return space['matrix'][space['rows'][song_id]]
+
+    def query(self, vector, top_k=10, include_metadata=False, namespace=''):
+        return self.query_batch([vector], top_k, include_metadata, namespace)[0]
+
+    def query_batch(self, vectors, top_k=10, include_metadata=False, namespace=''):
+        """Score all queries with one matrix-matrix product"""
+        space = self._prepare(namespace)
+        if space is None or space['matrix'] is None:
+            return [{'matches': [], 'namespace': namespace} for _ in vectors]
+
+        queries = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        scores = (queries / norms) @ space['matrix'].T
+        return [
+            {'matches': self._matches(space, row_scores, top_k, include_metadata), 'namespace': namespace}
+            for row_scores in scores
+        ]
+
+    def delete(self, ids=None, delete_all=False, namespace=''):
+        with self._lock:
+            if delete_all:
+                self._namespaces.pop(namespace, None)
+                return {}
+            space = self._namespaces.get(namespace)
+            if space is None or not ids:
+                return {}
+            self._flush(space)
+            remove = {space['rows'][song_id] for song_id in ids if song_id in space['rows']}
+            keep = [row for row in range(len(space['ids'])) if row not in remove]
+            space['ids'] = [space['ids'][row] for row in keep]
+            space['metadata'] = [space['metadata'][row] for row in keep]
+            space['rows'] = {song_id: i for i, song_id in enumerate(space['ids'])}
+            if space['matrix'] is not None:
+                space['matrix'] = space['matrix'][keep]
+            return {}
+
+    def describe_index_stats(self):
+        with self._lock:
+            namespaces = {name: {'vectorCount': len(space['ids'])} for name, space in self._namespaces.items()}
+        return {
+            'dimension': self.dimension,
+            'totalVectorCount': sum(ns['vectorCount'] for ns in namespaces.values()),
+            'namespaces': namespaces
+        }
+
+
+class HttpBackend(VectorBackend):
+    """Pinecone-compatible REST client (Pinecone index host or local stand-in)"""
+
+    def __init__(self, host, api_key=None, timeout=30, concurrency=4):
+        self.host = host.rstrip('/')
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.session = requests.Session()
+        if api_key:
+            self.session.headers['Api-Key'] = api_key
+
+    def _post(self, path, payload):
+        response = self.session.post(f'{self.host}{path}', json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def upsert(self, vectors, namespace=''):
+        return self._post('/vectors/upsert', {'vectors': list(vectors), 'namespace': namespace})
+
+    def query(self, vector, top_k=10, include_metadata=False, namespace=''):
+        return self._post('/query', {
+            'vector': [float(v) for v in vector],
+            'topK': top_k,
+            'includeMetadata': include_metadata,
+            'namespace': namespace
+        })
+
+    def query_batch(self, vectors, top_k=10, include_metadata=False, namespace=''):
+        """Run queries concurrently (the Pinecone API has no batch query route)"""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return list(pool.map(lambda v: self.query(v, top_k, include_metadata, namespace), vectors))
+
+    def delete(self, ids=None, delete_all=False, namespace=''):
+        payload = {'namespace': namespace}
+        if delete_all:
+            payload['deleteAll'] = True
+        else:
+            payload['ids'] = list(ids or [])
+        return self._post('/vectors/delete', payload)
+
+    def describe_index_stats(self):
+        return self._post('/describe_index_stats', {})
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def upsert_streaming(backend, vectors, batch_size=100, concurrency=4, namespace='', on_batch=None):
+    """
+    Upsert an iterable of vectors in batches with up to `concurrency` batches
+    in flight, without materializing the whole iterable. Returns the count.
+    """
+    upserted = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = set()
+        for batch in batched(vectors, batch_size):
+            if len(in_flight) >= concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            future = pool.submit(backend.upsert, vectors=batch, namespace=namespace)
+            in_flight.add(future)
+            upserted += len(batch)
+            if on_batch:
+                on_batch(len(batch))
+        for future in in_flight:
+            future.result()
+    return upserted
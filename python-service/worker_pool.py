@@ -0,0 +1,196 @@
+"""
+Supervised worker processes for analysis jobs.
+
+Each job runs in a separate worker process. The parent thread that handed it
+over enforces the job's limits from outside: it kills the worker when the
+job runs past its wall-time limit or the worker's RSS goes over the memory
+limit. The job then fails with a JobLimitExceeded naming the limit, and a
+fresh worker takes the slot, so one pathological upload can't take the
+service down with it. Workers are also recycled after a number of jobs, or
+when their RSS has grown past a threshold between jobs.
+
+Progress messages (stage names) are relayed to the caller while the job
+runs, and the worker's stage timings come back with the result.
+"""
+
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+
+import metrics
+from job_store import JobLimitExceeded
+
+# How often the parent checks a running worker's RSS (seconds)
+RSS_POLL_SECONDS = 0.1
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process died while running a job"""
+
+
+def _context():
+    # forkserver avoids forking a parent that is running server threads
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _worker_main(conn, target):
+    """Worker loop: run (args, kwargs) tasks through target until told to stop"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+
+        args, kwargs = task
+        try:
+            with metrics.job_timings() as timings:
+                result = target(*args, on_stage=lambda stage: conn.send(('stage', stage)), **kwargs)
+            conn.send(('result', (result, timings)))
+        except JobLimitExceeded as e:
+            conn.send(('limit', (e.limit, str(e))))
+        except Exception as e:
+            conn.send(('error', f'{type(e).__name__}: {e}'))
+
+
+class _Worker:
+    def __init__(self, ctx, target):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, target), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def rss_bytes(self):
+        return metrics.process_rss_bytes(self.process.pid) or 0
+
+    def run(self, args, kwargs, timeout, max_rss_bytes, on_stage):
+        self.jobs += 1
+        self.conn.send((args, kwargs))
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            wait = RSS_POLL_SECONDS
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise JobLimitExceeded('time', f'Analysis exceeded the {timeout:.0f}s time limit')
+                wait = min(wait, remaining)
+
+            if self.conn.poll(wait):
+                try:
+                    kind, payload = self.conn.recv()
+                except EOFError:
+                    raise WorkerCrashed('Analysis worker exited unexpectedly')
+                if kind == 'stage':
+                    if on_stage:
+                        on_stage(payload)
+                elif kind == 'result':
+                    return payload
+                elif kind == 'limit':
+                    raise JobLimitExceeded(*payload)
+                else:
+                    raise RuntimeError(payload)
+            elif not self.process.is_alive():
+                raise WorkerCrashed(f'Analysis worker exited unexpectedly (exit code {self.process.exitcode})')
+
+            if max_rss_bytes and self.rss_bytes() > max_rss_bytes:
+                raise JobLimitExceeded('memory', f'Analysis exceeded the {max_rss_bytes // (1024 * 1024)} MB memory limit')
+
+    def stop(self, kill=False):
+        if not kill:
+            try:
+                self.conn.send(None)
+                self.process.join(timeout=5)
+            except (OSError, BrokenPipeError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+        self.conn.close()
+
+
+class WorkerPool:
+    def __init__(self, size, target, max_jobs_per_worker=50, max_rss_bytes=None,
+                 recycle_rss_bytes=None):
+        """
+        size: number of worker processes (one job each at a time)
+        target: module-level function run in the worker as
+                target(*args, on_stage=callback, **kwargs)
+        max_rss_bytes: kill the worker (failing its job) above this RSS
+        recycle_rss_bytes: replace the worker after a job if it is above this RSS
+        """
+        self.target = target
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_rss_bytes = max_rss_bytes
+        self.recycle_rss_bytes = recycle_rss_bytes
+        self._ctx = _context()
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = set()
+        # Workers start lazily, on their first job
+        for _ in range(size):
+            self._idle.put(None)
+
+    def _spawn(self):
+        worker = _Worker(self._ctx, self.target)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _retire(self, worker, reason, kill=False):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.stop(kill=kill)
+        metrics.WORKER_RESTARTS_TOTAL.inc(reason=reason)
+        print(f"Analysis worker {worker.process.pid} replaced ({reason})", flush=True)
+
+    def run(self, *args, timeout=None, on_stage=None, **kwargs):
+        """
+        Run target(*args, **kwargs) in a worker and return its result.
+        Blocks until a worker is free. Raises JobLimitExceeded when a limit is hit.
+        """
+        worker = self._idle.get()
+        try:
+            if worker is None:
+                worker = self._spawn()
+            result, timings = worker.run(args, kwargs, timeout, self.max_rss_bytes, on_stage)
+            metrics.record_timings(timings)
+        except JobLimitExceeded as e:
+            if e.limit in ('time', 'memory'):
+                # The worker is still running the job (or holding its memory)
+                self._retire(worker, e.limit, kill=True)
+                worker = None
+            raise
+        except WorkerCrashed:
+            self._retire(worker, 'crashed', kill=True)
+            worker = None
+            raise
+        except RuntimeError:
+            # The job raised; the worker itself is fine
+            raise
+        except BaseException:
+            if worker is not None:
+                self._retire(worker, 'error', kill=True)
+                worker = None
+            raise
+        finally:
+            if worker is not None:
+                if worker.jobs >= self.max_jobs_per_worker:
+                    self._retire(worker, 'max_jobs')
+                    worker = None
+                elif self.recycle_rss_bytes and worker.rss_bytes() > self.recycle_rss_bytes:
+                    self._retire(worker, 'rss')
+                    worker = None
+            self._idle.put(worker)
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            worker.stop()